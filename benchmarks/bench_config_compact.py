@@ -0,0 +1,84 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Report the memory Config.compact saves on a config with big lists.
+
+   python benchmarks/bench_config_compact.py [--ncoeffs 50000] [--nmask 100000] [--nhosts 20000]
+
+Measures the memory held by the config's tree and its index (counting
+each object once, with sys.getsizeof), before and after compact(), and
+how long clone() (a deepcopy of the tree) takes for each.
+
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import pathlib
+
+import synthconfig
+from rkwebutil.config import Config, CompactList
+
+
+def deep_size( *roots ):
+    """Total sys.getsizeof of every distinct object reachable from roots."""
+    seen = set()
+    total = 0
+    stack = list( roots )
+    while len( stack ) > 0:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add( id(obj) )
+        total += sys.getsizeof( obj )
+        if isinstance( obj, dict ):
+            stack.extend( obj.keys() )
+            stack.extend( obj.values() )
+        elif isinstance( obj, ( list, tuple ) ):
+            stack.extend( obj )
+        elif isinstance( obj, CompactList ):
+            stack.append( obj.array )
+    return total
+
+
+def measure( cfgfile, docompact ):
+    cfg = Config.get( cfgfile, reread=True )
+    if docompact:
+        cfg.compact()
+    cfg.value( 'db.host' )
+    size = deep_size( cfg._data, cfg._index )
+    t0 = time.perf_counter()
+    Config.clone( cfgfile )
+    clonetime = time.perf_counter() - t0
+    return size, len( cfg._index ), clonetime
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_config_compact.py",
+                                      description="Report memory saved by Config.compact" )
+    parser.add_argument( "--ncoeffs", type=int, default=50000, help="Calibration coefficients (floats)" )
+    parser.add_argument( "--nmask", type=int, default=100000, help="Pixel mask entries (ints)" )
+    parser.add_argument( "--nhosts", type=int, default=20000, help="Allowed-host entries (repeated strings)" )
+    args = parser.parse_args()
+
+    tree = synthconfig.list_heavy_tree( ncoeffs=args.ncoeffs, nmask=args.nmask, nhosts=args.nhosts )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfgfile = synthconfig.write_yaml( pathlib.Path(tmpdir) / "lists.yaml", tree )
+        plain = measure( cfgfile, False )
+        compacted = measure( cfgfile, True )
+
+    print( f"Config with {args.ncoeffs} float coefficients, {args.nmask} int mask entries, "
+           f"{args.nhosts} host strings" )
+    for name, ( size, nindex, clonetime ) in ( ( "Plain", plain ), ( "Compacted", compacted ) ):
+        print( f"{name:10s}: tree + index {size/1e6:7.2f} MB  ({nindex:7d} index entries), "
+               f"clone {clonetime*1000:7.1f} ms" )
+    print( f"Saved {( plain[0] - compacted[0] )/1e6:.2f} MB ({100 * ( 1 - compacted[0] / plain[0] ):.0f}%)" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare loading a layered config with the current and the old deep-copying merge.
+
+   python benchmarks/bench_config_merge.py [--layers 10]
+
+Reports the total load time, the time spent inside merge_trees, and the
+tracemalloc peak for each.  The yaml parsing is the same for both.
+
+"""
+
+import argparse
+import copy
+import tempfile
+import time
+import tracemalloc
+
+import synthconfig
+from rkwebutil.config import Config
+
+sharing_merge_trees = Config.merge_trees
+
+
+def deepcopy_merge_trees( left, right, augment=False, stats=None ):
+    """The merge that Config used before merges shared structure."""
+    if stats is not None:
+        stats['calls'] += 1
+    if isinstance( left, list ):
+        if not isinstance( right, list ) or ( not augment ):
+            return copy.deepcopy( right )
+        else:
+            newlist = copy.deepcopy( left )
+            newlist.extend( copy.deepcopy( right ) )
+            return newlist
+    elif isinstance( left, dict ):
+        if not isinstance( right, dict ):
+            return copy.deepcopy( right )
+        newdict = copy.deepcopy( left )
+        for key, value in right.items():
+            if key in newdict:
+                newdict[key] = deepcopy_merge_trees( newdict[key], right[key], augment=augment, stats=stats )
+            else:
+                newdict[key] = copy.deepcopy( right[key] )
+        return newdict
+    else:
+        return copy.deepcopy( right )
+
+
+def load( cfgfile, merge ):
+    mergetime = 0.
+    depth = 0
+
+    def timed_merge( left, right, augment=False, stats=None ):
+        nonlocal mergetime, depth
+        if depth > 0:
+            return merge( left, right, augment=augment, stats=stats )
+        depth += 1
+        t0 = time.perf_counter()
+        try:
+            return merge( left, right, augment=augment, stats=stats )
+        finally:
+            mergetime += time.perf_counter() - t0
+            depth -= 1
+
+    try:
+        Config.merge_trees = staticmethod( timed_merge )
+        Config.yamlcache.clear()
+        t0 = time.perf_counter()
+        cfg = Config.get( cfgfile, reread=True )
+        elapsed = time.perf_counter() - t0
+        Config.merge_trees = staticmethod( merge )
+        Config.yamlcache.clear()
+        tracemalloc.start()
+        Config.get( cfgfile, reread=True )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        Config.merge_trees = staticmethod( sharing_merge_trees )
+    return cfg, elapsed, mergetime, peak
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_config_merge.py", description="Benchmark layered config merges" )
+    parser.add_argument( "--layers", type=int, default=10, help="Number of config layers (default 10)" )
+    parser.add_argument( "--hosts", type=int, default=5000, help="Length of the host list in the base layer" )
+    parser.add_argument( "--instruments", type=int, default=500, help="Instruments in the base layer" )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfgfile = synthconfig.layered_configs( tmpdir, nlayers=args.layers, nhosts=args.hosts,
+                                               ninstruments=args.instruments )
+
+        cfg, newtime, newmerge, newpeak = load( cfgfile, sharing_merge_trees )
+        oldcfg, oldtime, oldmerge, oldpeak = load( cfgfile, deepcopy_merge_trees )
+        assert cfg._data == oldcfg._data
+
+    print( f"{args.layers} layers, {args.hosts} hosts, {args.instruments} instruments" )
+    print( f"deepcopy merge : load {oldtime:7.3f} s, in merges {oldmerge:7.3f} s, peak {oldpeak/1e6:8.1f} MB" )
+    print( f"sharing merge  : load {newtime:7.3f} s, in merges {newmerge:7.3f} s, peak {newpeak/1e6:8.1f} MB" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Run the Config benchmarks on several synthetic configs and save the results as JSON.
+
+   python benchmarks/bench_config_suite.py [-o results.json] [--compare baseline.json] [--scale 1.0]
+
+Each scenario is a synthetic config written to a temporary directory:
+
+   deep     : a narrow tree many levels deep
+   wide     : a shallow tree with many keys at each level
+   lists    : a tree dominated by long lists of numbers and strings
+   includes : a small top file that preloads, augments, and overrides
+              a couple of hundred small files
+
+For each, it measures (all in seconds unless noted; lower is better):
+
+   get_cold       : Config.get( reread=True ) with the yaml cache empty
+   get_warm       : Config.get( reread=True ) with the files in the yaml cache
+   get_cached     : Config.get() returning the already-loaded config
+   value_hit      : one value() lookup of a field that's there
+   value_miss     : one value() lookup (with a default) of a field that isn't
+   set_value      : one set_value() of an existing leaf (a scalar or list in a dict)
+   clone          : Config.clone()
+   augment        : augment() of a clone with a file covering part of the config
+   override       : override() of a clone with the same file
+   peak_mb        : tracemalloc high-water mark (MB) of a cold get plus building the index
+   retained_mb    : memory (MB) still held by the config after that
+
+Per-call times are the best of --repeat runs of as many calls as fit in
+about 0.2 s.  Results go to -o as JSON, along with the python version,
+platform, and git commit, so runs of different versions can be compared
+with --compare, which prints the ratio of each number to the baseline
+and exits with status 1 if anything got more than --threshold slower
+(or bigger).
+
+"""
+
+import sys
+import json
+import random
+import pathlib
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+import time
+import timeit
+import tracemalloc
+
+import synthconfig
+from rkwebutil.config import Config
+
+SCENARIOS = [ 'deep', 'wide', 'lists', 'includes' ]
+
+
+def write_scenario( name, directory, scale ):
+    """Write the config files for scenario name; return the path of the top one."""
+    directory = pathlib.Path( directory )
+    if name == 'deep':
+        tree = synthconfig.deep_wide_tree( depth=12, width=2, listlen=max( 1, int( 4 * scale ) ) )
+    elif name == 'wide':
+        tree = synthconfig.deep_wide_tree( depth=2, width=max( 2, int( 120 * scale ) ), listlen=2 )
+    elif name == 'lists':
+        tree = synthconfig.list_heavy_tree( ncoeffs=int( 20000 * scale ), nmask=int( 50000 * scale ),
+                                            nhosts=int( 10000 * scale ) )
+    elif name == 'includes':
+        return synthconfig.many_includes( directory, nfiles=max( 3, int( 200 * scale ) ) )
+    else:
+        raise ValueError( f"Unknown scenario {name}" )
+    return synthconfig.write_yaml( directory / f"{name}.yaml", tree )
+
+
+def write_merge_file( cfg, path ):
+    """Write a file with a tenth of cfg's top-level subtrees (at least one), for augment and override."""
+    keys = list( cfg._data.keys() )
+    tree = { k: Config.merge_trees( {}, cfg._data[k] ) for k in keys[ : max( 1, len(keys) // 10 ) ] }
+    return synthconfig.write_yaml( path, json.loads( json.dumps( tree ) ) )
+
+
+def per_call( func, repeat ):
+    """Best time per call of func() over repeat runs of about 0.2 s each."""
+    timer = timeit.Timer( func )
+    number, _ = timer.autorange()
+    return min( timer.repeat( repeat=repeat, number=number ) ) / number
+
+
+def each_call( setup, func, repeat ):
+    """Best time of func( setup() ) over repeat calls, not counting setup."""
+    best = None
+    for _ in range( repeat ):
+        arg = setup()
+        t0 = time.perf_counter()
+        func( arg )
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min( best, elapsed )
+    return best
+
+
+def sample_paths( cfg, npaths, rng ):
+    """Return ( hits, misses, leaves ): fields that are there, that aren't, and leaves in dicts."""
+    paths = synthconfig.all_paths( cfg._data )
+    dicts = [ p for p in paths if isinstance( cfg.value( p ), dict ) ] + [ "" ]
+    dictset = set( dicts )
+    leaves = [ p for p in paths
+               if ( p.rpartition( '.' )[0] in dictset ) and not isinstance( cfg.value( p ), dict ) ]
+    hits = rng.sample( paths, min( npaths, len(paths) ) )
+    misses = [ f"{p}.nosuchfield" if len(p) > 0 else "nosuchfield"
+               for p in ( rng.choice( dicts ) for _ in range( len(hits) ) ) ]
+    leaves = rng.sample( leaves, min( npaths, len(leaves) ) )
+    return hits, misses, leaves
+
+
+def run_scenario( name, directory, scale, repeat ):
+    cfgfile = write_scenario( name, directory, scale )
+    results = {}
+
+    def reread():
+        return Config.get( cfgfile, reread=True )
+
+    def cold():
+        Config.yamlcache.clear()
+        return reread()
+
+    results['get_cold'] = each_call( lambda: None, lambda _: cold(), repeat )
+    reread()
+    results['get_warm'] = each_call( lambda: None, lambda _: reread(), repeat )
+    results['get_cached'] = per_call( lambda: Config.get( cfgfile ), repeat )
+
+    Config.yamlcache.clear()
+    tracemalloc.start()
+    cfg = reread()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['peak_mb'] = peak / 1e6
+    results['retained_mb'] = retained / 1e6
+
+    rng = random.Random( 42 )
+    hits, misses, leaves = sample_paths( cfg, 1000, rng )
+    results['value_hit'] = per_call( lambda: [ cfg.value( p ) for p in hits ], repeat ) / len(hits)
+    results['value_miss'] = per_call( lambda: [ cfg.value( p, default=None ) for p in misses ], repeat ) / len(misses)
+
+    clone = Config.clone( cfgfile )
+    clone.value( leaves[0] )
+    results['set_value'] = per_call( lambda: [ clone.set_value( p, "changed" ) for p in leaves ], repeat ) / len(leaves)
+    results['clone'] = per_call( lambda: Config.clone( cfgfile ), repeat )
+
+    mergefile = write_merge_file( cfg, pathlib.Path( directory ) / "merge.yaml" )
+    Config.yamlcache.load( mergefile )
+    results['augment'] = each_call( lambda: Config.clone( cfgfile ), lambda c: c.augment( mergefile ), repeat )
+    results['override'] = each_call( lambda: Config.clone( cfgfile ), lambda c: c.override( mergefile ), repeat )
+    return results
+
+
+def git_commit():
+    try:
+        res = subprocess.run( [ "git", "rev-parse", "HEAD" ], capture_output=True, text=True, check=True,
+                              cwd=pathlib.Path( __file__ ).resolve().parent )
+        return res.stdout.strip()
+    except Exception:
+        return None
+
+
+def compare( results, baseline, threshold ):
+    """Print each number's ratio to baseline; return the list of regressions."""
+    regressions = []
+    print( f"\nCompared to {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}):" )
+    for scenario, metrics in results['results'].items():
+        old = baseline['results'].get( scenario )
+        if old is None:
+            print( f"{scenario}: not in baseline" )
+            continue
+        for metric, value in metrics.items():
+            if ( metric not in old ) or ( old[metric] <= 0 ):
+                continue
+            ratio = value / old[metric]
+            flag = ""
+            if ratio > 1. + threshold:
+                flag = "  REGRESSION"
+                regressions.append( f"{scenario}.{metric}" )
+            elif ratio < 1. / ( 1. + threshold ):
+                flag = "  improved"
+            print( f"   {scenario:9s} {metric:12s} {ratio:6.2f}x{flag}" )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_config_suite.py", description="Benchmark Config on synthetic configs" )
+    parser.add_argument( "-o", "--output", default=None, help="Write the results to this JSON file" )
+    parser.add_argument( "-c", "--compare", default=None, help="Compare against results in this JSON file" )
+    parser.add_argument( "-t", "--threshold", type=float, default=0.25,
+                         help="Fractional slowdown that counts as a regression (default 0.25)" )
+    parser.add_argument( "-s", "--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS,
+                         help="Scenarios to run (default all)" )
+    parser.add_argument( "--scale", type=float, default=1.0, help="Multiply the size of the synthetic configs" )
+    parser.add_argument( "-r", "--repeat", type=int, default=5, help="Runs of each measurement (best is kept)" )
+    args = parser.parse_args()
+
+    results = { 'meta': { 'date': datetime.datetime.now( tz=datetime.UTC ).isoformat(),
+                          'commit': git_commit(),
+                          'python': sys.version.split()[0],
+                          'platform': platform.platform(),
+                          'scale': args.scale,
+                          'repeat': args.repeat },
+                'results': {} }
+    for scenario in args.scenarios:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            res = run_scenario( scenario, tmpdir, args.scale, args.repeat )
+        results['results'][scenario] = res
+        print( f"{scenario}:" )
+        for metric, value in res.items():
+            if metric.endswith( '_mb' ):
+                print( f"   {metric:12s} {value:10.2f} MB" )
+            else:
+                print( f"   {metric:12s} {value*1e6:10.2f} µs" )
+
+    if args.output is not None:
+        with open( args.output, "w" ) as ofp:
+            json.dump( results, ofp, indent=2 )
+
+    if args.compare is not None:
+        with open( args.compare ) as ifp:
+            baseline = json.load( ifp )
+        if baseline['meta'].get( 'scale' ) != args.scale:
+            print( f"Warning: baseline was run with --scale {baseline['meta'].get('scale')}" )
+        regressions = compare( results, baseline, args.threshold )
+        if len( regressions ) > 0:
+            print( f"\n{len(regressions)} regressions: {', '.join(regressions)}" )
+            sys.exit( 1 )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Measure Config.value read throughput from several threads while writers are active.
+
+   python benchmarks/bench_config_threads.py [--readers 4] [--writers 2] [--seconds 3]
+
+Runs once with no writers and once with writers calling set_value and
+Config.get(reread=True), and reports total reads per second.  Readers
+also check that they never see a half-updated subtree.
+
+"""
+
+import argparse
+import pathlib
+import random
+import tempfile
+import threading
+import time
+
+import synthconfig
+from rkwebutil.config import Config
+
+
+def run( cfgfile, paths, nreaders, nwriters, seconds ):
+    stop = threading.Event()
+    reads = [ 0 ] * nreaders
+    writes = [ 0 ] * nwriters
+    errors = []
+
+    def reader( which ):
+        rng = random.Random( which )
+        n = 0
+        try:
+            while not stop.is_set():
+                cfg = Config.get( cfgfile )
+                for p in rng.sample( paths, 100 ):
+                    cfg.value( p )
+                pair = cfg.value( 'pair' )
+                if pair['a'] != pair['b']:
+                    raise RuntimeError( f"Saw a half-updated pair {pair}" )
+                n += 101
+        except Exception as ex:
+            errors.append( ex )
+        reads[which] = n
+
+    def writer( which ):
+        n = 0
+        try:
+            while not stop.is_set():
+                n += 1
+                if which == 0 and n % 50 == 0:
+                    Config.get( cfgfile, reread=True )
+                else:
+                    Config.get( cfgfile ).set_value( 'pair', { 'a': n, 'b': n } )
+        except Exception as ex:
+            errors.append( ex )
+        writes[which] = n
+
+    threads = ( [ threading.Thread( target=reader, args=(i,) ) for i in range(nreaders) ]
+                + [ threading.Thread( target=writer, args=(i,) ) for i in range(nwriters) ] )
+    for thread in threads:
+        thread.start()
+    time.sleep( seconds )
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if len( errors ) > 0:
+        raise errors[0]
+    return sum( reads ) / seconds, sum( writes ) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_config_threads.py", description="Benchmark threaded Config reads" )
+    parser.add_argument( "--readers", type=int, default=4, help="Reader threads (default 4)" )
+    parser.add_argument( "--writers", type=int, default=2, help="Writer threads (default 2)" )
+    parser.add_argument( "--seconds", type=float, default=3., help="Seconds to run each test (default 3)" )
+    args = parser.parse_args()
+
+    tree = synthconfig.deep_wide_tree( depth=3, width=10 )
+    tree['pair'] = { 'a': 0, 'b': 0 }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfgfile = synthconfig.write_yaml( pathlib.Path(tmpdir) / "threads.yaml", tree )
+        paths = synthconfig.all_paths( tree )
+        Config.get( cfgfile )
+
+        idle, _ = run( cfgfile, paths, args.readers, 0, args.seconds )
+        busy, writes = run( cfgfile, paths, args.readers, args.writers, args.seconds )
+
+    print( f"{args.readers} readers, {len(paths)} paths" )
+    print( f"No writers        : {idle:12.0f} reads/s" )
+    print( f"{args.writers} writers active : {busy:12.0f} reads/s  ({writes:.0f} writes/s)" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare Config.value lookups through the flat index against walking the tree.
+
+Walking the tree (by passing struct= explicitly) is what value() did
+for every lookup before the index existed.  Also times the walk and
+the index with paths compiled ahead of time by Config.compile.
+
+   python benchmarks/bench_config_value.py [--depth 5] [--width 6]
+
+"""
+
+import argparse
+import random
+import tempfile
+import time
+import pathlib
+
+import synthconfig
+from rkwebutil.config import Config
+
+
+def rate( func, paths, repeat ):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for p in paths:
+            func( p )
+    return repeat * len(paths) / ( time.perf_counter() - t0 )
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_config_value.py", description="Benchmark Config.value lookups" )
+    parser.add_argument( "--depth", type=int, default=5, help="Depth of the synthetic tree (default 5)" )
+    parser.add_argument( "--width", type=int, default=6, help="Keys per level of the synthetic tree (default 6)" )
+    parser.add_argument( "-n", "--nlookups", type=int, default=20000, help="Distinct paths to look up" )
+    parser.add_argument( "-r", "--repeat", type=int, default=5, help="Times to repeat the lookups" )
+    args = parser.parse_args()
+
+    tree = synthconfig.deep_wide_tree( depth=args.depth, width=args.width )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfgfile = synthconfig.write_yaml( pathlib.Path(tmpdir) / "deepwide.yaml", tree )
+        cfg = Config.get( cfgfile )
+
+        paths = synthconfig.all_paths( tree )
+        random.seed( 42 )
+        paths = random.sample( paths, min( args.nlookups, len(paths) ) )
+
+        t0 = time.perf_counter()
+        Config._make_index( cfg._data )
+        indextime = time.perf_counter() - t0
+
+        compiled = [ Config.compile( p ) for p in paths ]
+        walk = rate( lambda p: cfg.value( p, struct=cfg._data ), paths, args.repeat )
+        cwalk = rate( lambda p: cfg.value( p, struct=cfg._data ), compiled, args.repeat )
+        indexed = rate( cfg.value, paths, args.repeat )
+        cindexed = rate( cfg.value, compiled, args.repeat )
+
+    print( f"Tree: depth {args.depth}, width {args.width}, {len(cfg._index)} indexed paths "
+           f"(index built in {indextime*1000:.1f} ms)" )
+    print( f"Tree walk                 : {walk:12.0f} lookups/s" )
+    print( f"Tree walk, compiled paths : {cwalk:12.0f} lookups/s  ({cwalk/walk:.1f}x)" )
+    print( f"Flat index                : {indexed:12.0f} lookups/s  ({indexed/walk:.1f}x)" )
+    print( f"Flat index, compiled paths: {cindexed:12.0f} lookups/s  ({cindexed/walk:.1f}x)" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare asDateTime and asDateTimes against parsing everything with dateutil.
+
+   python benchmarks/bench_datetime.py [-n 100000] [--nmjds 1000000]
+
+Parses a column of ISO 8601 timestamps like a query result or CSV
+upload would have (some with time zones, some without, a few in other
+formats that need dateutil) with dateutil.parser.parse (what asDateTime
+always did), asDateTime, and asDateTimes to a list and to a numpy array.
+Then converts --nmjds MJDs to datetimes and back, one at a time with
+dateOfMjd and mjdOfDate, and all at once with datesOfMjds and
+mjdsOfDates.
+
+"""
+
+import sys
+import random
+import pathlib
+import argparse
+import datetime
+import time
+
+import dateutil.parser
+
+sys.path.insert( 0, str( pathlib.Path(__file__).resolve().parent.parent ) )
+
+from rkwebutil.rkwebutil import ( asDateTime, asDateTimes, mjdOfDate, dateOfMjd,  # noqa: E402
+                                  mjdsOfDates, datesOfMjds )
+
+
+def timestamps( n, rng ):
+    start = datetime.datetime( 2020, 1, 1 )
+    strings = []
+    for _ in range( n ):
+        when = start + datetime.timedelta( seconds=rng.uniform( 0, 1e8 ) )
+        r = rng.random()
+        if r < 0.4:
+            strings.append( when.isoformat() )
+        elif r < 0.7:
+            strings.append( when.isoformat( sep=" ", timespec="seconds" ) + "+00:00" )
+        elif r < 0.95:
+            strings.append( when.isoformat( timespec="milliseconds" ) + rng.choice( [ "Z", "-05:00", "+01:00" ] ) )
+        else:
+            strings.append( when.strftime( "%b %d %Y %H:%M" ) )
+    return strings
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_datetime.py", description="Benchmark asDateTime" )
+    parser.add_argument( "-n", "--nstrings", type=int, default=100000, help="Timestamps to parse" )
+    parser.add_argument( "-m", "--nmjds", type=int, default=1000000, help="MJDs to convert" )
+    args = parser.parse_args()
+
+    strings = timestamps( args.nstrings, random.Random( 42 ) )
+    runs = [ ( "dateutil.parser.parse", lambda: [ dateutil.parser.parse( s ) for s in strings ] ),
+             ( "asDateTime", lambda: [ asDateTime( s ) for s in strings ] ),
+             ( "asDateTimes", lambda: asDateTimes( strings ) ),
+             ( "asDateTimes( asnumpy=True )", lambda: asDateTimes( strings, asnumpy=True ) ) ]
+    base = None
+    for name, func in runs:
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        base = elapsed if base is None else base
+        print( f"{name:28s}: {args.nstrings/elapsed:10.0f}/s  ({base/elapsed:5.1f}x)" )
+
+    rng = random.Random( 42 )
+    mjds = [ rng.uniform( 40000, 70000 ) for _ in range( args.nmjds ) ]
+    dates = datesOfMjds( mjds )
+    datelist = [ dateOfMjd( m ) for m in mjds[:len(mjds)//10] ]
+    # (The loops only do a tenth of them)
+    runs = [ ( "dateOfMjd", len(datelist), lambda: [ dateOfMjd( m ) for m in mjds[:len(datelist)] ] ),
+             ( "datesOfMjds", len(mjds), lambda: datesOfMjds( mjds ) ),
+             ( "mjdOfDate", len(datelist), lambda: [ mjdOfDate( d ) for d in datelist ] ),
+             ( "mjdsOfDates", len(mjds), lambda: mjdsOfDates( dates ) ) ]
+    for name, n, func in runs:
+        t0 = time.perf_counter()
+        func()
+        print( f"{name:28s}: {n/(time.perf_counter()-t0):10.0f}/s" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
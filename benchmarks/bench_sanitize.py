@@ -0,0 +1,148 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare sanitizeHTML against the version that compiled its patterns on every call.
+
+   python benchmarks/bench_sanitize.py [-n 2000] [--processes 4]
+
+Times short annotations, multi-line comments with some markup, and one
+long page of comments, and checks that both give the same output.  Then
+compares the time and tracemalloc peak of sanitizing a big document all
+at once and with sanitizeHTMLStream, and of sanitizeHTMLMany with and
+without a process pool.  Finally, times sanitizeHTMLCached on table rows
+where a few annotations come up over and over, mixed with some one-off
+comments.
+
+"""
+
+import io
+import re
+import sys
+import time
+import random
+import timeit
+import pathlib
+import argparse
+import tracemalloc
+
+sys.path.insert( 0, str( pathlib.Path(__file__).resolve().parent.parent ) )
+
+from rkwebutil.rkwebutil import sanitizeHTML, sanitizeHTMLStream, sanitizeHTMLMany, sanitizeHTMLCached  # noqa: E402
+
+
+def legacy_sanitizeHTML(text, oneline = False):
+    """sanitizeHTML before its patterns were compiled once and passes skipped."""
+    tagfinder = re.compile(r"^\<(\S+)\>$")
+    ampfinder = re.compile(r"\&([^;\s]*\s)")
+    ampendfinder = re.compile(r"\&([^;\s]*)$")
+    ltfinder = re.compile(r"<((?!a\s*href)[^>]*\s)")
+    ltendfinder = re.compile(r"<([^>]*)$")
+    gtfinder = re.compile(r"((?<!\<a)\s[^<]*)>")
+    gtstartfinder = re.compile(r"^([<]*)>")
+
+    # (The tag callback is left out; it raised a TypeError whenever it was called.)
+    newtext = tagfinder.sub(lambda m: m.group(0), text)
+    newtext = ampfinder.sub(r"&amp;\g<1>", newtext, count=0)
+    newtext = ampendfinder.sub(r"&amp;\g<1>", newtext, count=0)
+    newtext = ltfinder.sub(r"&lt;\g<1>", newtext, count=0)
+    newtext = ltendfinder.sub(r"&lt;\g<1>", newtext, count=0)
+    newtext = gtfinder.sub(r"\g<1>&gt;", newtext, count=0)
+    newtext = gtstartfinder.sub(r"\g<1>&gt;", newtext, count=0)
+
+    if not oneline:
+        newtext = re.sub(r"^(?!\s*<p>)", "<p>", newtext, count=0)
+        newtext = re.sub(r"([^\n])$", r"\g<1>\n", newtext, count=0)
+        newtext = re.sub(r"\s*\n", "</p>\n", newtext, count=0)
+        newtext = re.sub(r"</p></p>", "</p>", newtext, count=0)
+        newtext = re.sub(r"\n(?!\s*<p>)([^\n]*</p>)", r"\n<p>\g<1>", newtext, count=0)
+        newtext = re.sub(r"^\s*<p></p>\s*$", "", newtext, count=0)
+        newtext = re.sub(r"\n", r"\n\n", newtext, count=0)
+
+    return newtext
+
+
+ANNOTATIONS = [ "good", "bad subtraction", "cosmic ray", "satellite trail", "ok", "artifact near edge",
+                "bright star", "unsure", "bad", "variable?" ]
+
+WORDS = [ "the", "transient", "candidate", "looks", "real", "but", "subtraction", "is", "noisy", "near",
+          "host", "galaxy", "flux", "rises", "over", "three", "nights", "<b>check</b>", "<i>again</i>",
+          "S/N", "&", "x<sup>2</sup>", 'see <a href="https://example.org/cand/123">this</a>', "a < b" ]
+
+
+def comment( rng ):
+    lines = [ " ".join( rng.choice( WORDS ) for _ in range( rng.randrange( 5, 25 ) ) )
+              for _ in range( rng.randrange( 1, 5 ) ) ]
+    return "\n".join( lines )
+
+
+def rate( func, texts, oneline ):
+    timer = timeit.Timer( lambda: [ func( t, oneline ) for t in texts ] )
+    number, _ = timer.autorange()
+    return number * len(texts) / min( timer.repeat( repeat=3, number=number ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_sanitize.py", description="Benchmark sanitizeHTML" )
+    parser.add_argument( "-n", "--ntexts", type=int, default=2000, help="Texts of each kind" )
+    parser.add_argument( "-p", "--processes", type=int, default=4, help="Processes for sanitizeHTMLMany" )
+    parser.add_argument( "--docsize", type=int, default=20, help="Size of the big document in MB" )
+    args = parser.parse_args()
+
+    rng = random.Random( 42 )
+    workloads = { 'annotations (oneline)': ( [ rng.choice( ANNOTATIONS ) for _ in range( args.ntexts ) ], True ),
+                  'comments': ( [ comment( rng ) for _ in range( args.ntexts ) ], False ),
+                  'long page': ( [ "\n".join( comment( rng ) for _ in range( 2000 ) ) ], False ) }
+
+    for name, ( texts, oneline ) in workloads.items():
+        for t in texts:
+            assert sanitizeHTML( t, oneline ) == legacy_sanitizeHTML( t, oneline )
+        old = rate( legacy_sanitizeHTML, texts, oneline )
+        new = rate( sanitizeHTML, texts, oneline )
+        size = sum( len(t) for t in texts ) / len(texts)
+        print( f"{name:22s} (avg {size:8.0f} chars): legacy {old:10.0f}/s, now {new:10.0f}/s  ({new/old:.1f}x)" )
+
+    doc = []
+    while sum( len(d) for d in doc ) < args.docsize * 1000000:
+        doc.append( comment( rng ) )
+    doc = "\n".join( doc )
+    ifp = io.StringIO( doc )
+    for name, func in ( ( "all at once", lambda: len( sanitizeHTML( doc ) ) ),
+                        ( "streamed", lambda: sum( len(s) for s in sanitizeHTMLStream( ifp ) ) ) ):
+        ifp.seek( 0 )
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        outlen = func()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print( f"{len(doc)/1e6:.0f} MB document, {name:11s}: {elapsed:6.2f} s, peak {peak/1e6:7.1f} MB "
+               f"({outlen/1e6:.0f} MB out)" )
+
+    texts = [ comment( rng ) for _ in range( args.ntexts * 25 ) ]
+    for processes in ( 1, args.processes ):
+        t0 = time.perf_counter()
+        sanitizeHTMLMany( texts, processes=processes, chunksize=256 )
+        print( f"sanitizeHTMLMany of {len(texts)} comments, {processes} processes: "
+               f"{time.perf_counter() - t0:6.2f} s" )
+
+    # A page of 5000 table rows: annotations picked with a falling-off
+    # (Zipf-like) popularity, and one row in 20 with its own comment
+    weights = [ 1. / ( i + 1 ) for i in range( len(ANNOTATIONS) ) ]
+    rows = [ comment( rng ) if rng.random() < 0.05 else rng.choices( ANNOTATIONS, weights )[0]
+             for _ in range( 5000 ) ]
+    assert [ sanitizeHTMLCached( r ) for r in rows ] == [ sanitizeHTML( r ) for r in rows ]
+    sanitizeHTMLCached.cache_clear()
+    uncached = rate( sanitizeHTML, rows, False )
+    cached = rate( sanitizeHTMLCached, rows, False )
+    info = sanitizeHTMLCached.cache_info()
+    print( f"table rows: uncached {uncached:10.0f}/s, cached {cached:10.0f}/s  ({cached/uncached:.1f}x); "
+           f"{info['hits']/(info['hits']+info['misses']):.0%} hits, {info['entries']} entries, "
+           f"{info['size']/1e3:.0f} kB" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare Schema against converting request fields one call at a time.
+
+   python benchmarks/bench_schema.py [-n 100000]
+
+Converts a typical list-endpoint payload (a UUID, some ints, a float, a
+date) the way handlers do now, with a call to intOrError, intOrZero,
+asUUID, or asDateTime per field, and with Schema.convert.  Then
+converts the same rows as a column-oriented payload with
+Schema.convertColumns, to lists and to numpy arrays.
+
+"""
+
+import sys
+import uuid
+import time
+import random
+import pathlib
+import argparse
+
+sys.path.insert( 0, str( pathlib.Path(__file__).resolve().parent.parent ) )
+
+from rkwebutil.rkwebutil import Schema, intOrError, intOrZero, asUUID, asDateTime  # noqa: E402
+
+
+SCHEMA = Schema( { 'id': { 'type': 'uuid', 'required': True },
+                   'nexp': 'int',
+                   'page': 'intorzero',
+                   'ra': 'float',
+                   'since': 'datetime' } )
+
+
+def by_hand( data ):
+    return { 'id': asUUID( data['id'] ),
+             'nexp': intOrError( data['nexp'], 'nexp' ),
+             'page': intOrZero( data['page'] ),
+             'ra': float( data['ra'] ),
+             'since': asDateTime( data['since'] ) }
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_schema.py", description="Benchmark Schema" )
+    parser.add_argument( "-n", "--nrows", type=int, default=100000, help="Rows to convert" )
+    args = parser.parse_args()
+
+    rng = random.Random( 42 )
+    rows = [ { 'id': str( uuid.UUID( int=rng.getrandbits( 128 ) ) ),
+               'nexp': str( rng.randrange( 100 ) ),
+               'page': str( rng.randrange( 10 ) ),
+               'ra': str( rng.uniform( 0, 360 ) ),
+               'since': f"2024-{rng.randrange( 1, 13 ):02d}-{rng.randrange( 1, 29 ):02d}T12:00:00Z" }
+             for _ in range( args.nrows ) ]
+    columns = { name: [ r[name] for r in rows ] for name in rows[0] }
+
+    runs = [ ( "by hand, per row", lambda: [ by_hand( r ) for r in rows ] ),
+             ( "Schema.convert, per row", lambda: [ SCHEMA.convert( r ) for r in rows ] ),
+             ( "Schema.convertColumns", lambda: SCHEMA.convertColumns( columns ) ),
+             ( "convertColumns( asnumpy )", lambda: SCHEMA.convertColumns( columns, asnumpy=True ) ) ]
+    base = None
+    for name, func in runs:
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        base = elapsed if base is None else base
+        print( f"{name:26s}: {args.nrows/elapsed:10.0f} rows/s  ({base/elapsed:5.1f}x)" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare asUUIDs against a list of asUUID.
+
+   python benchmarks/bench_uuid.py [-n 1000000]
+
+Converts a column of UUID strings (like the id column of a query
+result) one at a time with asUUID and all at once with asUUIDs, and
+compares the time and the memory (tracemalloc) the result holds.  Then
+times building a set of the UUIDs and the UUIDArray's index, and
+looking up ids that are and aren't there one at a time in each and all
+at once with UUIDArray.indices.
+
+"""
+
+import sys
+import uuid
+import time
+import random
+import pathlib
+import argparse
+import tracemalloc
+
+sys.path.insert( 0, str( pathlib.Path(__file__).resolve().parent.parent ) )
+
+from rkwebutil.rkwebutil import asUUID, asUUIDs, UUIDArray  # noqa: E402
+
+
+def measure( func ):
+    """Return ( result, seconds, bytes still held by the result ); memory comes from a second run."""
+    t0 = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    result = func()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, held
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_uuid.py", description="Benchmark asUUIDs" )
+    parser.add_argument( "-n", "--nids", type=int, default=1000000, help="UUIDs to convert" )
+    args = parser.parse_args()
+
+    rng = random.Random( 42 )
+    strs = [ str( uuid.UUID( int=rng.getrandbits( 128 ) ) ) for _ in range( args.nids ) ]
+    mixed = [ None if rng.random() < 0.01 else s for s in strs ]
+
+    ids, t_list, m_list = measure( lambda: [ asUUID( s ) for s in strs ] )
+    arr, t_arr, m_arr = measure( lambda: asUUIDs( strs ) )
+    _, t_mixed, _ = measure( lambda: asUUIDs( mixed ) )
+    print( f"list of asUUID : {args.nids/t_list:10.0f}/s, {m_list/args.nids:6.1f} bytes each" )
+    print( f"asUUIDs        : {args.nids/t_arr:10.0f}/s, {m_arr/args.nids:6.1f} bytes each "
+           f"({t_list/t_arr:.1f}x faster, {m_list/m_arr:.1f}x smaller)" )
+    print( f"asUUIDs, 1% None: {args.nids/t_mixed:9.0f}/s" )
+
+    queries = [ rng.choice( ids ) if rng.random() < 0.5 else uuid.UUID( int=rng.getrandbits( 128 ) )
+                for _ in range( 100000 ) ]
+    idset, t_set, m_set = measure( lambda: set( ids ) )
+    _, t_index, m_index = measure( lambda: UUIDArray( arr.data, arr.nones )._hashtable() )
+    arr._hashtable()
+    print( f"building index : set {t_set:6.2f} s ({m_set/args.nids:5.1f} bytes each), "
+           f"UUIDArray {t_index:6.2f} s ({m_index/args.nids:5.1f} bytes each)" )
+    for name, container in ( ( "set", idset ), ( "UUIDArray", arr ) ):
+        t0 = time.perf_counter()
+        found = sum( q in container for q in queries )
+        print( f"lookups in {name:9s}: {len(queries)/(time.perf_counter()-t0):10.0f}/s ({found} found)" )
+    t0 = time.perf_counter()
+    found = ( arr.indices( queries ) >= 0 ).sum()
+    print( f"UUIDArray.indices  : {len(queries)/(time.perf_counter()-t0):10.0f}/s ({found} found)" )
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Compare yaml parsing with the pure-python SafeLoader and libyaml's CSafeLoader.
+
+   python benchmarks/bench_yaml_loader.py [--depth 5] [--width 6]
+
+Parses each of the test yaml files and a large generated file with both
+loaders, checks that they produce the same trees, and reports the time
+each took.  Also times a cold Config.get of test/test.yaml with each.
+
+"""
+
+import argparse
+import pathlib
+import time
+
+import yaml
+
+import synthconfig
+from rkwebutil.config import Config, YAMLCache
+
+_testdir = pathlib.Path(__file__).resolve().parent.parent / "test"
+
+
+def parse_time( text, loader, repeat ):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        tree = yaml.load( text, Loader=loader )
+    return tree, ( time.perf_counter() - t0 ) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser( "bench_yaml_loader.py", description="Benchmark yaml loaders" )
+    parser.add_argument( "--depth", type=int, default=5, help="Depth of the generated tree (default 5)" )
+    parser.add_argument( "--width", type=int, default=6, help="Keys per level of the generated tree (default 6)" )
+    parser.add_argument( "-r", "--repeat", type=int, default=20, help="Times to parse each small file" )
+    args = parser.parse_args()
+
+    if not yaml.__with_libyaml__:
+        print( "pyyaml was built without libyaml; only yaml.SafeLoader is available." )
+        return
+
+    loaders = { 'SafeLoader': yaml.SafeLoader, 'CSafeLoader': yaml.CSafeLoader }
+
+    files = { f.name: ( f.read_text(), args.repeat ) for f in sorted( _testdir.glob( "*.yaml" ) ) }
+    files['generated'] = ( yaml.safe_dump( synthconfig.deep_wide_tree( args.depth, args.width ) ), 1 )
+
+    print( f"{'file':24s} {'bytes':>10s} " + " ".join( f"{name:>14s}" for name in loaders ) + "   speedup" )
+    for name, ( text, repeat ) in files.items():
+        results = { lname: parse_time( text, loader, repeat ) for lname, loader in loaders.items() }
+        trees = [ r[0] for r in results.values() ]
+        assert all( t == trees[0] for t in trees[1:] ), f"Loaders disagree on {name}"
+        times = [ r[1] for r in results.values() ]
+        print( f"{name:24s} {len(text):10d} " + " ".join( f"{t*1000:11.3f} ms" for t in times )
+               + f"   {times[0]/times[1]:6.1f}x" )
+
+    cache = Config.yamlcache
+    try:
+        for lname, loader in loaders.items():
+            Config.yamlcache = YAMLCache( loader=loader )
+            t0 = time.perf_counter()
+            Config.get( _testdir / "test.yaml", reread=True )
+            print( f"Cold Config.get of test.yaml with {lname}: {(time.perf_counter()-t0)*1000:.2f} ms" )
+    finally:
+        Config.yamlcache = cache
+
+
+# ======================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+"""Generate synthetic config trees and yaml files for the benchmarks."""
+
+import sys
+import random
+import pathlib
+
+import yaml
+
+sys.path.insert( 0, str( pathlib.Path(__file__).resolve().parent.parent ) )
+
+
+def deep_wide_tree( depth=6, width=6, listlen=4 ):
+    """Return a dict tree depth levels deep with width keys at each level.
+
+    The leaves at the bottom level are lists of listlen scalars.
+
+    """
+    def _level( d ):
+        if d == depth:
+            return [ f"item{i}" for i in range(listlen) ]
+        return { f"k{d}_{i}": _level( d+1 ) for i in range(width) }
+    return _level( 0 )
+
+
+def all_paths( tree, prefix="" ):
+    """Return a list of every period-separated path in tree."""
+    paths = []
+    stack = [ ( prefix, tree ) ]
+    while len(stack) > 0:
+        path, node = stack.pop()
+        if isinstance( node, dict ):
+            children = node.items()
+        elif isinstance( node, list ):
+            children = enumerate( node )
+        else:
+            continue
+        for key, val in children:
+            sub = f"{path}.{key}" if len(path) > 0 else str(key)
+            paths.append( sub )
+            stack.append( ( sub, val ) )
+    return paths
+
+
+def write_yaml( path, tree ):
+    path = pathlib.Path( path )
+    with open( path, "w" ) as ofp:
+        yaml.safe_dump( tree, ofp )
+    return path
+
+
+def layered_configs( directory, nlayers=10, nhosts=20000, ninstruments=2000 ):
+    """Write a chain of nlayers config files, each preloading the one before.
+
+    The bottom layer has a big host list and instrument table; each
+    layer above it overrides a few scalars and instrument entries and
+    augments the host list.  Returns the path of the top layer.
+
+    """
+    directory = pathlib.Path( directory )
+    base = { 'hosts': [ f"host{i:06d}.example.org" for i in range(nhosts) ],
+             'instruments': { f"inst{i:05d}": { 'name': f"Instrument {i}",
+                                                'gain': 1.0 + i / 1000.,
+                                                'chips': list( range(16) ) }
+                              for i in range(ninstruments) },
+             'db': { 'host': 'localhost', 'port': 5432, 'name': 'base' } }
+    write_yaml( directory / "layer00.yaml", base )
+
+    for layer in range( 1, nlayers ):
+        aug = { 'hosts': [ f"extra{layer:02d}_{i}.example.org" for i in range(10) ] }
+        write_yaml( directory / f"augment{layer:02d}.yaml", aug )
+        tree = { 'preloads': [ f"layer{layer-1:02d}.yaml" ],
+                 'augments': [ f"augment{layer:02d}.yaml" ],
+                 'db': { 'name': f"layer{layer}" },
+                 'instruments': { f"inst{i:05d}": { 'gain': 2.0 + layer } for i in range(0, ninstruments, 100) },
+                 f"layer{layer}": { 'scalar': layer } }
+        write_yaml( directory / f"layer{layer:02d}.yaml", tree )
+
+    return directory / f"layer{nlayers-1:02d}.yaml"
+
+
+def list_heavy_tree( ncoeffs=50000, nmask=100000, nhosts=20000, ndomains=50, seed=42 ):
+    """Return a tree dominated by long lists of scalars.
+
+    Calibration coefficients (floats), a pixel mask (small ints), and an
+    allowed-host list whose strings repeat a lot.
+
+    """
+    rng = random.Random( seed )
+    domains = [ f"site{i}.example.org" for i in range(ndomains) ]
+    return { 'calib': { 'coeffs': [ rng.gauss( 0., 1. ) for _ in range(ncoeffs) ],
+                        'version': 3 },
+             'mask': { 'pixels': [ rng.randrange( 4 ) for _ in range(nmask) ] },
+             'hosts': { 'allowed': [ rng.choice( domains ) for _ in range(nhosts) ] },
+             'db': { 'host': 'localhost', 'port': 5432 } }
+
+
+def many_includes( directory, nfiles=200, nkeys=20 ):
+    """Write a top-level config that includes nfiles small config files.
+
+    A third of the files are preloaded, a third augment, and a third
+    override the top file.  Each has a section of its own with nkeys
+    scalars, and they all add to a shared section (a scalar each
+    overrides and a list each extends).  Returns the path of the top
+    file.
+
+    """
+    directory = pathlib.Path( directory )
+    kinds = { 'preloads': [], 'augments': [], 'overrides': [] }
+    for i in range(nfiles):
+        name = f"part{i:04d}.yaml"
+        write_yaml( directory / name, { f"section{i:04d}": { f"key{j}": f"value {i} {j}" for j in range(nkeys) },
+                                        'shared': { 'owner': i, 'members': [ f"member{i}" ] } } )
+        kinds[ ( 'preloads', 'augments', 'overrides' )[ i % 3 ] ].append( name )
+    write_yaml( directory / "top.yaml", { **kinds, 'shared': { 'owner': 'top', 'members': [ 'top' ] } } )
+    return directory / "top.yaml"
@@ -1,3 +1,4 @@
-all = [ '__version__', 'config.py', 'rkauth_client.py', 'rkauth_flask.py', 'rkauth_webpy.py', 'rkwebutil.py' ]
+all = [ '__version__', 'config.py', 'config_snapshot.py', 'rkauth_client.py', 'rkauth_flask.py', 'rkauth_webpy.py',
+        'rkwebutil.py' ]
 
 from rkwebutil._version import __version__ as __version__
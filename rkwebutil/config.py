@@ -7,12 +7,669 @@
 #
 # rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
 
+import os
+import re
+import sys
+import array
 import logging
 import pathlib
-import types
 import copy
+import pickle
+import hashlib
+import tempfile
+import time
+import threading
+import contextlib
+import contextvars
+import collections
+import collections.abc
 import yaml
-import traceback
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Use libyaml's parser if pyyaml was built with it; it's much faster
+#   than the pure-python one, and builds the same trees.
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+
+_NOTFOUND = object()
+_REMOVED = object()
+_NODEFAULT = object()
+
+# A reference to another config field in a string (see Config.use_interpolation),
+#   or an escaped "${"
+_INTERPOLATION = re.compile( r'\$\$\{|\$\{([^}]*)\}' )
+_REFERENCE = re.compile( r'\$\{([^}]*)\}' )
+
+# The overlays (see Config.overlay) active in the current thread or
+#   asyncio task: a dict of Config -> _ConfigOverlay, replaced (never
+#   modified) when an overlay is entered.
+_overlays = contextvars.ContextVar( 'rkwebutil_config_overlays', default=None )
+
+
+# ======================================================================
+
+class FrozenDict( dict ):
+    """A dict that can't be modified.
+
+    Compares equal to an ordinary dict with the same contents.
+    copy.deepcopy() returns an ordinary (mutable) dict.
+
+    """
+
+    def _readonly( self, *args, **kwargs ):
+        raise TypeError( "Config data is read-only; use Config.set_value to change it" )
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__( self ):
+        return ( FrozenDict, ( dict(self), ) )
+
+    def __deepcopy__( self, memo ):
+        return { copy.deepcopy( k, memo ): copy.deepcopy( v, memo ) for k, v in self.items() }
+
+
+class FrozenList( list ):
+    """A list that can't be modified.
+
+    Compares equal to an ordinary list with the same contents.
+    copy.deepcopy() returns an ordinary (mutable) list.
+
+    """
+
+    def _readonly( self, *args, **kwargs ):
+        raise TypeError( "Config data is read-only; use Config.set_value to change it" )
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __reduce__( self ):
+        return ( FrozenList, ( list(self), ) )
+
+    def __deepcopy__( self, memo ):
+        return [ copy.deepcopy( v, memo ) for v in self ]
+
+
+class ConfigPath( str ):
+    """A period-separated config fieldspec, parsed once.
+
+    Get one with Config.compile( "a.b.3.c" ) (or ConfigPath( "a.b.3.c" ))
+    and pass it to Config.value or Config.set_value in place of the
+    string.  Use this when looking up the same fields over and over
+    (e.g. once per record in a loop), so the string only has to be
+    split and checked for list indices once.  It's a str (equal to the
+    fieldspec), so it can be used anywhere a fieldspec can.
+
+    Attributes:
+      field : the fieldspec as a plain str
+      fields : tuple of the .-separated parts of field
+      keys : tuple of ( part, int(part) or None ) for each part
+      prefixes : tuple of the fieldspecs of each level down to field
+                 (e.g. ( "a", "a.b", "a.b.3", "a.b.3.c" ))
+
+    """
+
+    def __new__( cls, field ):
+        if isinstance( field, ConfigPath ):
+            return field
+        if not isinstance( field, str ):
+            raise TypeError( f"Config fieldspec must be a string, not a {type(field)}" )
+        self = super().__new__( cls, field )
+        self.field = str( field )
+        self.fields = tuple( field.split( "." ) )
+        keys = []
+        for part in self.fields:
+            try:
+                keys.append( ( part, int( part ) ) )
+            except ValueError:
+                keys.append( ( part, None ) )
+        self.keys = tuple( keys )
+        prefixes = []
+        for part in self.fields:
+            prefixes.append( f"{prefixes[-1]}.{part}" if prefixes else part )
+        self.prefixes = tuple( prefixes )
+        return self
+
+    def __repr__( self ):
+        return f"ConfigPath({self.field!r})"
+
+
+def freeze( tree, memo=None ):
+    """Return tree with every dict and list replaced by a FrozenDict or FrozenList.
+
+    Subtrees that are already frozen are returned as is.  Subtrees that
+    appear more than once in tree (e.g. from yaml anchors) are only
+    converted once.
+
+    """
+    if isinstance( tree, ( FrozenDict, FrozenList ) ):
+        return tree
+    if not isinstance( tree, ( dict, list ) ):
+        return tree
+    if memo is None:
+        memo = {}
+    if id(tree) in memo:
+        return memo[ id(tree) ]
+    if isinstance( tree, dict ):
+        frozen = FrozenDict( ( k, freeze( v, memo ) ) for k, v in tree.items() )
+    else:
+        frozen = FrozenList( freeze( v, memo ) for v in tree )
+    memo[ id(tree) ] = frozen
+    return frozen
+
+
+def thaw( tree, memo=None ):
+    """Return a copy of tree in which every dict and list (frozen or not) is a new ordinary dict or list.
+
+    The opposite of freeze(); like copy.deepcopy, but only copies the
+    containers, and is faster.  CompactLists and everything that isn't
+    a dict or list are shared with tree.  Subtrees that appear more than
+    once in tree are only copied once.
+
+    """
+    if not isinstance( tree, ( dict, list ) ):
+        return tree
+    if memo is None:
+        memo = {}
+    if id(tree) in memo:
+        return memo[ id(tree) ]
+    if isinstance( tree, dict ):
+        thawed = { k: thaw( v, memo ) for k, v in tree.items() }
+    else:
+        thawed = [ thaw( v, memo ) for v in tree ]
+    memo[ id(tree) ] = thawed
+    return thawed
+
+
+class CompactList( collections.abc.Sequence ):
+    """A read-only list of ints or floats, stored in an array.array.
+
+    Made by compact() (see Config.compact) for long lists of numbers,
+    which take roughly a quarter of the memory this way.  It acts like
+    a list (indexing, slicing, iteration, len, ==, +) but can't be
+    modified, and isn't an instance of list.  Slicing, +, and tolist()
+    give back ordinary lists; copy.deepcopy() gives back the same
+    CompactList.  The array is in the array attribute.  json.dumps
+    can't write one out on its own; pass it default=json_default.
+
+    """
+
+    __slots__ = ( 'array', )
+
+    def __init__( self, values, typecode='d' ):
+        self.array = values if isinstance( values, array.array ) else array.array( typecode, values )
+
+    def __len__( self ):
+        return len( self.array )
+
+    def __getitem__( self, i ):
+        if isinstance( i, slice ):
+            return self.array[i].tolist()
+        return self.array[i]
+
+    def __iter__( self ):
+        return iter( self.array )
+
+    def __eq__( self, other ):
+        if isinstance( other, CompactList ):
+            return self.array == other.array
+        if isinstance( other, list ):
+            return self.array.tolist() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __add__( self, other ):
+        if isinstance( other, ( list, CompactList ) ):
+            return self.array.tolist() + list( other )
+        return NotImplemented
+
+    def __radd__( self, other ):
+        if isinstance( other, list ):
+            return other + self.array.tolist()
+        return NotImplemented
+
+    def tolist( self ):
+        """Return the numbers as an ordinary list."""
+        return self.array.tolist()
+
+    def __repr__( self ):
+        return repr( self.array.tolist() )
+
+    def __reduce__( self ):
+        return ( CompactList, ( self.array, ) )
+
+    def __copy__( self ):
+        return self
+
+    def __deepcopy__( self, memo ):
+        return self
+
+
+# Things that config code treats as lists
+_LISTS = ( list, CompactList )
+
+
+def compact( tree, minlength=64, memo=None ):
+    """Return tree with long lists of numbers made into CompactLists, and strings interned.
+
+    A list of at least minlength elements that are all ints (not bools)
+    that fit in 64 bits, or all floats, becomes a CompactList; other
+    lists are left as lists.  Every string (values and dict keys) is
+    interned, so repeated strings are only stored once.  Dicts and
+    lists are rebuilt rather than modified, and frozen ones stay
+    frozen.
+
+    """
+    if memo is None:
+        memo = {}
+    if isinstance( tree, str ):
+        return sys.intern( tree )
+    if not isinstance( tree, ( dict, list ) ):
+        return tree
+    if id(tree) in memo:
+        return memo[ id(tree) ]
+    if isinstance( tree, dict ):
+        newtree = { ( sys.intern( k ) if isinstance( k, str ) else k ): compact( v, minlength, memo )
+                    for k, v in tree.items() }
+        if isinstance( tree, FrozenDict ):
+            newtree = FrozenDict( newtree )
+    else:
+        newtree = None
+        if len( tree ) >= minlength:
+            types = { type( v ) for v in tree }
+            if types == { float }:
+                newtree = CompactList( tree, 'd' )
+            elif types == { int }:
+                try:
+                    newtree = CompactList( tree, 'q' )
+                except OverflowError:
+                    pass
+        if newtree is None:
+            newtree = [ compact( v, minlength, memo ) for v in tree ]
+            if isinstance( tree, FrozenList ):
+                newtree = FrozenList( newtree )
+    memo[ id(tree) ] = newtree
+    return newtree
+
+
+# So that yaml.dump and yaml.safe_dump can write out frozen and compacted trees
+for _representer in ( yaml.representer.SafeRepresenter, yaml.representer.Representer ):
+    _representer.add_representer( FrozenDict, yaml.representer.SafeRepresenter.represent_dict )
+    _representer.add_representer( FrozenList, yaml.representer.SafeRepresenter.represent_list )
+    _representer.add_representer( CompactList, lambda dumper, data: dumper.represent_list( data.array.tolist() ) )
+
+
+def json_default( obj ):
+    """For json.dumps( ..., default=json_default ), so that it can write out compacted trees.
+
+    CompactLists are written as lists; anything else json can't write
+    raises TypeError, as it would without this.
+
+    """
+    if isinstance( obj, CompactList ):
+        return obj.tolist()
+    raise TypeError( f"Object of type {type(obj).__name__} is not JSON serializable" )
+
+
+class _IndexOverlay( dict ):
+    """A flat index made of a few changes on top of a shared base index.
+
+    The dict itself holds the changes (with _REMOVED marking paths that
+    were deleted); anything else is looked up in base, which is never
+    modified, and may itself be an _IndexOverlay.  set_value and update
+    put their changes in a new overlay on top of the config's index
+    (see settle), so they never copy the whole index.
+
+    """
+
+    __slots__ = ( 'base', )
+
+    def __init__( self, base, changes=() ):
+        super().__init__( changes )
+        self.base = base
+
+    def __missing__( self, key ):
+        return self.base[key]
+
+    def get( self, key, default=None ):
+        val = dict.get( self, key, _NOTFOUND )
+        if val is _NOTFOUND:
+            return self.base.get( key, default )
+        return default if val is _REMOVED else val
+
+    def __contains__( self, key ):
+        return self.get( key, _NOTFOUND ) is not _NOTFOUND
+
+    def pop( self, key, default=None ):
+        val = self.get( key, _NOTFOUND )
+        dict.__setitem__( self, key, _REMOVED )
+        return default if val is _NOTFOUND else val
+
+    @staticmethod
+    def settle( index ):
+        """Merge the layers of index so that there are only a few of them, and return it.
+
+        index is a new overlay (or a plain dict index).  An overlay is
+        merged into the one below it once it has at least half as many
+        changes, so there are never more than about log2 of the number
+        of changes, and each change is copied about that many times.
+        Once the changes on top of a plain dict are more than an eighth
+        of its size, they're all applied to a new plain dict.
+
+        """
+        while ( isinstance( index, _IndexOverlay ) and isinstance( index.base, _IndexOverlay )
+                and ( 2 * len( index ) >= len( index.base ) ) ):
+            merged = dict( dict.items( index.base ) )
+            merged.update( dict.items( index ) )
+            index = _IndexOverlay( index.base.base, merged )
+        if ( isinstance( index, _IndexOverlay ) and ( not isinstance( index.base, _IndexOverlay ) )
+             and ( len( index ) > len( index.base ) // 8 ) ):
+            return index.flatten()
+        return index
+
+    def flatten( self ):
+        """Return a plain dict index with the changes (and those of any overlays below) applied."""
+        index = self.base.flatten() if isinstance( self.base, _IndexOverlay ) else dict( self.base )
+        for key, val in dict.items( self ):
+            if val is _REMOVED:
+                index.pop( key, None )
+            else:
+                index[key] = val
+        return index
+
+
+class _ConfigOverlay:
+    """The settings from one Config.overlay() (and any it's nested in).
+
+    settings is a list of ( ConfigPath, value, appendlists ), applied in
+    order on top of the config's tree.  The overlaid tree is built by
+    path copying (see Config._set_tree), so it costs the depth of each
+    setting no matter how big the tree is, and is rebuilt if the
+    config's own tree has been replaced since.
+
+    """
+
+    __slots__ = ( 'settings', 'heads', 'covered', 'keys', '_tree' )
+
+    def __init__( self, settings, parent=None, appendlists=False ):
+        self.settings = list( parent.settings ) if parent is not None else []
+        self.settings.extend( ( ConfigPath( field ), value, appendlists ) for field, value in settings.items() )
+        self.keys = set()
+        self.covered = set()
+        for path, _, _ in self.settings:
+            self.keys.add( path.field )
+            self.covered.update( path.prefixes )
+        self.heads = { path.fields[0] for path, _, _ in self.settings }
+        self._tree = ( None, None )
+
+    def covers( self, field ):
+        """True if the value of field might be different with the overlay than without it."""
+        if field.partition( "." )[0] not in self.heads:
+            return False
+        if field in self.covered:
+            return True
+        while '.' in field:
+            field = field.rpartition( "." )[0]
+            if field in self.keys:
+                return True
+        return False
+
+    def tree( self, data, frozen=False ):
+        """Return data with the overlay's settings applied."""
+        base, tree = self._tree
+        if base is not data:
+            tree = data
+            for path, value, appendlists in self.settings:
+                tree, _, _ = Config._set_tree( tree, path, self._value( path, value ), appendlists=appendlists )
+            if frozen:
+                tree = freeze( tree )
+            self._tree = ( data, tree )
+        return tree
+
+    def _value( self, path, value ):
+        return value
+
+
+class _EnvOverlay( _ConfigOverlay ):
+    """Config values from environment variables (see Config.use_environment).
+
+    The variables are found once, when this is made, but each one is
+    only parsed the first time it's needed.  leaves holds the fields
+    whose value is just the value of one variable, which value() can
+    return without building the overlaid tree.
+
+    """
+
+    __slots__ = ( 'prefix', 'variables', 'raw', 'leaves', '_parsed' )
+
+    def __init__( self, prefix, environ, parsed=None ):
+        start = f"{prefix}__"
+        self.prefix = prefix
+        self.variables = {}
+        self.raw = {}
+        for var in sorted( environ ):
+            if var.startswith( start ) and ( len( var ) > len( start ) ):
+                field = ".".join( var[ len(start): ].split( "__" ) )
+                self.variables[field] = var
+                self.raw[field] = environ[var]
+        super().__init__( self.raw )
+        inner = { p for path, _, _ in self.settings for p in path.prefixes[:-1] }
+        self.leaves = { path.field for path, _, _ in self.settings
+                        if ( path.field not in inner ) and not any( p in self.keys for p in path.prefixes[:-1] ) }
+        self._parsed = {} if parsed is None else parsed
+
+    def copy( self ):
+        """Return a new overlay of the same variables, sharing the values already parsed."""
+        return _EnvOverlay( self.prefix, { self.variables[f]: raw for f, raw in self.raw.items() },
+                            parsed=self._parsed )
+
+    def parse( self, field ):
+        """Return the value of the variable for field, parsed as yaml (or as is if it isn't valid yaml)."""
+        try:
+            return self._parsed[field]
+        except KeyError:
+            pass
+        try:
+            parsed = freeze( yaml.load( self.raw[field], Loader=YAMLLoader ) )
+        except yaml.YAMLError:
+            parsed = self.raw[field]
+        self._parsed[field] = parsed
+        return parsed
+
+    def _value( self, path, value ):
+        return self.parse( path.field )
+
+    def tree( self, data, frozen=False ):
+        try:
+            return super().tree( data, frozen )
+        except TypeError as ex:
+            raise ValueError( f"Failed to apply {self.prefix}__* environment variables to the config: {ex}" )
+
+
+class _Interpolation:
+    """Memoized ${field} interpolation for a Config (see Config.use_interpolation).
+
+    memo holds the interpolated value of each field that has been looked
+    up and had references in it (or is a dict or list, which might).
+    deps maps each field that was referenced to the fields in memo that
+    used it.  When fields of the config change, invalidate() drops just
+    the memo entries that depend on them.  generation goes up each time,
+    so that a lookup that was already running doesn't memoize a value
+    made from the old config.
+
+    """
+
+    def __init__( self ):
+        self.memo = {}
+        self.deps = {}
+        self.lock = threading.RLock()
+        self.generation = 0
+
+    def invalidate( self, changed=None ):
+        """Forget memoized values that depend on the fields in changed (or everything, if it's None)."""
+        with self.lock:
+            self.generation += 1
+            if changed is None:
+                self.memo = {}
+                self.deps = {}
+                return
+            memo = dict( self.memo )
+            memobelow = _Interpolation._below( memo )
+            depsbelow = _Interpolation._below( self.deps )
+            work = list( changed )
+            seen = set()
+            while len( work ) > 0:
+                field = work.pop()
+                if field in seen:
+                    continue
+                seen.add( field )
+                for f in _Interpolation._overlapping( memo, memobelow, field ):
+                    del memo[f]
+                    work.append( f )
+                for ref in _Interpolation._overlapping( self.deps, depsbelow, field ):
+                    work.extend( self.deps.pop( ref ) )
+            self.memo = memo
+
+    @staticmethod
+    def _below( fields ):
+        """Return a dict of fieldspec: list of the keys of dict fields that are below it in the tree."""
+        below = {}
+        for field in fields:
+            prefix = field
+            while '.' in prefix:
+                prefix = prefix.rpartition( "." )[0]
+                below.setdefault( prefix, [] ).append( field )
+        return below
+
+    @staticmethod
+    def _overlapping( fields, below, field ):
+        """The keys of dict fields that are field, or above or below it in the tree (see _below)."""
+        found = [ f for f in below.get( field, () ) if f in fields ]
+        if field in fields:
+            found.append( field )
+        while '.' in field:
+            field = field.rpartition( "." )[0]
+            if field in fields:
+                found.append( field )
+        return found
+
+
+# ======================================================================
+
+class YAMLCache:
+    """A process-wide cache of parsed yaml files.
+
+    Files are keyed by resolved path, modification time, and size, so a
+    file is only parsed again if it has changed on disk.  The parsed
+    documents are frozen (see freeze()) because they're shared by every
+    Config that includes the file.  At most maxsize files are kept; the
+    least recently used is dropped when there are more.
+
+    hits and misses count the number of load() calls that were and were
+    not satisfied from the cache.
+
+    Files are parsed with loader, which defaults to yaml.CSafeLoader if
+    pyyaml has libyaml support, and yaml.SafeLoader if not.
+
+    """
+
+    def __init__( self, maxsize=256, loader=YAMLLoader ):
+        self.maxsize = maxsize
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._docs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def load( self, path, timings=None ):
+        """Return the parsed (frozen) contents of yaml file path.
+
+        If timings is a dict, sets 'cached' (True if the file came from
+        the cache) and, if it didn't, 'read', 'parse', and 'freeze' (the
+        seconds spent on each) and 'bytes' (the size of the file).
+
+        """
+        path = str( pathlib.Path( path ).resolve() )
+        stat = pathlib.Path( path ).stat()
+        key = ( stat.st_mtime_ns, stat.st_size )
+        with self._lock:
+            cached = self._docs.get( path )
+            if ( cached is not None ) and ( cached[0] == key ):
+                self._docs.move_to_end( path )
+                self.hits += 1
+                if timings is not None:
+                    timings['cached'] = True
+                return cached[1]
+            self.misses += 1
+
+        t0 = time.perf_counter()
+        with open( path ) as ifp:
+            text = ifp.read()
+        t1 = time.perf_counter()
+        doc = yaml.load( text, Loader=self.loader )
+        t2 = time.perf_counter()
+        doc = freeze( doc )
+        if timings is not None:
+            timings.update( { 'cached': False, 'read': t1 - t0, 'parse': t2 - t1,
+                              'freeze': time.perf_counter() - t2, 'bytes': stat.st_size } )
+
+        with self._lock:
+            self._docs[ path ] = ( key, doc )
+            self._docs.move_to_end( path )
+            while len( self._docs ) > self.maxsize:
+                self._docs.popitem( last=False )
+        return doc
+
+    def clear( self ):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._docs.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info( self ):
+        """Return a dict with hits, misses, size, and maxsize."""
+        return { 'hits': self.hits, 'misses': self.misses, 'size': len( self._docs ), 'maxsize': self.maxsize }
+
+
+# ======================================================================
+
+class _SnapshotUnpickler( pickle.Unpickler ):
+    """Unpickles config snapshots, refusing anything that can't be in a config tree.
+
+    A plain pickle.load will call whatever the pickle names, so anybody
+    who could write a snapshot could run code in every process that
+    reads it.  This only lets through the containers and scalars yaml
+    makes, and the tree classes of this module.
+
+    """
+
+    _allowed = { ( "builtins", name ) for name in ( "dict", "list", "tuple", "set", "frozenset", "str", "bytes",
+                                                     "bytearray", "int", "float", "complex", "bool" ) }
+    _allowed |= { ( "datetime", name ) for name in ( "date", "datetime", "time", "timedelta", "timezone" ) }
+    _allowed |= { ( "array", "array" ), ( "array", "_array_reconstructor" ) }
+    _allowed |= { ( __name__, name ) for name in ( "FrozenDict", "FrozenList", "CompactList" ) }
+
+    def find_class( self, module, name ):
+        if ( module, name ) not in self._allowed:
+            raise pickle.UnpicklingError( f"Config snapshots can't contain {module}.{name}" )
+        return super().find_class( module, name )
+
+
+# ======================================================================
 
 
 class Config:
@@ -50,12 +707,34 @@ class Config:
     and "override" methods (see below).  Subsequent preloads, and the
     current file following the preloads, are handled with "override".
 
-    Lots of copying is done on these merges, but hopefully we're not talking
-    huge amounts of data in config trees, so that's not a big deal.
+    Merges don't copy the trees they're merging.  The merged tree shares
+    every subtree that didn't conflict with the files it came from; only
+    the dicts (and, for augments, the lists) along paths that appear in
+    both sides are rebuilt.
+
+    Before anything is merged, the whole graph of included files is
+    read, so each file is only read and merged once no matter how many
+    times it's included, and files that include each other in a loop
+    raise an exception rather than recursing forever.
+
+    Each yaml file is parsed once and kept in Config.yamlcache (see
+    YAMLCache) until it changes on disk, so a file included by several
+    configs, or a reread of a config, doesn't parse it again.  The
+    cached files are frozen, but unless the config is frozen (see
+    below), it makes its own copy of the merged tree out of ordinary
+    dicts and lists, so value() hands back subtrees you can modify.
 
     Configs are *global* for the current running python session.  (The
     config object for a given filename is a singleton.)
 
+    Config is thread safe.  Neither the tree nor its index are ever
+    modified once a reader can see them; set_value, reload, augment,
+    override, freeze, and compact build a new tree and its index and
+    swap them in together under a lock, and Config.get replaces the
+    registry of singletons the same way.  So value() and Config.get()
+    for an already-loaded config never wait for a lock, and never see
+    a half-built tree.
+
     To use:
 
     1. Optional: call Config.init(filename)
@@ -94,21 +773,74 @@ class Config:
        This only changes it for the running session, it does *not*
        affect the YAML files in storage.
 
+       To change values only for the current thread or asyncio task
+       (e.g. for one request), use
+
+           with confobj.overlay( { fieldspec: value, ... } ):
+               ...
+
+       To let environment variables override config values (e.g. in a
+       container), pass envprefix to Config.get (or call
+       confobj.use_environment()); then e.g. APP__database__host
+       overrides database.host if envprefix is "APP".
+
+       To save memory in configs with long lists of numbers, call
+       confobj.compact(); then confobj.array( fieldspec ) gives you the
+       list as a numpy array without copying it.
+
+       Pass interpolate=True to Config.get (or call
+       confobj.use_interpolation()) to have "${fieldspec}" in config
+       strings replaced with the value of fieldspec.
+
+       To find out why loading a config is slow, pass profile=True to
+       Config.get and look at confobj.load_report() (it's also logged at
+       debug level).
+
+    5. To pick up edits to the YAML files without restarting, call
+       confobj.reload(), or confobj.watch() to have a background thread
+       reload whenever one of the files changes.  confobj.subscribe()
+       registers callbacks that are told which fields changed.
+
+    Lookups are served from a flat index that maps every period-separated
+    path (leaves and subtrees) to the dict or list that holds it in the
+    tree.  The index is built along with the tree and is kept current
+    by set_value.  Because the field is read from that dict or list,
+    changing a subtree that value() returned in place shows up in
+    lookups of its keys.  But if you replace a whole dict or list
+    inside it, lookups of the fields below that one still find the old
+    one; use set_value for that.
+
+    Get a config with frozen=True (or call its freeze() method) to make
+    the whole tree read-only.  Then value() hands back subtrees that
+    nobody can modify (every dict and list is a FrozenDict or
+    FrozenList), so the config doesn't have to copy the trees from
+    Config.yamlcache, there's no need to copy them yourself, and clone()
+    is cheap: the clone shares the tree and index with the original
+    until set_value is called on it, and then only copies what changes.
+
     """
 
     _default_default = None
 
     _default = None
     _configs = {}
+    _registry_lock = threading.RLock()
+
+    yamlcache = YAMLCache()
+
+    snapshot_version = 1
 
     @staticmethod
-    def init( configfile=None, logger=logging.getLogger("main"), dirmap={} ):
+    def init( configfile=None, logger=logging.getLogger("main"), dirmap={}, snapshotdir=None, frozen=False,
+              envprefix=None, interpolate=False, profile=False ):
         """Initialize configuration globally for process."""
 
-        Config.get( configfile, logger=logger, dirmap=dirmap )
+        Config.get( configfile, logger=logger, dirmap=dirmap, snapshotdir=snapshotdir, frozen=frozen,
+                    envprefix=envprefix, interpolate=interpolate, profile=profile )
 
     @staticmethod
-    def get( configfile=None, reread=False, logger=logging.getLogger("main"), dirmap={}, setdefault=False ):
+    def get( configfile=None, reread=False, logger=logging.getLogger("main"), dirmap={}, setdefault=False,
+             snapshotdir=None, frozen=False, envprefix=None, interpolate=False, profile=False ):
         """Returns a Config object.
 
         Config objects are stored as an array of singletons.  That is,
@@ -123,33 +855,91 @@ class Config:
         previously, then the config object read this call will become
         the default config object.
 
-        If "reread" is true, then the singleton object will be recreated
-        from the config files.
+        If "reread" is true and the config was already loaded, the
+        singleton object is reloaded from the config files (see
+        reload()), so its subscribers are called and anything changed
+        with set_value is lost.  It keeps the dirmap it was first read
+        with.
 
         If you don't pass a config file, then you will get back the
         default config object.  If there is no default config object
         (because neither Config.get() nor Config.init() have been called
         previously), an exception will be raised.
 
+        If snapshotdir is given, then when the config is (re)read, first
+        look in that directory for a snapshot of the fully merged config
+        (see write_snapshot).  If there is one, and none of the files
+        that went into it have changed, use it instead of reading and
+        merging the yaml files.  Otherwise, read the files as usual and
+        write a new snapshot.
+
+        If frozen is True, the config is frozen (see freeze()) if it
+        isn't already.
+
+        If envprefix is given, environment variables starting with
+        envprefix__ override the config (see use_environment()).
+
+        If interpolate is True, ${field} in config strings is replaced
+        by the value of field (see use_interpolation()).
+
+        If profile is True, time how long reading and merging each of
+        the config files takes (see load_report()).  If the config was
+        already loaded, that starts with the next reload().
+
         """
         if configfile is None:
-            if Config._default is None:
+            configfile = Config._default
+            if configfile is None:
                 if Config._default_default is None:
                     raise RuntimeError( 'No default config defined yet; run Config.init(configfile)' )
-                Config._default = Config._default_default
-            configfile = Config._default
+                with Config._registry_lock:
+                    if Config._default is None:
+                        Config._default = Config._default_default
+                    configfile = Config._default
 
         configfile = str( pathlib.Path(configfile).resolve() )
 
-        if reread or ( configfile not in Config._configs ):
-            Config._configs[configfile] = Config( configfile, logger=logger, dirmap=dirmap )
-            if Config._default is None:
+        # Fast path: no locking if the config is already loaded
+        cfg = Config._configs.get( configfile )
+        if ( ( cfg is not None ) and ( not reread ) and ( ( not setdefault ) or ( Config._default == configfile ) )
+             and ( cfg._frozen or not frozen )
+             and ( ( envprefix is None ) or ( ( cfg._env is not None ) and ( cfg._env.prefix == envprefix ) ) )
+             and ( ( cfg._interp is not None ) or not interpolate )
+             and ( cfg._profile or not profile ) ):
+            return cfg
+
+        with Config._registry_lock:
+            cfg = Config._configs.get( configfile )
+            if cfg is not None:
+                reload = reread
+            else:
+                reload = False
+                cfg = Config( configfile, logger=logger, dirmap=dirmap, snapshotdir=snapshotdir, frozen=frozen,
+                              envprefix=envprefix, interpolate=interpolate, profile=profile )
+                configs = dict( Config._configs )
+                configs[configfile] = cfg
+                Config._configs = configs
+                if Config._default is None:
+                    Config._default = configfile
+
+            if setdefault:
                 Config._default = configfile
 
-        if setdefault:
-            Config._default = configfile
-
-        return Config._configs[configfile]
+        if reload:
+            if snapshotdir is not None:
+                cfg._snapshotdir = snapshotdir
+            if profile:
+                cfg._profile = True
+            cfg.reload()
+        if frozen:
+            cfg.freeze()
+        if ( envprefix is not None ) and ( ( cfg._env is None ) or ( cfg._env.prefix != envprefix ) ):
+            cfg.use_environment( envprefix )
+        if interpolate:
+            cfg.use_interpolation()
+        if profile:
+            cfg._profile = True
+        return cfg
 
     @staticmethod
     def dirmap( filename, dirmap ):
@@ -160,7 +950,8 @@ class Config:
         return filename
 
     @staticmethod
-    def clone( configfile=None, reread=False, logger=logging.getLogger("main"), dirmap={} ):
+    def clone( configfile=None, reread=False, logger=logging.getLogger("main"), dirmap={}, snapshotdir=None,
+               frozen=False, envprefix=None, interpolate=False, profile=False ):
         """Returns a config object.
 
         Will call "get" on the passed configfile, but will *not* return
@@ -168,48 +959,708 @@ class Config:
         deep copy of it, and return that.  That gives you a config file
         that you can muck about with to your heart's content without
         worrying about messing things up elsewhere.
+
+        If the config is frozen (or frozen is True), no copy is made.
+        The clone shares the frozen tree and index with the singleton,
+        and set_value on the clone only allocates what it changes.
         """
-        origconfig = Config.get( configfile, reread=reread, logger=logger, dirmap=dirmap )
+        origconfig = Config.get( configfile, reread=reread, logger=logger, dirmap=dirmap, snapshotdir=snapshotdir,
+                                 frozen=frozen, envprefix=envprefix, interpolate=interpolate, profile=profile )
         return Config( configfile, clone=origconfig, dirmap=dirmap )
 
 
-    def __init__( self, configfile, clone=None, logger=logging.getLogger("main"), dirmap={} ):
+    def __init__( self, configfile, clone=None, logger=logging.getLogger("main"), dirmap={}, snapshotdir=None,
+                  frozen=False, envprefix=None, interpolate=False, profile=False ):
         """Don't call this, call static method Config.get() or Config.clone()"""
 
         self.logger = logger
+        self._lock = threading.RLock()
+        self._subscribers = []
+        self._watcher = None
+        self._frozen = False
+        self._env = None
+        self._interp = None
+        self._compact = None
+        self._profile = profile
+        self._report = None
+        self._snapshotdir = None
         if clone is not None:
-            self._data = copy.deepcopy( clone._data )
+            self._compact = clone._compact
+            self._profile = clone._profile
+            self._report = clone._report
+            if clone._env is not None:
+                self._env = clone._env.copy()
+            if clone._interp is not None:
+                self._interp = _Interpolation()
+            if clone._frozen:
+                self._state = clone._state
+                self._frozen = True
+            else:
+                data = copy.deepcopy( clone._data )
+                self._state = ( data, Config._make_index( data ) )
+            self._path = clone._path
+            self._files = list( clone._files )
+            self._dirmap = dict( clone._dirmap )
             return
 
+        self._frozen = frozen
+        if envprefix is not None:
+            self.use_environment( envprefix )
+        if interpolate:
+            self.use_interpolation()
+
+        self._snapshotdir = snapshotdir
         try:
-            self._data = {}
             self._path = pathlib.Path( configfile ).resolve()
-            curfiledata = yaml.safe_load( open(self._path) )
-            if not isinstance( curfiledata, dict ):
-                raise RuntimeError( f'Config file {configfile} doesn\'t have yaml I like.' )
+            self._dirmap = dict( dirmap )
+            data, self._files, fromsnapshot = self._read_tree()
+            data = self._own( data )
+            self._state = ( data, Config._make_index( data ) )
+        except Exception as e:
+            logger.exception( f'Exception trying to load config from {configfile}' )
+            raise e
 
-            imports = { 'preloads': [], 'augments': [], 'overrides': [] }
-            for importfile in [ 'preloads', 'augments', 'overrides' ]:
-                if importfile in curfiledata:
-                    if not isinstance( imports[importfile], list ):
-                        raise TypeError( 'preloads must be a list' )
-                    imports[importfile] = [ Config.dirmap( f, dirmap ) for f in curfiledata[importfile] ]
-                    del curfiledata[importfile]
+        if not fromsnapshot:
+            self._save_snapshot()
 
-            for preloadfile in imports['preloads']:
-                self.override( preloadfile, dirmap=dirmap )
+    def _own( self, data ):
+        """Internal usage, do not call.
 
-            self._data = Config.merge_trees( self._data, curfiledata )
+        Return data (a newly merged tree that shares subtrees with
+        Config.yamlcache) made wholly frozen if the config is frozen,
+        or wholly the config's own ordinary dicts and lists if not.
 
-            for augmentfile in imports['augments']:
-                self.augment( augmentfile, dirmap=dirmap )
+        """
+        return freeze( data ) if self._frozen else thaw( data )
+
+    def _read_tree( self ):
+        """Internal usage, do not call.
 
-            for overridefile in imports['overrides']:
-                self.override( overridefile, dirmap=dirmap )
+        Returns ( tree, files, fromsnapshot ): the merged config tree
+        and the files that went into it.  They come from the config's
+        snapshot (see write_snapshot) if it was given a snapshotdir and
+        the snapshot there is current, and otherwise from
+        Config._load_tree( self._path, self._dirmap ).  Keeps a load
+        report (and logs it) if profiling.
 
+        """
+        t0 = time.perf_counter()
+        if self._snapshotdir is not None:
+            snapshot = Config.read_snapshot( self._path, self._snapshotdir, dirmap=self._dirmap )
+            if ( snapshot is not None ) and ( len( Config.snapshot_problems( snapshot ) ) == 0 ):
+                if self._profile:
+                    self._report = { 'file': str( self._path ), 'snapshot': True,
+                                     'total': time.perf_counter() - t0, 'files': {} }
+                    self.logger.debug( Config.format_load_report( self.load_report() ) )
+                return snapshot['data'], [ pathlib.Path(f) for f in snapshot['files'] ], True
+        if not self._profile:
+            return *Config._load_tree( self._path, self._dirmap ), False
+        files = {}
+        tree, order = Config._load_tree( self._path, self._dirmap, report=files )
+        self._report = { 'file': str( self._path ), 'snapshot': False,
+                         'total': time.perf_counter() - t0, 'files': files }
+        self.logger.debug( Config.format_load_report( self.load_report() ) )
+        return tree, order, False
+
+    def _save_snapshot( self ):
+        """Internal usage, do not call.  Write a snapshot if the config has a snapshotdir; only warn if it fails."""
+        if self._snapshotdir is None:
+            return
+        try:
+            self.write_snapshot( self._snapshotdir )
         except Exception as e:
-            logger.exception( f'Exception trying to load config from {configfile}' )
-            raise e
+            self.logger.warning( f'Failed to write config snapshot to {self._snapshotdir}: {e}' )
+
+    def load_report( self ):
+        """Return where the time went the last time the config was read.
+
+        Returns None unless the config was read with profile=True (see
+        get()).  Otherwise, returns a dict with:
+
+           file : the top-level config file
+           snapshot : True if the config came from a snapshot (in which
+              case files is empty)
+           total : seconds it took to read and merge everything
+           files : a dict keyed by each file that went into the config,
+              with 'resolve', 'read', 'parse', 'freeze', and 'merge'
+              (seconds), 'cached' (True if the file came from
+              Config.yamlcache, in which case there's no read, parse,
+              or freeze), 'bytes' (size of the file), 'nodes' (number
+              of dicts, lists, and values in the file), 'merge_calls'
+              and 'merge_bytes' (see merge_trees), and the files it
+              'preloads', 'augments', and 'overrides'.
+           includes : the include tree; a dict with 'file', and
+              'preloads', 'augments', and 'overrides', each a list of
+              dicts like this one
+           sums : 'resolve', 'read', 'parse', 'freeze', and 'merge'
+              summed over all files
+
+        Times for a file don't include the files it includes.
+
+        """
+        report = self._report
+        if report is None:
+            return None
+        files = report['files']
+
+        def includes( f ):
+            entry = files.get( f, {} )
+            tree = { 'file': f }
+            for kind in ( 'preloads', 'augments', 'overrides' ):
+                tree[kind] = [ includes( sub ) for sub in entry.get( kind, [] ) ]
+            return tree
+
+        report = copy.deepcopy( report )
+        report['includes'] = includes( report['file'] )
+        report['sums'] = { k: sum( entry.get( k, 0. ) for entry in files.values() )
+                           for k in ( 'resolve', 'read', 'parse', 'freeze', 'merge' ) }
+        return report
+
+    @staticmethod
+    def format_load_report( report ):
+        """Return a load_report() as a human-readable string."""
+        if report['snapshot']:
+            return f"Loaded config {report['file']} from snapshot in {report['total']*1000:.2f} ms"
+        files = report['files']
+        ncached = sum( 1 for entry in files.values() if entry.get( 'cached' ) )
+        lines = [ f"Loaded config {report['file']} in {report['total']*1000:.2f} ms "
+                  f"({len(files)} files, {ncached} from cache)" ]
+        lines.append( "   " + ", ".join( f"{k} {v*1000:.2f} ms" for k, v in report['sums'].items() ) )
+
+        def describe( tree, how, depth ):
+            entry = files.get( tree['file'], {} )
+            times = ", ".join( f"{k} {entry[k]*1000:.2f}" for k in ( 'resolve', 'read', 'parse', 'freeze', 'merge' )
+                               if k in entry )
+            lines.append( f"{'   ' * depth}{how}{tree['file']}: {times} ms; {entry.get('nodes', 0)} nodes, "
+                          f"{entry.get('merge_calls', 0)} merges, {entry.get('merge_bytes', 0)} bytes merged"
+                          f"{' (cached)' if entry.get('cached') else ''}" )
+            for kind in ( 'preloads', 'augments', 'overrides' ):
+                for sub in tree[kind]:
+                    describe( sub, f"{kind[:-1]} ", depth + 1 )
+
+        describe( report['includes'], "", 1 )
+        return "\n".join( lines )
+
+    @staticmethod
+    def _include_graph( path, dirmap={}, report=None ):
+        """Internal usage, do not call.
+
+        Reads config file path and every file it (recursively) preloads,
+        augments, or overrides.  Returns ( order, nodes ).  nodes is a
+        dict keyed by resolved path; each value is a dict with the file's
+        data (less the three special fields) in 'data', and the resolved
+        paths of the files it includes in 'preloads', 'augments', and
+        'overrides'.  order is the list of those paths such that every
+        file comes after all of the files it includes.
+
+        Each file is read once no matter how many times it's included.
+        Raises a RuntimeError if files include each other in a cycle.
+
+        If report is a dict, it's filled with a dict for each file (keyed
+        by the file's path as a string) of how long it took to resolve
+        its path (through dirmap), read, parse, and freeze it (see
+        YAMLCache.load), the number of nodes in it, and the paths of the
+        files it includes.
+
+        """
+        nodes = {}
+        order = []
+        visiting = []
+
+        def resolve( path, f ):
+            t0 = time.perf_counter()
+            incpath = pathlib.Path( Config.dirmap( f, dirmap ) )
+            if not incpath.is_absolute():
+                incpath = path.parent / incpath
+            incpath = incpath.resolve()
+            if report is not None:
+                timings = report.setdefault( str(incpath), { 'resolve': 0. } )
+                timings['resolve'] += time.perf_counter() - t0
+            return incpath
+
+        def visit( path ):
+            if path in nodes:
+                return
+            if path in visiting:
+                cycle = visiting[ visiting.index(path): ] + [ path ]
+                raise RuntimeError( f'Config files include each other in a cycle: '
+                                    f'{" -> ".join( str(p) for p in cycle )}' )
+            visiting.append( path )
+
+            timings = report.setdefault( str(path), { 'resolve': 0. } ) if report is not None else None
+            filedata = Config.yamlcache.load( path, timings=timings )
+            if timings is not None:
+                timings['nodes'] = Config._count_nodes( filedata )
+            if not isinstance( filedata, dict ):
+                raise RuntimeError( f'Config file {path} doesn\'t have yaml I like.' )
+
+            node = { 'preloads': [], 'augments': [], 'overrides': [] }
+            for importfile in [ 'preloads', 'augments', 'overrides' ]:
+                if importfile in filedata:
+                    if not isinstance( filedata[importfile], list ):
+                        raise TypeError( f'{importfile} must be a list' )
+                    for f in filedata[importfile]:
+                        incpath = resolve( path, f )
+                        visit( incpath )
+                        node[importfile].append( incpath )
+            if any( importfile in filedata for importfile in node ):
+                filedata = { k: v for k, v in filedata.items() if k not in node }
+            node['data'] = filedata
+            if timings is not None:
+                timings.update( { k: [ str(p) for p in node[k] ] for k in ( 'preloads', 'augments', 'overrides' ) } )
+
+            visiting.pop()
+            nodes[path] = node
+            order.append( path )
+
+        t0 = time.perf_counter()
+        path = pathlib.Path( path ).resolve()
+        if report is not None:
+            report[ str(path) ] = { 'resolve': time.perf_counter() - t0 }
+        visit( path )
+        return order, nodes
+
+    @staticmethod
+    def _count_nodes( tree ):
+        """Return the number of dicts, lists, and scalars in tree."""
+        count = 0
+        stack = [ tree ]
+        while len( stack ) > 0:
+            node = stack.pop()
+            count += 1
+            if isinstance( node, dict ):
+                stack.extend( node.values() )
+            elif isinstance( node, list ):
+                stack.extend( node )
+        return count
+
+    @staticmethod
+    def _load_tree( path, dirmap={}, report=None ):
+        """Internal usage, do not call.
+
+        Returns ( tree, files ): the fully merged config tree from file
+        path, and the list of files that went into it.  Builds the tree
+        for each file in the include graph once, dependencies first, so
+        a file included from several places is only merged once.
+
+        If report is a dict, it's filled in as by _include_graph, and
+        for each file, with how long it took to merge the file with what
+        it includes ('merge'), and the number of merge_trees calls and
+        bytes of new dicts and lists that took ('merge_calls' and
+        'merge_bytes'; see merge_trees).
+
+        """
+        order, nodes = Config._include_graph( path, dirmap, report=report )
+        trees = {}
+        for filepath in order:
+            node = nodes[filepath]
+            stats = { 'calls': 0, 'bytes': 0 } if report is not None else None
+            t0 = time.perf_counter()
+            tree = {}
+            for preload in node['preloads']:
+                tree = Config.merge_trees( tree, trees[preload], stats=stats )
+            tree = Config.merge_trees( tree, node['data'], stats=stats )
+            for augment in node['augments']:
+                tree = Config.merge_trees( tree, trees[augment], augment=True, stats=stats )
+            for override in node['overrides']:
+                tree = Config.merge_trees( tree, trees[override], stats=stats )
+            trees[filepath] = tree
+            if report is not None:
+                report[ str(filepath) ].update( { 'merge': time.perf_counter() - t0,
+                                                  'merge_calls': stats['calls'], 'merge_bytes': stats['bytes'] } )
+        return trees[ order[-1] ], order
+
+    @staticmethod
+    def snapshot_path( configfile, snapshotdir, dirmap={} ):
+        """Return the path of the snapshot file for configfile with dirmap in snapshotdir."""
+        configfile = pathlib.Path( configfile ).resolve()
+        ident = hashlib.sha256( repr( ( str(configfile), sorted( dirmap.items() ) ) ).encode( 'utf-8' ) )
+        return pathlib.Path( snapshotdir ) / f"{configfile.stem}-{ident.hexdigest()[:16]}.snapshot"
+
+    @staticmethod
+    def _snapshot_key( configfile, dirmap, filehashes ):
+        key = hashlib.sha256()
+        key.update( repr( ( Config.snapshot_version, str(configfile), sorted( dirmap.items() ) ) ).encode( 'utf-8' ) )
+        for filename, filehash in filehashes.items():
+            key.update( f"{filename}\0{filehash}\0".encode() )
+        return key.hexdigest()
+
+    @staticmethod
+    def _hash_file( path ):
+        with open( path, "rb" ) as ifp:
+            return hashlib.file_digest( ifp, "sha256" ).hexdigest()
+
+    def write_snapshot( self, snapshotdir ):
+        """Save the fully merged config tree to a snapshot file in snapshotdir.
+
+        The snapshot records the sha256 of every file that went into the
+        config, so a later Config.get(..., snapshotdir=snapshotdir) can
+        tell whether it's still current.  Snapshots are pickles, but
+        read_snapshot only unpickles the types a config tree can have.
+
+        Returns the path of the snapshot file.
+
+        """
+        snapshotdir = pathlib.Path( snapshotdir )
+        snapshotdir.mkdir( parents=True, exist_ok=True )
+        filehashes = { str(f): Config._hash_file( f ) for f in self._files }
+        snapshot = { 'version': Config.snapshot_version,
+                     'config': str( self._path ),
+                     'dirmap': dict( self._dirmap ),
+                     'files': filehashes,
+                     'key': Config._snapshot_key( self._path, self._dirmap, filehashes ),
+                     'data': self._data }
+        path = Config.snapshot_path( self._path, snapshotdir, self._dirmap )
+        fd, tmppath = tempfile.mkstemp( dir=snapshotdir, prefix=f".{path.name}." )
+        try:
+            with os.fdopen( fd, "wb" ) as ofp:
+                pickle.dump( snapshot, ofp, protocol=pickle.HIGHEST_PROTOCOL )
+            os.replace( tmppath, path )
+        except Exception:
+            pathlib.Path( tmppath ).unlink( missing_ok=True )
+            raise
+        return path
+
+    @staticmethod
+    def read_snapshot( configfile, snapshotdir, dirmap={} ):
+        """Read the snapshot for configfile with dirmap from snapshotdir.
+
+        Returns a dict with the snapshot, or None if there isn't a
+        readable snapshot of the current version.  Doesn't check whether
+        the snapshot is current; use snapshot_problems for that.
+
+        A snapshot that names anything other than the types a config
+        tree is made of (see _SnapshotUnpickler) isn't loaded, so a
+        doctored snapshot can't run code.
+
+        """
+        path = Config.snapshot_path( configfile, snapshotdir, dirmap )
+        try:
+            with open( path, "rb" ) as ifp:
+                snapshot = _SnapshotUnpickler( ifp ).load()
+        except Exception:
+            return None
+        if ( not isinstance( snapshot, dict ) ) or ( snapshot.get( 'version' ) != Config.snapshot_version ):
+            return None
+        return snapshot
+
+    @staticmethod
+    def snapshot_problems( snapshot ):
+        """Return a list of reasons snapshot is out of date; it's current if the list is empty."""
+        problems = []
+        filehashes = {}
+        for filename, filehash in snapshot['files'].items():
+            try:
+                filehashes[filename] = Config._hash_file( filename )
+            except OSError:
+                problems.append( f"{filename} can't be read" )
+                continue
+            if filehashes[filename] != filehash:
+                problems.append( f"{filename} has changed" )
+        if ( len( problems ) == 0 ) and ( snapshot['key'] != Config._snapshot_key( snapshot['config'],
+                                                                                     snapshot['dirmap'],
+                                                                                     filehashes ) ):
+            problems.append( "snapshot key doesn't match" )
+        return problems
+
+    def use_environment( self, envprefix, environ=None ):
+        """Let environment variables override values in this config.
+
+        A variable named envprefix__field__subfield (e.g.
+        APP__database__host if envprefix is "APP") overrides the config
+        value database.host.  List elements are given by index, as in
+        fieldspecs, e.g. APP__servers__0.  The value of the variable is
+        parsed as yaml, so APP__database__port=5432 is an integer and
+        APP__servers=[ a, b ] is a list; if it isn't valid yaml, it's
+        used as a string.  The variables override the config as if they
+        had been set with set_value, but the config itself isn't
+        changed.  Overlays (see overlay()) override the variables.
+
+        The variables are found when you call this (or Config.get with
+        envprefix), and changes to the environment after that are
+        ignored.  Each variable is only parsed the first time it's
+        looked up.
+
+        environ is a dict to use in place of os.environ.
+
+        """
+        env = _EnvOverlay( envprefix, os.environ if environ is None else environ )
+        with self._lock:
+            self._env = env
+            if self._interp is not None:
+                self._interp.invalidate()
+
+    def use_interpolation( self ):
+        """Replace references to other fields in config strings with their values.
+
+        After calling this (or Config.get with interpolate=True), "${field}"
+        in a string value is replaced by the value of field (which may
+        itself have references in it), so with
+
+          dirs:
+            base: /data
+            images: ${dirs.base}/images
+
+        value( "dirs.images" ) returns "/data/images".  If the whole
+        string is one reference, you get the referenced value as is (so
+        it can be a number, list, or dict); otherwise it's converted to
+        a string.  Write "$${" for a literal "${".  Subtrees you get from
+        value() have references in them replaced too.
+
+        References are resolved the first time a field is looked up, and
+        the result is remembered until the config changes in a way that
+        affects it.  (set_value, update, and reload only forget the
+        values that depend on the fields they change.)  Fields that
+        refer to each other in a loop raise a ValueError.  Dicts and
+        lists that had to be changed to replace references are frozen
+        (see freeze()).  Inside an overlay (see overlay()), nothing is
+        remembered.
+
+        """
+        with self._lock:
+            if self._interp is None:
+                self._interp = _Interpolation()
+
+    def _base_tree( self ):
+        """The config's tree, with environment variables (see use_environment) applied."""
+        env = self._env
+        return self._data if env is None else env.tree( self._data, self._frozen )
+
+    def freeze( self ):
+        """Make this config's tree read-only.
+
+        Every dict and list in the tree is converted (once) to a
+        FrozenDict or FrozenList, so value() can hand out subtrees
+        without anybody having to copy them defensively, and clone()
+        can share the tree rather than copying it.  set_value still
+        works (it never modifies the tree in place); the new parts of
+        the tree it makes are frozen too.
+
+        """
+        with self._lock:
+            if self._frozen:
+                return
+            data = freeze( self._data )
+            self._state = ( data, Config._make_index( data ) )
+            self._frozen = True
+            if self._interp is not None:
+                self._interp.invalidate()
+
+    def compact( self, minlength=64 ):
+        """Store this config's long lists of numbers compactly, and intern its strings.
+
+        Lists of at least minlength ints (or at least minlength floats)
+        become CompactLists, which store the numbers in an array.array
+        rather than as a list of Python objects, and every string in the
+        tree is interned so that repeated strings are stored once.  See
+        compact() (the function) for details.  value() returns a
+        CompactList where it would have returned the list; use array()
+        to get it as a numpy array without copying it.  The elements of
+        a CompactList aren't in the index, so looking one up walks the
+        tree from the list down.
+
+        A CompactList isn't a list, so anything that insists on one
+        won't take it.  In particular, json.dumps (and so a web
+        response made from config values) raises TypeError unless you
+        pass it default=json_default (this module's), or you give it
+        the CompactList's tolist() instead.
+
+        The config remembers to do this again after a reload, augment,
+        or override.
+
+        """
+        with self._lock:
+            data = compact( self._data, minlength )
+            if self._frozen:
+                data = freeze( data )
+            self._state = ( data, Config._make_index( data ) )
+            self._compact = minlength
+            if self._interp is not None:
+                self._interp.invalidate()
+
+    def array( self, field ):
+        """Return the list at field as a read-only numpy array.
+
+        If the list is a CompactList (see compact()), the array is a view
+        of its memory, not a copy.  Otherwise, the list is copied into a
+        new array.  Needs numpy.
+
+        """
+        if numpy is None:
+            raise RuntimeError( "Config.array needs numpy, which isn't installed" )
+        node = self.value( field )
+        if isinstance( node, CompactList ):
+            arr = numpy.frombuffer( node.array, dtype=node.array.typecode )
+        elif isinstance( node, list ):
+            arr = numpy.array( node )
+        else:
+            raise TypeError( f"Config field {field} is a {type(node).__name__}, not a list" )
+        arr.flags.writeable = False
+        return arr
+
+    @property
+    def frozen( self ):
+        return self._frozen
+
+    @property
+    def _data( self ):
+        return self._state[0]
+
+    @property
+    def _index( self ):
+        return self._state[1]
+
+    def subscribe( self, callback ):
+        """Call callback( config, changed ) whenever reload() changes the config.
+
+        changed is a set of the period-separated paths that changed: the
+        leaves whose values are different, and the subtrees that were
+        added or removed.  Callbacks are called from whichever thread
+        ran the reload (for watch(), the watcher thread).
+
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append( callback )
+
+    def unsubscribe( self, callback ):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove( callback )
+
+    def reload( self ):
+        """Re-read the config files and swap in the new config.
+
+        The new tree is read, merged, and indexed before it replaces the
+        old one, so value() never sees a partly built config.  Anything
+        changed with set_value (or augment or override) is lost.  Calls
+        the subscribed callbacks if anything changed.
+
+        Returns the set of changed paths (see subscribe).
+
+        """
+        newdata, newfiles, fromsnapshot = self._read_tree()
+        if self._compact is not None:
+            newdata = compact( newdata, self._compact )
+        newdata = self._own( newdata )
+        newindex = Config._make_index( newdata )
+        with self._lock:
+            olddata = self._data
+            self._state = ( newdata, newindex )
+            self._files = newfiles
+            subscribers = list( self._subscribers )
+        if not fromsnapshot:
+            self._save_snapshot()
+
+        changed = set()
+        Config._changed_paths( olddata, newdata, "", changed )
+        if self._interp is not None:
+            self._interp.invalidate( changed )
+        if len( changed ) > 0:
+            for callback in subscribers:
+                try:
+                    callback( self, changed )
+                except Exception:
+                    self.logger.exception( f'Exception in config change callback {callback}' )
+        return changed
+
+    @staticmethod
+    def _changed_paths( old, new, prefix, changed ):
+        """Add to changed the paths under prefix that differ between trees old and new."""
+        if old is new:
+            return
+        if isinstance( old, dict ) and isinstance( new, dict ):
+            for key in list( old.keys() ) + [ k for k in new.keys() if k not in old ]:
+                path = f"{prefix}.{key}" if len( prefix ) > 0 else str( key )
+                oldval = old.get( key, _NOTFOUND )
+                newval = new.get( key, _NOTFOUND )
+                if ( oldval is _NOTFOUND ) or ( newval is _NOTFOUND ):
+                    changed.add( path )
+                else:
+                    Config._changed_paths( oldval, newval, path, changed )
+        elif isinstance( old, _LISTS ) and isinstance( new, _LISTS ) and ( len( old ) == len( new ) ):
+            if ( isinstance( old, CompactList ) and isinstance( new, CompactList )
+                 and ( old.array.typecode == new.array.typecode ) and ( old.array == new.array ) ):
+                return
+            for i, ( oldval, newval ) in enumerate( zip( old, new ) ):
+                Config._changed_paths( oldval, newval, f"{prefix}.{i}", changed )
+        elif ( type( old ) is not type( new ) ) or ( old != new ):
+            changed.add( prefix )
+
+    def watch( self, interval=1.0, use_inotify=True ):
+        """Start a background thread that reloads the config when its files change.
+
+        Watches every file that went into the config (the include chain
+        is rechecked after each reload).  Uses inotify if the
+        inotify_simple package is installed (and use_inotify is True),
+        otherwise checks the files' modification times and sizes every
+        interval seconds.  If a reload fails (e.g. a file is caught
+        half-written), the error is logged and the old config is kept.
+
+        Does nothing if this config is already being watched.
+
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            stop = threading.Event()
+            if use_inotify and ( inotify_simple is not None ):
+                target = self._watch_inotify
+            else:
+                target = self._watch_poll
+            thread = threading.Thread( target=target, args=( interval, stop ), daemon=True,
+                                       name=f"Config watcher for {self._path}" )
+            self._watcher = ( thread, stop )
+        thread.start()
+
+    def stop_watching( self ):
+        """Stop the thread started by watch()."""
+        with self._lock:
+            watcher = self._watcher
+            self._watcher = None
+        if watcher is not None:
+            watcher[1].set()
+            watcher[0].join()
+
+    def _reload_from_watcher( self ):
+        try:
+            self.reload()
+        except Exception:
+            self.logger.exception( f'Failed to reload config {self._path}; keeping the old one' )
+
+    def _file_stats( self ):
+        stats = {}
+        for path in self._files:
+            try:
+                stat = path.stat()
+                stats[path] = ( stat.st_mtime_ns, stat.st_size, stat.st_ino )
+            except OSError:
+                stats[path] = None
+        return stats
+
+    def _watch_poll( self, interval, stop ):
+        stats = self._file_stats()
+        while not stop.wait( interval ):
+            newstats = self._file_stats()
+            if newstats != stats:
+                self._reload_from_watcher()
+                stats = self._file_stats()
+
+    def _watch_inotify( self, interval, stop ):
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE | flags.ATTRIB
+        with inotify_simple.INotify() as inotify:
+            watches = {}
+            while not stop.is_set():
+                names = { ( path.parent, path.name ) for path in self._files }
+                for directory in { d for d, _ in names } - set( watches.values() ):
+                    watches[ inotify.add_watch( directory, mask ) ] = directory
+                events = inotify.read( timeout=int( interval * 1000 ) )
+                if any( ( watches.get( ev.wd ), ev.name ) in names for ev in events ):
+                    # Let a burst of writes (e.g. an editor saving) finish first
+                    while len( inotify.read( timeout=50 ) ) > 0:
+                        pass
+                    self._reload_from_watcher()
 
     def augment( self, augmentfile, dirmap={} ):
         """Read file (or path) augmentfile and augment config data.
@@ -229,10 +1680,18 @@ class Config:
         augmentpath = pathlib.Path( augmentfile )
         if not augmentpath.is_absolute():
             augmentpath = ( self._path.parent / augmentfile ).resolve()
-        augment = Config( augmentpath, logger=self.logger, dirmap=dirmap )._data
-        self._data = Config.merge_trees( self._data, augment, augment=True )
-
-    def override( self, overridefile, dirmap=dirmap ):
+        augment, files = Config._load_tree( augmentpath, dirmap )
+        with self._lock:
+            data = Config.merge_trees( self._data, augment, augment=True )
+            if self._compact is not None:
+                data = compact( data, self._compact )
+            data = self._own( data )
+            self._state = ( data, Config._make_index( data ) )
+            self._files.extend( f for f in files if f not in self._files )
+            if self._interp is not None:
+                self._interp.invalidate()
+
+    def override( self, overridefile, dirmap={} ):
         """Read file (or path) overridefile and override config data.
 
         * If the old and new items have different types (scalar vs. list
@@ -250,10 +1709,54 @@ class Config:
         overridepath = pathlib.Path( overridefile )
         if not overridepath.is_absolute():
             overridepath = ( self._path.parent / overridefile ).resolve()
-        override = Config( overridepath, logger=self.logger, dirmap=dirmap )._data
-        self._data = Config.merge_trees( self._data, override )
+        override, files = Config._load_tree( overridepath, dirmap )
+        with self._lock:
+            data = Config.merge_trees( self._data, override )
+            if self._compact is not None:
+                data = compact( data, self._compact )
+            data = self._own( data )
+            self._state = ( data, Config._make_index( data ) )
+            self._files.extend( f for f in files if f not in self._files )
+            if self._interp is not None:
+                self._interp.invalidate()
+
+    @contextlib.contextmanager
+    def overlay( self, settings, appendlists=False ):
+        """Temporarily change config values for the current thread or asyncio task.
+
+        Use as
+
+            with confobj.overlay( { "db.timeout": 5 } ):
+                ...
+
+        Inside the with block, value() in this thread or task (and any
+        asyncio tasks it creates) sees the values in settings, a dict of
+        period-separated fieldspecs to values, set following the same
+        rules as set_value.  Nothing else sees them, and the config
+        itself isn't changed.  Overlays can be nested; the inner one
+        applies on top of the outer one.
+
+        The cost is proportional to the number (and depth) of the
+        fields in settings, not to the size of the config.
+
+        """
+        current = _overlays.get()
+        parent = current.get( self ) if current is not None else None
+        layer = _ConfigOverlay( settings, parent, appendlists=appendlists )
+        # Build the overlaid tree now, so bad settings raise here rather than in value()
+        layer.tree( self._base_tree(), self._frozen )
+        token = _overlays.set( { **( current or {} ), self: layer } )
+        try:
+            yield self
+        finally:
+            _overlays.reset( token )
 
-    def value( self, field, struct=None ):
+    @staticmethod
+    def compile( field ):
+        """Return a ConfigPath for field, to pass to value() or set_value() in place of the string."""
+        return ConfigPath( field )
+
+    def value( self, field, struct=None, default=_NODEFAULT ):
         """Get a value from the config structure.
 
         For trees, separate fields by periods.  If there is
@@ -283,42 +1786,290 @@ class Config:
         You can also specify a branch to get back the rest of the
         subtree; for instance configobj.value( "dict1.dict2" ) would
         return the dictionary { "sub1": "2level1", "sub2": "2level2" }.
+
+        field can also be a ConfigPath (see Config.compile), which saves
+        parsing the string again if you look up the same field a lot.
+
+        If field isn't in the config, raises a ValueError, unless you
+        pass default, in which case that's returned instead (without
+        raising and catching anything along the way).  See also has()
+        and values().
         """
 
-        if struct is None:
-            struct = self._data
-        fields, isleaf, curfield, ifield = self._fieldsep( field )
-
-        if isinstance( struct, list ):
-            if ifield is None:
-                raise ValueError( f'Failed to parse {curfield} as an integer index' )
-            if ifield >= len(struct):
-                raise ValueError( f'{ifield} > {len(struct)}, the length of the list' )
-            if isleaf:
-                return struct[ifield]
-            else:
+        # Fast path for the usual case: a field in the index, with nothing on top of the tree
+        if ( struct is None ) and ( self._env is None ) and ( self._interp is None ) and ( _overlays.get() is None ):
+            data, index = self._state
+            entry = index.get( field )
+            if entry is not None:
                 try:
-                    return self.value( ".".join(fields[1:]), struct[ifield] )
-                except Exception:
-                    traceback.print_exc()
-                    raise ValueError( f'Error getting list element {ifield}' )
-        elif isinstance( struct, dict ):
-            if curfield not in struct:
-                raise ValueError( f'Field {curfield} doesn\'t exist' )
-            if isleaf:
-                return struct[curfield]
-            else:
-                try:
-                    return self.value( ".".join(fields[1:]), struct[curfield] )
-                except Exception:
-                    traceback.print_exc()
-                    raise ValueError( f'Error getting field {curfield}' )
+                    return ( data if entry[0] is None else entry[0] )[ entry[1] ]
+                except ( KeyError, IndexError ):
+                    pass
+
+        node = self._lookup( field, struct, default )
+        if ( self._interp is None ) or ( struct is not None ) or ( node is default ):
+            return node
+        return self._interpolate( field.field if isinstance( field, ConfigPath ) else field, node )
+
+    def _lookup( self, field, struct=None, default=_NODEFAULT ):
+        """Internal usage, do not call.  value(), without interpolation."""
+
+        if isinstance( field, ConfigPath ):
+            path = field
+            field = path.field
+        else:
+            path = None
+
+        if struct is None:
+            overlays = _overlays.get()
+            if overlays is not None:
+                layer = overlays.get( self )
+                if ( layer is not None ) and layer.covers( field ):
+                    return Config._walk( layer.tree( self._base_tree(), self._frozen ), path or ConfigPath( field ),
+                                         default )
+            env = self._env
+            if ( env is not None ) and env.covers( field ):
+                if field in env.leaves:
+                    return env.parse( field )
+                return Config._walk( env.tree( self._data, self._frozen ), path or ConfigPath( field ), default )
+            struct, index = self._state
+            node = Config._indexed( index, struct, field )
+            if node is not _NOTFOUND:
+                return node
+            # Not in the index; walk the tree so that odd field specs
+            #   (e.g. "01" as a list index) and errors behave as they always have.
+        return Config._walk( struct, path or ConfigPath( field ), default )
+
+    def has( self, field ):
+        """True if value( field ) would return something rather than raise an exception."""
+        return self._lookup( field, default=_NOTFOUND ) is not _NOTFOUND
+
+    def _interpolate( self, field, node, stack=() ):
+        """Internal usage, do not call.
+
+        Return node, the value of field, with references replaced (see
+        use_interpolation).  stack is the fields whose references are
+        being resolved, to catch loops.
+
+        """
+        if isinstance( node, str ):
+            if '${' not in node:
+                return node
+        elif not isinstance( node, ( dict, list ) ):
+            return node
+
+        if field in stack:
+            raise ValueError( f"Config fields refer to each other in a loop: {' -> '.join( stack + ( field, ) )}" )
+
+        interp = self._interp
+        overlays = _overlays.get()
+        memoize = ( overlays is None ) or ( self not in overlays )
+        if memoize:
+            val = interp.memo.get( field, _NOTFOUND )
+            if val is not _NOTFOUND:
+                return val
+            generation = interp.generation
+
+        refs = set()
+        stack = stack + ( field, )
+        if isinstance( node, str ):
+            val = self._interpolate_string( node, stack, refs )
+        elif isinstance( node, dict ):
+            val = node
+            for key, child in node.items():
+                if ( not isinstance( key, str ) ) or ( '.' in key ):
+                    continue
+                newchild = self._interpolate( f"{field}.{key}", child, stack )
+                if newchild is not child:
+                    if val is node:
+                        val = dict( node )
+                    val[key] = newchild
+            val = freeze( val ) if val is not node else node
         else:
-            if not isleaf:
-                raise ValueError( f'Tried to get field {curfield} of scalar!' )
-            return struct
+            val = node
+            for i, child in enumerate( node ):
+                newchild = self._interpolate( f"{field}.{i}", child, stack )
+                if newchild is not child:
+                    if val is node:
+                        val = list( node )
+                    val[i] = newchild
+            val = freeze( val ) if val is not node else node
+
+        if memoize:
+            with interp.lock:
+                if interp.generation == generation:
+                    interp.memo[field] = val
+                    for ref in refs:
+                        interp.deps.setdefault( ref, set() ).add( field )
+        return val
+
+    def _interpolate_string( self, string, stack, refs ):
+        """Internal usage, do not call.  Replace the references in string; see _interpolate."""
+
+        def reference( ref ):
+            refs.add( ref )
+            return self._interpolate( ref, self._lookup( ref ), stack )
+
+        match = _REFERENCE.fullmatch( string )
+        if match is not None:
+            return reference( match.group(1) )
+        return _INTERPOLATION.sub( lambda m: '${' if m.group(1) is None else str( reference( m.group(1) ) ), string )
+
+    def values( self, fields, default=_NODEFAULT ):
+        """Get several values from the config at once.
+
+        fields is a list of fieldspecs (strings or ConfigPaths, see
+        value()).  Returns a list of the values, in the same order.  If
+        any of them isn't in the config, raises a ValueError unless you
+        pass default, in which case that's used for the missing ones.
+
+        Fields that aren't in the index are all found in a single walk
+        down the tree, rather than walking it once for each one.
+
+        """
+        paths = [ ConfigPath( f ) for f in fields ]
+        results = [ _NOTFOUND ] * len( paths )
+
+        data, index = self._state
+        env = self._env
+        overlays = _overlays.get()
+        layer = overlays.get( self ) if overlays is not None else None
+
+        # Lists of the indexes of the paths that have to be found by walking each tree
+        tofind = { 'base': ( data, [] ) }
+        missing = set()
+        for i, path in enumerate( paths ):
+            if ( layer is not None ) and layer.covers( path.field ):
+                if 'overlay' not in tofind:
+                    envtree = env.tree( data, self._frozen ) if env is not None else data
+                    tofind['overlay'] = ( layer.tree( envtree, self._frozen ), [] )
+                tofind['overlay'][1].append( i )
+            elif ( env is not None ) and env.covers( path.field ):
+                if path.field in env.leaves:
+                    results[i] = env.parse( path.field )
+                else:
+                    if 'env' not in tofind:
+                        tofind['env'] = ( env.tree( data, self._frozen ), [] )
+                    tofind['env'][1].append( i )
+            else:
+                results[i] = Config._indexed( index, data, path.field )
+                if results[i] is _NOTFOUND:
+                    tofind['base'][1].append( i )
+
+        for struct, which in tofind.values():
+            if len( which ) == 0:
+                continue
+            found = Config._walk_many( struct, [ paths[i] for i in which ] )
+            for i, val in zip( which, found ):
+                if val is not _NOTFOUND:
+                    results[i] = val
+                elif default is not _NODEFAULT:
+                    results[i] = default
+                    missing.add( i )
+                else:
+                    # Raises the exception value() would have
+                    Config._walk( struct, paths[i] )
+
+        if self._interp is not None:
+            results = [ val if i in missing else self._interpolate( paths[i].field, val )
+                        for i, val in enumerate( results ) ]
+        return results
+
+    @staticmethod
+    def _walk_many( struct, paths ):
+        """Internal usage, do not call.
+
+        Find each of paths (a list of ConfigPath) in struct, walking
+        down the tree only once.  Returns a list of the values, with
+        _NOTFOUND for the ones that value() wouldn't find.
 
-    def set_value( self, field, value, structpass=None, appendlists=False ):
+        """
+        results = [ _NOTFOUND ] * len( paths )
+        # Trie of the paths; a None key holds the indexes of the paths that end at that node
+        trie = {}
+        for i, path in enumerate( paths ):
+            node = trie
+            for key in path.keys:
+                node = node.setdefault( key, {} )
+            node.setdefault( None, [] ).append( i )
+
+        stack = [ ( struct, trie ) ]
+        while len( stack ) > 0:
+            struct, node = stack.pop()
+            for key, child in node.items():
+                if key is None:
+                    continue
+                curfield, ifield = key
+                if isinstance( struct, _LISTS ):
+                    if ( ifield is None ) or ( ifield >= len(struct) ) or ( ifield < -len(struct) ):
+                        continue
+                    sub = struct[ifield]
+                elif isinstance( struct, dict ):
+                    if curfield not in struct:
+                        continue
+                    sub = struct[curfield]
+                else:
+                    # A field just below a scalar gives the scalar (see _walk)
+                    for i in child.get( None, () ):
+                        results[i] = struct
+                    continue
+                for i in child.get( None, () ):
+                    results[i] = sub
+                stack.append( ( sub, child ) )
+
+        return results
+
+    @staticmethod
+    def _walk( struct, path, default=_NODEFAULT ):
+        """Internal usage, do not call.
+
+        Find path (a ConfigPath) in struct by walking down the tree.
+        If it's not there, returns default if given, otherwise raises
+        the same ValueErrors that value() always has, including
+        reporting failures below the top level as a failure to get the
+        top-level field.
+
+        """
+        last = len( path.keys ) - 1
+        outer = None
+        for depth, ( curfield, ifield ) in enumerate( path.keys ):
+            if isinstance( struct, _LISTS ):
+                if ifield is None:
+                    err = ValueError( f'Failed to parse {curfield} as an integer index' )
+                elif ifield >= len(struct):
+                    err = ValueError( f'{ifield} > {len(struct)}, the length of the list' )
+                else:
+                    try:
+                        struct = struct[ifield]
+                    except IndexError:
+                        if default is not _NODEFAULT:
+                            return default
+                        if outer is None:
+                            raise
+                        raise ValueError( outer )
+                    if depth == last:
+                        return struct
+                    if outer is None:
+                        outer = f'Error getting list element {ifield}'
+                    continue
+            elif isinstance( struct, dict ):
+                if curfield in struct:
+                    struct = struct[curfield]
+                    if depth == last:
+                        return struct
+                    if outer is None:
+                        outer = f'Error getting field {curfield}'
+                    continue
+                err = ValueError( f'Field {curfield} doesn\'t exist' )
+            else:
+                if depth == last:
+                    return struct
+                err = ValueError( f'Tried to get field {curfield} of scalar!' )
+            if default is not _NODEFAULT:
+                return default
+            raise err if outer is None else ValueError( outer )
+
+    def set_value( self, field, value, appendlists=False ):
         """Set a value in the singleton for the current session.
 
         Does not save to disk.  Follows the standard rules docuemnted in
@@ -326,107 +2077,344 @@ class Config:
         "augment", else "override".  Will create the whole hierarchy if
         necessary.
 
+        The tree isn't modified in place.  The dicts and lists along the
+        path to field are copied, and everything else is shared with the
+        old tree, so subtrees shared with Config.yamlcache (or that you
+        got from value() earlier) are never changed underneath you.
+
         """
 
-        if structpass is None:
-            structpass = types.SimpleNamespace()
-            structpass.struct = self._data
-        elif not hasattr( structpass, 'struct' ):
-            raise ValueError( 'structpass must have a field "struct"' )
-        fields, isleaf, curfield, ifield = self._fieldsep( field )
+        path = ConfigPath( field )
+        with self._lock:
+            data, index = self._state
+            newdata, rdepth, appended = Config._set_tree( data, path, value, appendlists=appendlists )
+            if self._frozen:
+                newdata = freeze( newdata )
+            index = _IndexOverlay.settle( Config._update_index( _IndexOverlay( index ), data, newdata, path,
+                                                                rdepth, appended ) )
+            self._state = ( newdata, index )
+            if self._interp is not None:
+                self._interp.invalidate( [ path.field ] )
+
+    def update( self, mapping, appendlists=False ):
+        """Set a lot of values in the singleton for the current session at once.
+
+        mapping is a dict of fieldspec: value, where the values may
+        themselves be dicts of fieldspec: value, so these are all the
+        same:
+
+            confobj.update( { "db.host": "h", "db.port": 5432 } )
+            confobj.update( { "db": { "host": "h", "port": 5432 } } )
+            confobj.update( { "db": { "host": "h" }, "db.port": 5432 } )
+
+        (If you want to replace a whole dict in the config, use
+        set_value.  An empty dict in mapping is set as a value.)
+
+        The result is the same as calling set_value for each field in
+        turn, but the dicts and lists along the paths are each copied
+        only once no matter how many of the fields are under them, and
+        the index is brought up to date only once at the end.  Other
+        threads see either none of the changes or all of them, and if
+        setting any of the fields raises an exception, none are set.
 
-        if isleaf:
-            if isinstance( structpass.struct, list ):
-                if appendlists:
-                    if ifield is None:
-                        raise TypeError( "Tried to add a non-integer field to a list." )
-                    structpass.struct.append( value )
-                else:
-                    if ifield is None:
-                        structpass.struct = { curfield: value }
-                    else:
-                        structpass.struct = [ value ]
-            elif isinstance( structpass.struct, dict ):
-                if ifield is not None:
-                    raise TypeError( "Tried to add an integer field to a dict." )
-                structpass.struct[curfield] = value
+        """
+
+        paths = list( Config._flatten_update( mapping ) )
+        with self._lock:
+            data, index = self._state
+            tree = data
+            owned = {}
+            roots = {}
+            for path, value in paths:
+                tree, rdepth, _ = Config._set_tree( tree, path, value, appendlists=appendlists, owned=owned )
+                if rdepth == 0:
+                    roots = None
+                elif roots is not None:
+                    roots[ path.prefixes[rdepth-1] ] = ( path, rdepth )
+            if self._frozen:
+                tree = freeze( tree )
+            if roots is None:
+                index = Config._make_index( tree )
             else:
-                structpass.struct = { curfield: value }
-        else:
-            structchuck = types.SimpleNamespace()
-            try:
-                nextifield = int( fields[1] )
-            except ValueError:
-                nextifield = None
+                index = _IndexOverlay.settle( Config._reindex( _IndexOverlay( index ), data, tree, roots ) )
+            self._state = ( tree, index )
+            if self._interp is not None:
+                self._interp.invalidate( [ path.field for path, _ in paths ] )
 
-            if isinstance( structpass.struct, list ):
-                structchuck.struct = {} if nextifield is None else []
-                self.set_value( ".".join(fields[1:], value, structchuck, appendlists=appendlists ) )
+    @staticmethod
+    def _flatten_update( mapping, prefix="" ):
+        """Internal usage, do not call.
+
+        Yields ( ConfigPath, value ) for the leaves of mapping (see update).
+
+        """
+        for field, value in mapping.items():
+            if isinstance( field, ConfigPath ):
+                field = field.field
+            if isinstance( value, dict ) and ( len( value ) > 0 ):
+                yield from Config._flatten_update( value, f"{prefix}{field}." )
+            else:
+                yield ConfigPath( f"{prefix}{field}" ), value
+
+    @staticmethod
+    def _set_tree( tree, path, value, appendlists=False, owned=None ):
+        """Internal usage, do not call.
+
+        Returns ( newtree, rdepth, appended ).  newtree is tree with
+        value set at path, a ConfigPath (see set_value).  With fields =
+        path.fields, the nodes at fields[:i]
+        for 0 < i < rdepth are copies of dicts in tree that differ only
+        in the next key down; the node at fields[:rdepth] is new.  If
+        appended is True, that node is a list that is the old list with
+        one new element on the end.
+
+        owned, if not None, is a dict of id -> container for containers
+        that were made by earlier calls in the same batch (see update).
+        Those are modified in place rather than copied, and the
+        containers this call makes are added to it.
+
+        """
+
+        keys = path.keys
+        nfields = len( keys )
+        frames = []
+        node = tree
+        for i, ( curfield, ifield ) in enumerate( keys ):
+            if i == nfields - 1:
+                if isinstance( node, _LISTS ):
+                    if appendlists:
+                        if ifield is None:
+                            raise TypeError( "Tried to add a non-integer field to a list." )
+                        frames.append( ( 'append', node, curfield ) )
+                    else:
+                        frames.append( ( 'replace', node, curfield if ifield is None else None ) )
+                elif isinstance( node, dict ):
+                    if ifield is not None:
+                        raise TypeError( "Tried to add an integer field to a dict." )
+                    frames.append( ( 'dict', node, curfield ) )
+                else:
+                    frames.append( ( 'replace', node, curfield ) )
+                break
+
+            fresh = {} if keys[i+1][1] is None else []
+
+            if isinstance( node, _LISTS ):
                 if appendlists:
                     if ifield is None:
                         raise TypeError( "Tried to add a non-integer field to a list" )
-                    structpass.struct.append( structchuck.struct )
+                    frames.append( ( 'append', node, curfield ) )
                 else:
-                    if ifield is None:
-                        structpass.struct = { curfield: structchuck.struct }
-                    else:
-                        structpass.struct = [ structchuck.struct ]
+                    frames.append( ( 'replace', node, curfield if ifield is None else None ) )
+                node = fresh
+            elif ifield is None:
+                if isinstance( node, dict ):
+                    frames.append( ( 'dict', node, curfield ) )
+                    node = node[curfield] if curfield in node else fresh
+                else:
+                    frames.append( ( 'replace', node, curfield ) )
+                    node = fresh
             else:
-                if ifield is None:
-                    if isinstance( structpass.struct, dict ):
-                        if curfield in structpass.struct:
-                            structchuck.struct = structpass.struct[curfield]
-                        else:
-                            structchuck.struct = {} if nextifield is None else []
-                    else:
-                        structpass.struct = {}
-                    self.set_value( ".".join(fields[1:]), value, structchuck, appendlists=appendlists )
-                    structpass.struct[curfield] = structchuck.struct
+                if isinstance( node, dict ):
+                    raise TypeError( "Tried to add an integer field to a dict" )
+                frames.append( ( 'replace', node, None ) )
+                node = fresh
+
+        # Rebuild from the bottom up.  A 'replace' frame throws away the
+        #   old node and makes a new dict (if it has a key) or a
+        #   one-element list (if it doesn't).
+        rdepth = nfields
+        appended = False
+        for depth, ( kind, _, _ ) in enumerate( frames ):
+            if kind != 'dict':
+                rdepth = depth
+                appended = ( kind == 'append' )
+                break
+
+        newnode = value
+        for kind, oldnode, key in reversed( frames ):
+            if ( owned is not None ) and ( kind != 'replace' ) and ( id(oldnode) in owned ):
+                # Made earlier in the same batch, so nobody else has it; change it in place.
+                #   Everything above it was made in the batch too, and already points to it.
+                if kind == 'dict':
+                    oldnode[key] = newnode
                 else:
-                    if isinstance( structpass.struct, dict ):
-                        raise TypeError( "Tried to add an integer field to a dict" )
-                    structchuck.struct = {} if nextifield is None else []
-                    self.set_value( ".".join(fields[1:]), value, structchuck, appendlists=appendlists )
-                    structpass.struct = [ structchuck.struct ]
-
-    @classmethod
-    def _fieldsep( cls, field ):
-        """Parses a period-separated config specifier string.
-        Returns:
-          fields : list of the hierarchy (e.g. "val1.val2.val3" returns ["val1","val2","val3"])
-          isleaf : True if len(fields) is 1, otherwise false
-          curfield : The first element of the field (val1 in the example above)
-          ifield : None if curfield is not an integer, otherwise the integer value of curfield
-        """
-        fields = field.split( "." )
-        isleaf = ( len(fields) == 1 )
-        curfield = fields[0]
+                    oldnode.append( newnode )
+                return tree, rdepth, appended
+            if kind == 'dict':
+                newdict = dict( oldnode )
+                newdict[key] = newnode
+                newnode = newdict
+            elif kind == 'append':
+                newnode = oldnode + [ newnode ]
+            elif key is None:
+                newnode = [ newnode ]
+            else:
+                newnode = { key: newnode }
+            if owned is not None:
+                owned[ id(newnode) ] = newnode
+
+        return newnode, rdepth, appended
+
+    @staticmethod
+    def _update_index( index, olddata, newdata, path, rdepth, appended ):
+        """Bring index of olddata up to date for newdata from _set_tree; see that method.
+
+        Returns the updated index.
+
+        """
+
+        if rdepth == 0:
+            return Config._make_index( newdata )
+
+        fields = path.fields
+        oldnode = olddata
+        newnode = newdata
+        for depth in range( 1, rdepth + 1 ):
+            oldnode = oldnode.get( fields[depth-1], _NOTFOUND ) if isinstance( oldnode, dict ) else _NOTFOUND
+            parent = newnode if depth > 1 else None
+            newnode = newnode[ fields[depth-1] ]
+            if depth < rdepth:
+                index[ path.prefixes[depth-1] ] = ( parent, fields[depth-1] )
+                Config._repoint( index, f"{path.prefixes[depth-1]}.", newnode )
+
+        prefix = path.prefixes[rdepth-1]
+        if appended:
+            Config._repoint( index, f"{prefix}.", newnode )
+            Config._index_subtree( index, f"{prefix}.{len(newnode)-1}", newnode[-1], newnode, len(newnode) - 1 )
+        else:
+            if oldnode is not _NOTFOUND:
+                Config._unindex_subtree( index, prefix, oldnode )
+            Config._index_subtree( index, prefix, newnode, parent, fields[rdepth-1] )
+        return index
+
+    @staticmethod
+    def _reindex( index, olddata, newdata, roots ):
+        """Bring index of olddata up to date for newdata from a batch of _set_tree calls.
+
+        roots is a dict of fieldspec: ( ConfigPath, rdepth ) for the
+        nodes that each call replaced (see _set_tree).  Returns the
+        updated index.
+
+        """
+        # Only the topmost roots matter; anything under them is reindexed with them
+        topmost = [ ( prefix, path, rdepth ) for prefix, ( path, rdepth ) in roots.items()
+                    if not any( p in roots for p in path.prefixes[:rdepth-1] ) ]
+
+        for prefix, path, rdepth in topmost:
+            oldnode = olddata
+            newnode = newdata
+            for depth in range( rdepth ):
+                field = path.fields[depth]
+                oldnode = oldnode.get( field, _NOTFOUND ) if isinstance( oldnode, dict ) else _NOTFOUND
+                parent = newnode if depth > 0 else None
+                newnode = newnode[field]
+                if depth < rdepth - 1:
+                    index[ path.prefixes[depth] ] = ( parent, field )
+                    Config._repoint( index, f"{path.prefixes[depth]}.", newnode )
+            if oldnode is not _NOTFOUND:
+                Config._unindex_subtree( index, prefix, oldnode )
+            Config._index_subtree( index, prefix, newnode, parent, path.fields[rdepth-1] )
+
+        return index
+
+    @staticmethod
+    def _make_index( data ):
+        """Return the flat path -> ( container, key ) index of tree data; see _index_subtree."""
+        index = {}
+        for key, val in data.items():
+            if isinstance( key, str ) and ( '.' not in key ):
+                Config._index_subtree( index, key, val, None, key )
+        return index
+
+    @staticmethod
+    def _index_subtree( index, path, node, parent, key ):
+        """Add path, which is node, parent[key], and every path below it, to index.
+
+        Each path's entry is ( container, key ) for the dict or list
+        that holds it, so a lookup reads container[key] and sees
+        changes made in place to what value() returned.  The container
+        is None for the top of the tree, which set_value replaces every
+        time.  Dict keys that aren't strings, or that contain a period,
+        can't be reached by a field spec, so they're skipped.
+
+        """
+        stack = [ ( path, node, parent, key ) ]
+        while len(stack) > 0:
+            path, node, parent, key = stack.pop()
+            index[path] = ( parent, key )
+            if isinstance( node, dict ):
+                stack.extend( ( f"{path}.{k}", v, node, k ) for k, v in node.items()
+                              if isinstance( k, str ) and ( '.' not in k ) )
+            elif isinstance( node, list ):
+                stack.extend( ( f"{path}.{i}", v, node, i ) for i, v in enumerate( node ) )
+
+    @staticmethod
+    def _repoint( index, prefix, node ):
+        """Point the index entries of node's children, at prefix, at node, a copy of the container that held them."""
+        if isinstance( node, dict ):
+            index.update( { f"{prefix}{k}": ( node, k ) for k in node if isinstance( k, str ) and ( '.' not in k ) } )
+        elif isinstance( node, list ):
+            index.update( { f"{prefix}{i}": ( node, i ) for i in range( len(node) ) } )
+
+    @staticmethod
+    def _indexed( index, data, field ):
+        """Return the node at field (a string) in tree data according to its index, or _NOTFOUND."""
+        entry = index.get( field )
+        if entry is None:
+            return _NOTFOUND
         try:
-            ifield = int(curfield)
-        except ValueError:
-            ifield = None
-        return fields, isleaf, curfield, ifield
+            return ( data if entry[0] is None else entry[0] )[ entry[1] ]
+        except ( KeyError, IndexError ):
+            return _NOTFOUND
 
     @staticmethod
-    def merge_trees( left, right, augment=False ):
-        """Internal usage, do not call."""
+    def _unindex_subtree( index, path, node ):
+        """Remove path, and every path below it, from index."""
+        stack = [ ( path, node ) ]
+        while len(stack) > 0:
+            path, node = stack.pop()
+            index.pop( path, None )
+            if isinstance( node, dict ):
+                stack.extend( ( f"{path}.{k}", v ) for k, v in node.items()
+                              if isinstance( k, str ) and ( '.' not in k ) )
+            elif isinstance( node, list ):
+                stack.extend( ( f"{path}.{i}", v ) for i, v in enumerate( node ) )
 
-        if isinstance( left, list ):
-            if not isinstance( right, list ) or ( not augment ):
-                return copy.deepcopy( right )
-            else:
-                newlist = copy.deepcopy( left )
-                newlist.extend( copy.deepcopy( right ) )
+    @staticmethod
+    def merge_trees( left, right, augment=False, stats=None ):
+        """Internal usage, do not call.
+
+        Returns left merged with right (following the rules in augment()
+        if augment is True, otherwise those in override()).  Neither
+        left nor right is modified.  New dicts (and, when augmenting,
+        lists) are only made along paths where both trees have data;
+        every other subtree of the result is shared with left or right.
+
+        If stats is a dict, adds to its 'calls' the number of (recursive)
+        merges, and to its 'bytes' the size of the new dicts and lists.
+
+        """
+
+        if stats is not None:
+            stats['calls'] += 1
+        if isinstance( left, _LISTS ):
+            if augment and isinstance( right, _LISTS ):
+                newlist = left + right
+                if stats is not None:
+                    stats['bytes'] += sys.getsizeof( newlist )
                 return newlist
+            return right
         elif isinstance( left, dict ):
             if not isinstance( right, dict ):
-                return copy.deepcopy( right )
-            newdict = copy.deepcopy( left )
+                return right
+            newdict = dict( left )
             for key, value in right.items():
                 if key in newdict:
-                    newdict[key] = Config.merge_trees( newdict[key], right[key], augment=augment )
+                    newdict[key] = Config.merge_trees( newdict[key], value, augment=augment, stats=stats )
                 else:
-                    newdict[key] = copy.deepcopy( right[key] )
+                    newdict[key] = value
+            if stats is not None:
+                stats['bytes'] += sys.getsizeof( newdict )
             return newdict
         else:
-            return copy.deepcopy( right )
+            return right
@@ -0,0 +1,75 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+import sys
+import logging
+import argparse
+
+import yaml
+
+from rkwebutil.config import Config
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( "config_snapshot.py",
+                                      description="Build, verify, or show snapshots of merged config files" )
+    parser.add_argument( "command", choices=[ "build", "verify", "print" ],
+                         help=( "build: read the config and write its snapshot; "
+                                "verify: exit with status 0 if the snapshot is current, 1 if not; "
+                                "print: show what's in the snapshot" ) )
+    parser.add_argument( "configfile", help="Top-level config yaml file" )
+    parser.add_argument( "-s", "--snapshot-dir", required=True, help="Directory where snapshots are kept" )
+    parser.add_argument( "-m", "--dirmap", nargs="*", default=[], metavar="OLD=NEW",
+                         help="Directory remappings, as passed to Config.get" )
+    parser.add_argument( "-d", "--data", action="store_true", default=False,
+                         help="With print, also dump the merged config tree as yaml" )
+    args = parser.parse_args( argv )
+
+    dirmap = {}
+    for mapping in args.dirmap:
+        if "=" not in mapping:
+            parser.error( f"dirmap {mapping} isn't of the form OLD=NEW" )
+        olddir, newdir = mapping.split( "=", 1 )
+        dirmap[olddir] = newdir
+
+    if args.command == "build":
+        cfg = Config( args.configfile, logger=logging.getLogger("config_snapshot"), dirmap=dirmap )
+        path = cfg.write_snapshot( args.snapshot_dir )
+        print( f"Wrote {path}" )
+        return 0
+
+    snapshot = Config.read_snapshot( args.configfile, args.snapshot_dir, dirmap=dirmap )
+    path = Config.snapshot_path( args.configfile, args.snapshot_dir, dirmap=dirmap )
+    if snapshot is None:
+        print( f"No usable snapshot at {path}" )
+        return 1
+    problems = Config.snapshot_problems( snapshot )
+
+    if args.command == "verify":
+        if len( problems ) == 0:
+            print( f"{path} is current" )
+            return 0
+        print( f"{path} is out of date:" )
+        for problem in problems:
+            print( f"  {problem}" )
+        return 1
+
+    print( f"Snapshot {path}" )
+    print( f"  config: {snapshot['config']}" )
+    print( f"  dirmap: {snapshot['dirmap']}" )
+    print( f"  key:    {snapshot['key']}" )
+    print( f"  status: {'current' if len(problems) == 0 else 'out of date'}" )
+    print( "  files:" )
+    for filename, filehash in snapshot['files'].items():
+        print( f"    {filehash}  {filename}" )
+    if args.data:
+        print( yaml.safe_dump( snapshot['data'] ) )
+    return 0
+
+
+# ======================================================================
+if __name__ == "__main__":
+    sys.exit( main() )
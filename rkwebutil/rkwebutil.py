@@ -1,15 +1,28 @@
 import re
+import math
+import sys
+import functools
+import threading
+import collections
+import concurrent.futures
 import datetime
-import dateutil
+import dateutil.parser
 import pytz
 import uuid
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # ======================================================================
 
 class ErrorMsg( Exception ):
-    def __init__( self, text="error" ):
+    def __init__( self, text="error", errors=None ):
         self.text = text
+        # For errors about many values at once: a dict of what was wrong with each, by index or name
+        self.errors = errors
 
 
 # ======================================================================
@@ -24,79 +37,320 @@ def sanitizeFilename( filename ):
 
 # ======================================================================
 
+# Patterns for sanitizeHTML, compiled once.  None of them use re.MULTILINE,
+# so ^ and $ anchor to the whole text (with $ also matching before a final
+# newline); the passes in sanitizeHTML rely on that.
+
+_tagfinder = re.compile( r"^\<(\S+)\>$" )
+_ampfinder = re.compile( r"\&([^;\s]*\s)" )
+_ampendfinder = re.compile( r"\&([^;\s]*)$" )
+_ltfinder = re.compile( r"<((?!a\s*href)[^>]*\s)" )
+_ltendfinder = re.compile( r"<([^>]*)$" )
+_space = re.compile( r"\s" )
+_gtstartfinder = re.compile( r"^([<]*)>" )
+_parastart = re.compile( r"\s*<p>" )
+_linestart = re.compile( r"\n(?!\s*<p>)([^\n]*</p>)" )
+_emptypara = re.compile( r"^\s*<p></p>\s*$" )
+
+_tagreplacements = { "i": None, "b": None, "tt": None, "/i": None, "/b": None, "/tt": None, "/a": None,
+                     "sup": "<span class=\"sup\">", "/sup": "</span>",
+                     "sub": "<span class=\"sub\">", "/sub": "</span>" }
+
+
+def _tagfilter( match ):
+    # Only called when the whole text is one tag.  The tag can't have
+    # whitespace in it, so <a href=...> and <img ...> never get here;
+    # they're let through by the < and > passes.
+    contents = match.group(1)
+    lower = contents.lower()
+    if lower in _tagreplacements:
+        replacement = _tagreplacements[lower]
+        return match.group(0) if replacement is None else replacement
+    return "&lt;{}&gt;".format(contents)
+
+
+def _escapegt( text ):
+    # Same as re.sub( r"((?<!\<a)\s[^<]*)>", r"\g<1>&gt;", text ), which
+    # tries [^<]*> from every whitespace character.  A match can't cross
+    # a <, and it always ends at the last > before the next <, so that
+    # > is escaped if there's whitespace before it (other than right
+    # after "<a") back to the previous <.
+    runs = text.split( "<" )
+    for i, run in enumerate( runs ):
+        gt = run.rfind( ">" )
+        if gt < 0:
+            continue
+        start = 2 if ( i > 0 ) and ( run[:1] == "a" ) else 0
+        if _space.search( run, start, gt ) is not None:
+            runs[i] = f"{run[:gt]}&gt;{run[gt+1:]}"
+    return "<".join( runs )
+
+
+def _endparagraphs( text ):
+    # Same as re.sub( r"\s*\n", "</p>\n", text ): each run of whitespace
+    # that has newlines in it, up to its last newline, becomes "</p>\n".
+    lines = text.split( "\n" )
+    last = len( lines ) - 1
+    out = []
+    inrun = False
+    for i in range( last ):
+        if not inrun:
+            out.append( lines[i].rstrip() )
+        # The run goes on past this newline if the next line (which isn't the last) is all whitespace
+        inrun = ( i + 1 < last ) and ( ( len( lines[i+1] ) == 0 ) or lines[i+1].isspace() )
+        if not inrun:
+            out.append( "</p>\n" )
+    out.append( lines[last] )
+    return "".join( out )
+
+
 def sanitizeHTML(text, oneline = False):
-    tagfinder = re.compile(r"^\<(\S+)\>$")
-    ampfinder = re.compile(r"\&([^;\s]*\s)")
-    ampendfinder = re.compile(r"\&([^;\s]*)$")
-    ltfinder = re.compile(r"<((?!a\s*href)[^>]*\s)")
-    ltendfinder = re.compile(r"<([^>]*)$")
-    gtfinder = re.compile(r"((?<!\<a)\s[^<]*)>")
-    gtstartfinder = re.compile(r"^([<]*)>")
-
-    def tagfilter(text):
-        tagfinder = re.compile(r"^\<(\S+)\>$")
-        # linkfinder = re.compile(r"^\s*a\s+\"[^\"]+\"\s*")     # I think this didn't work
-        linkfinder = re.compile(r"^\s*a\s+href\s*=\s*\"[^\"]+\"\s*((target|style)\s*=\s*\"[^\"]*\"\s*)*")
-        imgfinder = re.compile(r"^\s*img\s+((src|style|width|height|alt)\s*=\s*\"[^\"]*\"\s*)*$")
-        match = tagfinder.match(text)
-        if match is None:
-            return None
-        contents = match.group(1)
-        if linkfinder.match(contents) is not None:
-            return text
-        if imgfinder.match(contents) is not None:
-            return text
-        if ( (contents.lower() == "i") or (contents.lower() == "b") or (contents.lower() == "tt") ):
-            return text
-        elif ( (contents.lower() == "/i") or (contents.lower() == "/b") or
-               (contents.lower() == "/tt") or (contents.lower() == "/a") ):
-            return text
-        elif contents.lower() == "sup":
-            return "<span class=\"sup\">"
-        elif contents.lower() == "/sup":
-            return "</span>"
-        elif contents.lower() == "sub":
-            return "<span class=\"sub\">"
-        elif contents.lower() == "/sub":
-            return "</span>"
-        else:
-            return "&lt;{}&rt;".format(contents)
-
-    # sys.stderr.write("text is \"{}\"\n".format(text.encode('utf-8')))
-    newtext = tagfinder.sub(tagfilter, text)
-    # sys.stderr.write("after tagfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = ampfinder.sub(r"&amp;\g<1>", newtext, count=0)
-    # sys.stderr.write("after ampfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = ampendfinder.sub(r"&amp;\g<1>", newtext, count=0)
-    # sys.stderr.write("after ampendfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = ltfinder.sub(r"&lt;\g<1>", newtext, count=0)
-    # sys.stderr.write("after ltfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = ltendfinder.sub(r"&lt;\g<1>", newtext, count=0)
-    # sys.stderr.write("after ltendfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = gtfinder.sub(r"\g<1>&gt;", newtext, count=0)
-    # sys.stderr.write("after gtfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
-    newtext = gtstartfinder.sub(r"\g<1>&gt;", newtext, count=0)
-    # sys.stderr.write("after gtendfinder, text is \"{}\"\n".format(newtext.encode('utf-8')))
+    """Escape HTML in text except for a few allowed tags.
+
+    <a href="..."> (with target and style), <img> (with src, style,
+    width, height, and alt), <i>, <b>, and <tt> are kept, and <sup> and
+    <sub> become <span class="sup"> and <span class="sub">.  Unless
+    oneline is True, each line is wrapped in <p>...</p>.
+
+    Each pass is skipped when the text can't match it.
+
+    """
+    newtext = text
+    if newtext[:1] == "<":
+        newtext = _tagfinder.sub( _tagfilter, newtext )
+    if "&" in newtext:
+        newtext = _ampfinder.sub( r"&amp;\g<1>", newtext )
+        newtext = _ampendfinder.sub( r"&amp;\g<1>", newtext )
+    if "<" in newtext:
+        newtext = _ltfinder.sub( r"&lt;\g<1>", newtext )
+        if "<" in newtext:
+            newtext = _ltendfinder.sub( r"&lt;\g<1>", newtext )
+    if ">" in newtext:
+        newtext = _escapegt( newtext )
+        if newtext[:1] in ( "<", ">" ):
+            newtext = _gtstartfinder.sub( r"\g<1>&gt;", newtext )
 
     if oneline:
         pass   # I hope I don't regret this
     else:
-        newtext = re.sub(r"^(?!\s*<p>)", "<p>", newtext, count=0)
-        # sys.stderr.write("after beginning <p>, text is \"{}\"\n".format(newtext.encode('utf-8')))
-        newtext = re.sub(r"([^\n])$", r"\g<1>\n", newtext, count=0)
-        # sys.stderr.write("after ending newline, text is \"{}\"\n".format(newtext.encode('utf-8')))
-        newtext = re.sub(r"\s*\n", "</p>\n", newtext, count=0)
-        newtext = re.sub(r"</p></p>", "</p>", newtext, count=0)
-        # sys.stderr.write("after line-end </p>, text is \"{}\"\n".format(newtext.encode('utf-8')))
-        newtext = re.sub(r"\n(?!\s*<p>)([^\n]*</p>)", r"\n<p>\g<1>", newtext, count=0)
-        # sys.stderr.write("after line-start <p>, text is \"{}\"\n".format(newtext.encode('utf-8')))
-        newtext = re.sub(r"^\s*<p></p>\s*$", "", newtext, count=0)
-        # sys.stderr.write("after <p></p>, text is \"{}\"\n".format(newtext.encode('utf-8')))
-        newtext = re.sub(r"\n", r"\n\n", newtext, count=0)
+        if _parastart.match( newtext ) is None:
+            newtext = "<p>" + newtext
+        # Same as re.sub( r"([^\n])$", r"\g<1>\n", ... ) without trying every position
+        if ( newtext[-1:] != "\n" ) or ( newtext[-2:-1] not in ( "", "\n" ) ):
+            newtext += "\n"
+        newtext = _endparagraphs( newtext )
+        newtext = newtext.replace( "</p></p>", "</p>" )
+        newtext = _linestart.sub( r"\n<p>\g<1>", newtext )
+        if "<p></p>" in newtext:
+            newtext = _emptypara.sub( "", newtext )
+        newtext = newtext.replace( "\n", "\n\n" )
 
     return newtext
 
 
+_survivor = re.compile( r"<(a\s*href|[^>\s]*>)" )
+_content = re.compile( r"[^\s<>/p]" )
+
+
+def _safecut( buf, k, oneline ):
+    # True if sanitizeHTML( buf[:k] ) + sanitizeHTML( buf[k:] + more ) is
+    # sanitizeHTML( buf + more ) no matter what more is.  The passes in
+    # sanitizeHTML look across lines (a < or > can pair with one many
+    # lines away), so this is only true after a newline where nothing
+    # before it is waiting for something after it and vice versa.
+    if ( k <= 0 ) or ( k >= len( buf ) ) or ( buf[k-1] != "\n" ) or buf[k].isspace():
+        return False
+    # Neither side can be a lone tag, or start with <*>
+    if ( buf[0] == "<" ) and ( _tagfinder.match( buf, 0, k ) is not None ):
+        return False
+    if buf[k] == "<":
+        if _space.search( buf, k, len( buf ) - 1 ) is None:
+            return False
+        j = k
+        while ( j < len( buf ) ) and ( buf[j] == "<" ):
+            j += 1
+        if ( j >= len( buf ) ) or ( buf[j] == ">" ):
+            return False
+    # No & on the last line before the cut
+    if buf.find( "&", buf.rfind( "\n", 0, k-1 ) + 1, k-1 ) >= 0:
+        return False
+    # No < before the cut without a > after it
+    lt = buf.rfind( "<", 0, k )
+    if ( lt >= 0 ) and ( buf.find( ">", lt, k ) < 0 ):
+        return False
+    # A > after the cut must not be escaped (or not) because of what's before it
+    lt = buf.find( "<", k )
+    gt = buf.find( ">", k )
+    if not ( ( lt >= 0 ) and ( ( gt < 0 ) or ( gt > lt ) ) and ( _survivor.match( buf, lt ) is not None )
+             and ( buf.find( ">", lt ) >= 0 ) ):
+        if ( buf.find( "<", 0, k ) >= 0 ) or ( buf.find( ">", 0, k ) >= 0 ):
+            return False
+        space = _space.search( buf, k )
+        if ( ( space is None ) or ( ( gt >= 0 ) and ( space.start() > gt ) )
+             or ( ( lt >= 0 ) and ( space.start() > lt ) ) ):
+            return False
+    # Neither side can be empty paragraphs
+    if ( not oneline ) and ( ( _content.search( buf, 0, k ) is None ) or ( _content.search( buf, k ) is None ) ):
+        return False
+    return True
+
+
+def sanitizeHTMLStream( source, oneline=False, maxbuffer=1048576, chunksize=65536 ):
+    """Sanitize text a piece at a time, like sanitizeHTML.
+
+    source is a file-like object (anything with a read method) or an
+    iterable of strings; chunks may split tags or lines anywhere.
+    Yields sanitized strings whose concatenation is what sanitizeHTML
+    would return for all of the text at once.
+
+    Text is held until there's a line break where it's safe to cut
+    it (see _safecut).  If more than maxbuffer characters pile up
+    without one, they're cut at the last line break (or anywhere, if
+    there isn't one) anyway; each side is still sanitized, but the
+    escaping right at that cut may differ from sanitizeHTML's.
+
+    """
+    if hasattr( source, "read" ):
+        source = iter( functools.partial( source.read, chunksize ), "" )
+    elif isinstance( source, str ):
+        source = [ source ]
+
+    buf = ""
+    pending = []
+    pendinglen = 0
+    yielded = False
+    for chunk in source:
+        pending.append( chunk )
+        pendinglen += len( chunk )
+        if ( "\n" not in chunk ) and ( len( buf ) + pendinglen <= maxbuffer ):
+            continue
+        buf += "".join( pending )
+        pending = []
+        pendinglen = 0
+
+        # Look for the last safe cut among the last few line breaks
+        cut = None
+        end = len( buf )
+        for _ in range( 64 ):
+            nl = buf.rfind( "\n", 0, end )
+            if nl < 0:
+                break
+            if _safecut( buf, nl + 1, oneline ):
+                cut = nl + 1
+                break
+            end = nl
+        if ( cut is None ) and ( len( buf ) > maxbuffer ):
+            cut = buf.rfind( "\n" ) + 1
+            if cut == 0:
+                cut = len( buf )
+        if cut is not None:
+            yield sanitizeHTML( buf[:cut], oneline )
+            yielded = True
+            buf = buf[cut:]
+
+    buf += "".join( pending )
+    if ( len( buf ) > 0 ) or not yielded:
+        yield sanitizeHTML( buf, oneline )
+
+
+class HTMLCache:
+    """A least-recently-used cache of sanitizeHTML results.
+
+    The cache is bounded by the total size in bytes (as reported by
+    sys.getsizeof) of the texts and results it holds, not the number of
+    them; the least recently used are dropped to get under maxbytes.
+    Texts longer than maxtextlen aren't cached, so one big document
+    can't push out everything else.
+
+    hits and misses count the sanitize() calls that were and were not
+    satisfied from the cache (texts too long to cache count as misses).
+
+    """
+
+    def __init__( self, maxbytes=16777216, maxtextlen=8192 ):
+        self.maxbytes = maxbytes
+        self.maxtextlen = maxtextlen
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def sanitize( self, text, oneline=False ):
+        """Return sanitizeHTML( text, oneline ), from the cache if it's there."""
+        key = ( text, oneline )
+        with self._lock:
+            result = self._results.get( key )
+            if result is not None:
+                self._results.move_to_end( key )
+                self.hits += 1
+                return result[0]
+            self.misses += 1
+
+        newtext = sanitizeHTML( text, oneline )
+        if len( text ) > self.maxtextlen:
+            return newtext
+        nbytes = sys.getsizeof( text ) + sys.getsizeof( newtext )
+        if nbytes > self.maxbytes:
+            return newtext
+
+        with self._lock:
+            if key not in self._results:
+                self._results[ key ] = ( newtext, nbytes )
+                self.size += nbytes
+                while self.size > self.maxbytes:
+                    _, ( _, dropped ) = self._results.popitem( last=False )
+                    self.size -= dropped
+        return newtext
+
+    def clear( self ):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+            self.size = 0
+
+    def info( self ):
+        """Return a dict with hits, misses, entries, size (bytes), and maxbytes."""
+        with self._lock:
+            return { 'hits': self.hits, 'misses': self.misses, 'entries': len( self._results ),
+                     'size': self.size, 'maxbytes': self.maxbytes }
+
+
+htmlcache = HTMLCache()
+
+
+def sanitizeHTMLCached( text, oneline=False ):
+    """sanitizeHTML, remembering the results for text that comes up again.
+
+    Use this for short text that's sanitized over and over (e.g. the
+    same comment on many table rows).  The results are kept in
+    rkwebutil.htmlcache (see HTMLCache); sanitizeHTMLCached.cache_info()
+    and sanitizeHTMLCached.cache_clear() are its info() and clear().
+
+    """
+    return htmlcache.sanitize( text, oneline )
+
+
+sanitizeHTMLCached.cache_info = htmlcache.info
+sanitizeHTMLCached.cache_clear = htmlcache.clear
+
+
+def sanitizeHTMLMany( texts, oneline=False, processes=None, chunksize=64 ):
+    """Return a list of sanitizeHTML( text, oneline ) for each of texts.
+
+    If processes is more than 1, the texts are sanitized in a pool of
+    that many processes, chunksize at a time.  That only pays off for
+    many thousands of texts, or long ones.
+
+    """
+    if ( processes is None ) or ( processes <= 1 ):
+        return [ sanitizeHTML( text, oneline ) for text in texts ]
+    with concurrent.futures.ProcessPoolExecutor( max_workers=processes ) as pool:
+        return list( pool.map( functools.partial( sanitizeHTML, oneline=oneline ), texts, chunksize=chunksize ) )
+
+
 # ======================================================================
 
 def intOrZero( val ):
@@ -129,16 +383,292 @@ def asUUID( val, canbenone=True ):
 
 NULLUUID = uuid.UUID( '00000000-0000-0000-0000-000000000000' )
 
+_canonicaluuid = re.compile( r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+                             r"|[0-9a-fA-F]{32}" )
+
+# Big-endian halves, so numpy sorts and compares these in UUID order
+_uuiddtype = None if numpy is None else numpy.dtype( [ ( "hi", ">u8" ), ( "lo", ">u8" ) ] )
+
+
+class UUIDArray:
+    """A compact array of UUIDs, 16 bytes each, from asUUIDs.
+
+    data is the bytes of the UUIDs one after another, and nones is the
+    set of positions that were None (which hold NULLUUID in data).
+    Indexing and iterating give uuid.UUID (or None); array is a numpy
+    structured array (fields hi and lo) sharing data's memory.
+
+    in, index(), and indices() take anything asUUID does.  They look
+    the UUIDs up in a hash table built the first time it's needed: with
+    numpy, an open-addressing table of positions (8-16 bytes per UUID),
+    otherwise a dict.  Like NULL in a SQL join, None is never found.
+
+    """
+
+    def __init__( self, data=b"", nones=frozenset() ):
+        if len( data ) % 16 != 0:
+            raise ValueError( f"UUIDArray data must be a multiple of 16 bytes long, got {len(data)}" )
+        self.data = bytes( data )
+        self.nones = frozenset( nones )
+        self._table = None
+
+    def __len__( self ):
+        return len( self.data ) // 16
+
+    def __getitem__( self, i ):
+        n = len( self )
+        if not -n <= i < n:
+            raise IndexError( "UUIDArray index out of range" )
+        i %= n
+        if i in self.nones:
+            return None
+        return uuid.UUID( bytes=self.data[ 16*i : 16*(i+1) ] )
+
+    def __iter__( self ):
+        data = self.data
+        nones = self.nones
+        for i in range( len( self ) ):
+            yield None if i in nones else uuid.UUID( bytes=data[ 16*i : 16*(i+1) ] )
+
+    def __repr__( self ):
+        return f"<UUIDArray of {len(self)} UUIDs>"
+
+    @property
+    def array( self ):
+        if numpy is None:
+            raise RuntimeError( "UUIDArray.array needs numpy, which isn't installed" )
+        return numpy.frombuffer( self.data, dtype=_uuiddtype )
+
+    def _hashtable( self ):
+        # Linear probing, starting at a multiplicative hash of hi ^ lo (so both random and
+        # time-based UUIDs spread out).  Each slot holds the first position of its UUID, or -1.
+        # Built a probe at a time for all the UUIDs still looking for a slot; of the ones that
+        # find the same empty slot, the earliest takes it, and the rest look at it again.
+        if self._table is not None:
+            return self._table
+        n = len( self )
+        if numpy is None:
+            self._table = {}
+            for i in range( n - 1, -1, -1 ):
+                if i not in self.nones:
+                    self._table[ self.data[ 16*i : 16*(i+1) ] ] = i
+            return self._table
+
+        bits = max( 4, ( 2 * n ).bit_length() )
+        table = numpy.full( 1 << bits, -1, dtype=numpy.int32 if n < 2**31 else numpy.int64 )
+        hi, lo = self._halves( self.array )
+        notnone = numpy.ones( n, dtype=bool )
+        notnone[ list( self.nones ) ] = False
+        pending = numpy.flatnonzero( notnone )
+        slots = _uuidHash( hi[pending], lo[pending], bits )
+        while len( pending ) > 0:
+            current = table[ slots ].astype( numpy.int64 )
+            occupied = current >= 0
+            same = numpy.zeros( len( pending ), dtype=bool )
+            same[ occupied ] = ( ( hi[ current[occupied] ] == hi[ pending[occupied] ] )
+                                 & ( lo[ current[occupied] ] == lo[ pending[occupied] ] ) )
+            empty = numpy.flatnonzero( ~occupied )
+            _, first = numpy.unique( slots[empty], return_index=True )
+            winners = empty[ first ]
+            table[ slots[winners] ] = pending[ winners ]
+            done = same
+            done[ winners ] = True
+            slots = numpy.where( occupied & ~same, ( slots + 1 ) & ( len( table ) - 1 ), slots )[ ~done ]
+            pending = pending[ ~done ]
+        self._table = table
+        return table
+
+    @staticmethod
+    def _halves( arr ):
+        return arr["hi"].astype( numpy.uint64 ), arr["lo"].astype( numpy.uint64 )
+
+    def _find( self, key ):
+        table = self._hashtable()
+        if numpy is None:
+            return table.get( key )
+        mask = len( table ) - 1
+        slot = _uuidHash( int.from_bytes( key[:8], "big" ), int.from_bytes( key[8:], "big" ),
+                          mask.bit_length() )
+        while True:
+            i = int( table[ slot ] )
+            if i < 0:
+                return None
+            if self.data[ 16*i : 16*(i+1) ] == key:
+                return i
+            slot = ( slot + 1 ) & mask
+
+    def _key( self, val ):
+        if isinstance( val, ( bytes, bytearray ) ) and ( len( val ) == 16 ):
+            return bytes( val )
+        try:
+            return asUUID( val.decode( "ascii" ) if isinstance( val, bytes ) else val, canbenone=True ).bytes
+        except ( ValueError, TypeError, AttributeError, UnicodeDecodeError ):
+            return None
+
+    def __contains__( self, val ):
+        key = None if val is None else self._key( val )
+        return ( key is not None ) and ( self._find( key ) is not None )
+
+    def index( self, val ):
+        """Return the first position of val; raises ValueError if it isn't there."""
+        key = None if val is None else self._key( val )
+        i = None if key is None else self._find( key )
+        if i is None:
+            raise ValueError( f"{val} is not in UUIDArray" )
+        return i
+
+    def indices( self, values ):
+        """Return a numpy int64 array of the first position of each of values (-1 if it isn't there).
+
+        values is a UUIDArray, or anything asUUIDs takes.  This looks
+        them all up at once, without Python loops.
+
+        """
+        if numpy is None:
+            raise RuntimeError( "UUIDArray.indices needs numpy, which isn't installed" )
+        if not isinstance( values, UUIDArray ):
+            values = asUUIDs( values )
+        table = self._hashtable()
+        mask = len( table ) - 1
+        hi, lo = self._halves( self.array )
+        qhi, qlo = self._halves( values.array )
+        result = numpy.full( len( values ), -1, dtype=numpy.int64 )
+        todo = numpy.arange( len( values ) )
+        if len( values.nones ) > 0:
+            todo = numpy.setdiff1d( todo, list( values.nones ) )
+        slots = _uuidHash( qhi[todo], qlo[todo], mask.bit_length() )
+        while len( todo ) > 0:
+            current = table[ slots ].astype( numpy.int64 )
+            occupied = current >= 0
+            match = numpy.zeros( len( todo ), dtype=bool )
+            match[ occupied ] = ( ( hi[ current[occupied] ] == qhi[ todo[occupied] ] )
+                                  & ( lo[ current[occupied] ] == qlo[ todo[occupied] ] ) )
+            result[ todo[match] ] = current[ match ]
+            more = occupied & ~match
+            todo = todo[ more ]
+            slots = ( slots[ more ] + 1 ) & mask
+        return result
+
+
+def _uuidHash( hi, lo, bits ):
+    # Slot (of 2**bits) to start looking for the UUID with 64-bit halves hi and lo
+    # (Python ints, or numpy uint64 arrays, for which this returns an int64 array)
+    if numpy is not None and isinstance( hi, numpy.ndarray ):
+        with numpy.errstate( over="ignore" ):
+            return ( ( ( hi ^ lo ) * numpy.uint64( _uuidhashmul ) ) >> numpy.uint64( 64 - bits ) ).astype( numpy.int64 )
+    return ( ( ( hi ^ lo ) * _uuidhashmul ) & 0xFFFFFFFFFFFFFFFF ) >> ( 64 - bits )
+
+
+_uuidhashmul = 0x9E3779B97F4A7C15
+
+
+def _canonicalUUIDs( values ):
+    # The bytes of values if they're all strs like 12345678-9abc-def0-1234-56789abcdef0, else None.
+    # Checks them all at once: if they're all 36 long, the joined string has dashes at
+    # the right places in each 36 and only there, and fromhex gives 16 bytes for each 32
+    # other characters (so none are whitespace, which fromhex skips), they're all good.
+    n = len( values )
+    try:
+        if ( n == 0 ) or ( set( map( len, values ) ) != { 36 } ):
+            return None
+        joined = "".join( values )
+        if any( joined[ i::36 ] != "-" * n for i in ( 8, 13, 18, 23 ) ):
+            return None
+        hexes = joined.replace( "-", "" )
+        data = bytes.fromhex( hexes ) if len( hexes ) == 32 * n else b""
+    except ( TypeError, ValueError ):
+        return None
+    return data if len( data ) == 16 * n else None
+
+
+def asUUIDs( values, canbenone=True ):
+    """Convert values (str, 16-byte bytes, uuid.UUID, or None) to a UUIDArray.
+
+    Each value is read the way asUUID would read it; bytes that aren't
+    16 long are taken to be the text of a UUID.  None becomes NULLUUID,
+    and if canbenone is True its position goes into the array's nones.
+    If any of the values aren't UUIDs, raises one ErrorMsg for all of
+    them, whose errors is a dict of the bad values keyed by index.
+
+    """
+    values = list( values )
+    data = _canonicalUUIDs( values )
+    if data is not None:
+        return UUIDArray( data )
+
+    # Every value becomes hex digits (maybe with dashes), all converted by one bytes.fromhex
+    hexes = []
+    nones = []
+    errors = {}
+    nullhex = NULLUUID.hex
+    for i, val in enumerate( values ):
+        if isinstance( val, str ) and ( _canonicaluuid.fullmatch( val ) is not None ):
+            hexes.append( val )
+        elif val is None:
+            hexes.append( nullhex )
+            if canbenone:
+                nones.append( i )
+        elif isinstance( val, uuid.UUID ):
+            hexes.append( val.hex )
+        elif isinstance( val, ( bytes, bytearray ) ) and ( len( val ) == 16 ):
+            hexes.append( val.hex() )
+        else:
+            try:
+                hexes.append( uuid.UUID( val.decode( "ascii" ) if isinstance( val, bytes ) else val ).hex )
+            except ( ValueError, TypeError, AttributeError, UnicodeDecodeError ):
+                errors[i] = val
+                hexes.append( nullhex )
+
+    if len( errors ) > 0:
+        bad = ", ".join( f"{i} ({val})" for i, val in list( errors.items() )[:10] )
+        raise ErrorMsg( f'Error, {len(errors)} of {len(hexes)} values are not valid UUIDs: '
+                        f'{bad}{", ..." if len(errors) > 10 else ""}', errors=errors )
+    return UUIDArray( bytes.fromhex( "".join( hexes ).replace( "-", "" ) ), nones )
+
 
 # ======================================================================
 
+# ISO 8601 dates and times that datetime.fromisoformat reads the same
+# way dateutil.parser.parse does.  (fromisoformat takes more than this,
+# e.g. week dates, but dateutil doesn't always agree with it on those.)
+_isodatetime = re.compile( r"\d{4}-\d{2}-\d{2}"
+                           r"(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(Z|[+-]\d{2}:\d{2})?)?" )
+_tzoffsets = {}
+
+
+def _isoDateTime( string ):
+    # Returns None if string isn't one that _isodatetime matches and fromisoformat parses
+    match = _isodatetime.fullmatch( string )
+    if match is None:
+        return None
+    tz = match.group(1)
+    try:
+        if tz is None:
+            return datetime.datetime.fromisoformat( string )
+        dateval = datetime.datetime.fromisoformat( string[:match.start(1)] )
+    except ValueError:
+        return None
+    # Use the same tzinfo dateutil.parser.parse would (which, for UTC, is
+    # tzlocal() if the local time zone is UTC), so ask it once per offset
+    tzinfo = _tzoffsets.get( tz )
+    if tzinfo is None:
+        try:
+            tzinfo = dateutil.parser.parse( f"2000-01-01T00:00{tz}" ).tzinfo
+        except Exception:
+            return None
+        _tzoffsets[ tz ] = tzinfo
+    return dateval.replace( tzinfo=tzinfo )
+
+
 def asDateTime( string, defaultutc=False ):
     try:
         if string is None:
             return None
         if isinstance( string, datetime.datetime ):
             return string
-        dateval = dateutil.parser.parse( string )
+        dateval = _isoDateTime( string ) if isinstance( string, str ) else None
+        if dateval is None:
+            dateval = dateutil.parser.parse( string )
 
         if defaultutc and ( dateval.tzinfo is None ):
             dateval = pytz.utc.localize( dateval )
@@ -146,3 +676,464 @@ def asDateTime( string, defaultutc=False ):
         return dateval
     except Exception:
         raise ErrorMsg( f'Error, {string} is not a valid date and time.' )
+
+
+def _isoDateTimes64( values ):
+    # Returns ( arr, others ).  arr is a datetime64[us] array (in UTC)
+    # of values, parsed by numpy, for the ones that are None or ISO
+    # strings that numpy reads the same way asDateTime does.  others
+    # is the indices of the rest, which are NaT in arr.
+    strings = []
+    offsets = []
+    others = []
+    for i, val in enumerate( values ):
+        match = _isodatetime.fullmatch( val ) if isinstance( val, str ) else None
+        # (numpy takes year 0, Python doesn't)
+        if ( match is None ) or val.startswith( "0000" ):
+            strings.append( "NaT" )
+            offsets.append( 0 )
+            if val is not None:
+                others.append( i )
+            continue
+        tz = match.group(1)
+        offset = 0
+        if ( tz is not None ) and ( tz != "Z" ):
+            hours = int( tz[1:3] )
+            minutes = int( tz[4:6] )
+            if ( hours >= 24 ) or ( minutes >= 60 ):
+                strings.append( "NaT" )
+                offsets.append( 0 )
+                others.append( i )
+                continue
+            offset = ( -1 if tz[0] == "-" else 1 ) * ( hours * 60 + minutes )
+        strings.append( val if tz is None else val[:match.start(1)] )
+        offsets.append( offset )
+    try:
+        arr = numpy.array( strings, dtype="datetime64[us]" )
+    except ValueError:
+        # Something numpy won't take; let asDateTime sort it out
+        return numpy.full( len( values ), numpy.datetime64( "NaT" ), dtype="datetime64[us]" ), range( len( values ) )
+    return arr - numpy.array( offsets, dtype="timedelta64[m]" ), others
+
+
+def asDateTimes( values, defaultutc=False, asnumpy=False ):
+    """Run asDateTime on each of values.
+
+    Returns a list of datetimes (with None for each None in values),
+    or, if asnumpy is True, a numpy datetime64[us] array (with NaT for
+    None).  datetime64 has no time zone, so times with one are
+    converted to UTC; times without one are left as they are.  With
+    asnumpy, numpy parses the ISO 8601 strings itself, which is much
+    faster.
+
+    If any of the values aren't dates and times, raises one ErrorMsg
+    for all of them, whose errors is a dict of the bad values keyed by
+    index.
+
+    """
+    values = list( values )
+    arr = None
+    dates = None
+    todo = range( len( values ) )
+    if asnumpy:
+        if numpy is None:
+            raise RuntimeError( "asDateTimes( asnumpy=True ) needs numpy, which isn't installed" )
+        arr, todo = _isoDateTimes64( values )
+    else:
+        dates = [ None ] * len( values )
+
+    errors = {}
+    for i in todo:
+        try:
+            dateval = asDateTime( values[i], defaultutc )
+        except ErrorMsg:
+            errors[i] = values[i]
+            continue
+        if dates is not None:
+            dates[i] = dateval
+        elif dateval is not None:
+            try:
+                arr[i] = ( dateval if dateval.tzinfo is None
+                           else dateval.astimezone( datetime.UTC ).replace( tzinfo=None ) )
+            except ( ValueError, OverflowError ):
+                # e.g. an offset of +24:00, which dateutil takes but datetime can't convert to UTC
+                errors[i] = values[i]
+
+    if len( errors ) > 0:
+        bad = ", ".join( f"{i} ({val})" for i, val in list( errors.items() )[:10] )
+        raise ErrorMsg( f'Error, {len(errors)} of {len(values)} values are not valid dates and times: '
+                        f'{bad}{", ..." if len(errors) > 10 else ""}', errors=errors )
+    return dates if arr is None else arr
+
+
+# ======================================================================
+# Modified Julian Dates
+#
+# These do exactly the same floating-point arithmetic as
+# rkWebUtil.mjdOfDate, ymdOfMjd, and dateOfMjd in static/rkwebutil.js,
+# so the Python side and the web interface agree to the last bit.  The
+# helpers take lib, either the math module (for scalars) or numpy (for
+# arrays); the expressions are the same for both.  (JS % is fmod, not
+# Python's %.)
+
+def _mjdOfYmdhms( y, mo, d, h, mi, s, us, lib ):
+    t = lib.trunc( ( mo - 14 ) / 12 )
+    jd = ( lib.trunc( 1461 * ( y + 4800 + t ) / 4 )
+           + lib.trunc( ( 367 * ( mo - 2 - 12 * t ) ) / 12 )
+           - lib.trunc( ( 3 * lib.trunc( ( y + 4900 + t ) / 100 ) ) / 4 ) + d - 32075 )
+    # JS has milliseconds, not microseconds, but ms/1000. == (1000*ms)/1e6 exactly
+    jd = jd + ( ( h - 12 ) + ( mi + ( s + us / 1e6 ) / 60. ) / 60. ) / 24.
+    return jd - 2400000.5
+
+
+def _ymdOfMjd( mjd, lib ):
+    jd = lib.floor( lib.floor( mjd ) + 2400000.5 + 0.5 )
+    f = jd + 1401 + lib.floor( ( lib.floor( ( 4 * jd + 274277 ) / 146097 ) * 3 ) / 4 ) - 38
+    e = 4 * f + 3
+    g = lib.floor( lib.fmod( e, 1461 ) / 4 )
+    h = 5 * g + 2
+    D = lib.floor( lib.fmod( h, 153 ) / 5 ) + 1
+    M = lib.fmod( lib.floor( h / 153 ) + 2, 12 ) + 1
+    Y = lib.floor( e / 1461 ) - 4716 + lib.floor( ( 12 + 2 - M ) / 12 )
+    return Y, M, D
+
+
+def _timeOfMjd( mjd, y, mo, d, lib ):
+    # Returns ( h, m, s, µs ) of mjd into the day y-mo-d, which is ymdOfMjd( mjd )
+    intmjd = _mjdOfYmdhms( y, mo, d, 0, 0, 0, 0, lib )
+    intmjd = intmjd - ( mjd - intmjd < 0 )
+    secs = ( mjd - intmjd ) * 24 * 3600
+    h = lib.floor( secs / 3600 )
+    mi = lib.floor( ( secs - 3600*h ) / 60 )
+    s = lib.floor( secs - 3600*h - 60*mi )
+    us = lib.floor( 1e6 * ( secs - 3600*h - 60*mi - s ) + 0.5 )
+    return h, mi, s, us
+
+
+def mjdOfDate( date ):
+    """Return the MJD of date (a datetime, numpy.datetime64, or string asDateTime understands).
+
+    Times without a time zone are taken to be UTC.  Returns None for None.
+    Like rkWebUtil.mjdOfDate, this works out the Julian Date first, so
+    it's only good to a few times 1e-10 days (tens of microseconds).
+
+    """
+    if date is None:
+        return None
+    if ( numpy is not None ) and isinstance( date, numpy.datetime64 ):
+        if numpy.isnat( date ):
+            return None
+        date = date.astype( "datetime64[us]" ).item()
+    date = asDateTime( date, defaultutc=True )
+    if date.tzinfo is not None:
+        date = date.astimezone( pytz.utc )
+    return _mjdOfYmdhms( date.year, date.month, date.day, date.hour, date.minute, date.second,
+                         date.microsecond, math )
+
+
+def ymdOfMjd( mjd ):
+    """Return ( year, month, day ) of the UTC date at mjd."""
+    return tuple( int(i) for i in _ymdOfMjd( mjd, math ) )
+
+
+def dateOfMjd( mjd ):
+    """Return the UTC datetime at mjd, or None for None.
+
+    This is the same time rkWebUtil.dateOfMjd gives, but to the
+    microsecond; a JS Date truncates it to the millisecond.  (JS also
+    turns years 0-99 into 1900-1999; this doesn't.)
+
+    """
+    if mjd is None:
+        return None
+    y, mo, d = ymdOfMjd( mjd )
+    h, mi, s, us = _timeOfMjd( mjd, y, mo, d, math )
+    return ( datetime.datetime( y, mo, d, tzinfo=pytz.utc )
+             + datetime.timedelta( hours=h, minutes=mi, seconds=s, microseconds=us ) )
+
+
+def mjdsOfDates( dates ):
+    """Return a float64 numpy array of the MJDs of dates.
+
+    dates is a numpy datetime64 array (taken to be UTC), or anything
+    asDateTimes( asnumpy=True ) takes (e.g. a list of ISO strings).
+    NaT and None become NaN.  The result has the shape of dates; a
+    datetime64 array of millions of elements is converted without any
+    Python loops.
+
+    """
+    if numpy is None:
+        raise RuntimeError( "mjdsOfDates needs numpy, which isn't installed" )
+    arr = numpy.asarray( dates )
+    if arr.dtype.kind != "M":
+        arr = asDateTimes( arr.ravel(), asnumpy=True ).reshape( arr.shape )
+    arr = arr.astype( "datetime64[us]" )
+    bad = numpy.isnat( arr )
+    arr = numpy.where( bad, numpy.datetime64( 0, "us" ), arr )
+
+    months = arr.astype( "datetime64[M]" )
+    days = arr.astype( "datetime64[D]" )
+    y, mo = numpy.divmod( months.astype( numpy.int64 ), 12 )
+    d = ( days - months.astype( "datetime64[D]" ) ).astype( numpy.int64 ) + 1
+    h, us = numpy.divmod( ( arr - days ).astype( numpy.int64 ), 3600000000 )
+    mi, us = numpy.divmod( us, 60000000 )
+    s, us = numpy.divmod( us, 1000000 )
+
+    mjds = _mjdOfYmdhms( y + 1970, mo + 1, d, h, mi, s, us, numpy )
+    mjds[ bad ] = numpy.nan
+    return mjds
+
+
+def datesOfMjds( mjds, asiso=False ):
+    """Return a datetime64[us] numpy array (UTC) of the times at mjds, or ISO strings if asiso is True.
+
+    Gives the same times as dateOfMjd, without any Python loops.
+    Non-finite MJDs become NaT (or "NaT").
+
+    """
+    if numpy is None:
+        raise RuntimeError( "datesOfMjds needs numpy, which isn't installed" )
+    mjds = numpy.asarray( mjds, dtype=numpy.float64 )
+    bad = ~numpy.isfinite( mjds )
+    mjds = numpy.where( bad, 0., mjds )
+
+    y, mo, d = _ymdOfMjd( mjds, numpy )
+    h, mi, s, us = _timeOfMjd( mjds, y, mo, d, numpy )
+    days = ( ( y.astype( numpy.int64 ) - 1970 ).astype( "datetime64[Y]" ).astype( "datetime64[M]" )
+             + ( mo.astype( numpy.int64 ) - 1 ).astype( "timedelta64[M]" ) ).astype( "datetime64[D]" )
+    days += ( d.astype( numpy.int64 ) - 1 ).astype( "timedelta64[D]" )
+    usofday = ( ( h * 60 + mi ) * 60 + s ) * 1000000 + us
+    arr = days.astype( "datetime64[us]" ) + usofday.astype( numpy.int64 ).astype( "timedelta64[us]" )
+    arr[ bad ] = numpy.datetime64( "NaT" )
+    return numpy.datetime_as_string( arr, timezone="UTC" ) if asiso else arr
+
+
+# ======================================================================
+# Converting whole request payloads
+
+_missing = object()
+
+
+def _asDateTimeUTC( val ):
+    return asDateTime( val, defaultutc=True )
+
+
+class Schema:
+    """Validate and convert request payloads (JSON or form data) field by field.
+
+    fields is a dict of field name to either a type name or a dict with
+    a 'type' and any of these options:
+
+       required  : error if the field isn't in the payload (default False)
+       default   : value to use if the field isn't in the payload
+                   (otherwise it's left out of the result)
+       canbenone : None (JSON null) is allowed (default True).  As with
+                   asUUID, a uuid that can't be None becomes NULLUUID.
+       defaultutc: for datetime, passed on to asDateTime
+
+    The types are 'int' (as intOrError), 'intorzero' (as intOrZero),
+    'float', 'str', 'uuid' (as asUUID), and 'datetime' (as asDateTime),
+    or a function that takes the value and returns the converted one
+    (raising ValueError, TypeError, or ErrorMsg if it can't).
+
+    extra says what to do with fields in the payload that aren't in
+    fields: 'ignore' them, 'keep' them as they are, or call them an
+    'error'.
+
+    The schema is worked out once when it's made, so make it once (e.g.
+    at module level) and use it for every request:
+
+       schema = Schema( { 'id': { 'type': 'uuid', 'required': True },
+                          'limit': { 'type': 'int', 'default': 100 },
+                          'since': 'datetime' } )
+       params = schema.convert( flask.request.json )
+
+    """
+
+    _types = { 'int': ( int, "an integer" ),
+               'intorzero': ( intOrZero, "an integer" ),
+               'float': ( float, "a number" ),
+               'str': ( str, "a string" ),
+               'uuid': ( asUUID, "a UUID" ),
+               'datetime': ( asDateTime, "a date and time" ) }
+
+    def __init__( self, fields, extra='ignore' ):
+        if extra not in ( 'ignore', 'keep', 'error' ):
+            raise ValueError( f"Schema extra must be 'ignore', 'keep', or 'error', not {extra}" )
+        self.extra = extra
+        self.fields = {}
+        for name, spec in fields.items():
+            spec = dict( spec ) if isinstance( spec, dict ) else { 'type': spec }
+            kind = spec.pop( 'type', None )
+            required = spec.pop( 'required', False )
+            default = spec.pop( 'default', _missing )
+            canbenone = spec.pop( 'canbenone', True )
+            defaultutc = spec.pop( 'defaultutc', False )
+            if len( spec ) > 0:
+                raise ValueError( f"Unknown options for schema field {name}: {', '.join( spec.keys() )}" )
+            if callable( kind ):
+                conv, what = kind, "valid"
+            elif kind in self._types:
+                conv, what = self._types[ kind ]
+            else:
+                raise ValueError( f"Unknown type {kind} for schema field {name}" )
+            if ( kind == 'datetime' ) and defaultutc:
+                conv = _asDateTimeUTC
+            # What None becomes; _missing means None isn't allowed
+            noneval = None if canbenone else ( NULLUUID if kind == 'uuid' else _missing )
+            self.fields[ name ] = ( kind, conv, f"needs to be {what}", required, default, noneval, defaultutc )
+        # What convert loops over
+        self._compiled = tuple( ( name, conv, complaint, required, default, noneval )
+                                for name, ( _, conv, complaint, required, default, noneval, _ ) in self.fields.items() )
+
+    def _raise( self, errors, what ):
+        # errors values are messages, or dicts of bad values by index
+        msgs = "; ".join( f"{name} {err}" if isinstance( err, str ) else
+                          f"{name} has {len(err)} bad values: "
+                          + ", ".join( f"{i} ({v})" for i, v in list( err.items() )[:5] )
+                          + ( ", ..." if len( err ) > 5 else "" )
+                          for name, err in list( errors.items() )[:10] )
+        raise ErrorMsg( f"Error, {len(errors)} of the {what} are not valid: {msgs}"
+                        f"{'; ...' if len(errors) > 10 else ''}", errors=errors )
+
+    def _extra( self, payload, out, errors ):
+        for name in payload.keys():
+            if name not in self.fields:
+                if self.extra == 'keep':
+                    out[ name ] = payload[ name ]
+                else:
+                    errors[ name ] = "is not a known field"
+
+    def convert( self, payload ):
+        """Return a dict of the converted fields of payload (a dict, or a form's mapping).
+
+        If anything is wrong, raises one ErrorMsg about all of it, whose
+        errors is a dict of field name to what's wrong with it.
+
+        """
+        out = {}
+        errors = {}
+        get = payload.get
+        for name, conv, complaint, required, default, noneval in self._compiled:
+            val = get( name, _missing )
+            if ( val is not None ) and ( val is not _missing ):
+                try:
+                    out[ name ] = conv( val )
+                except ( ValueError, TypeError, ErrorMsg ):
+                    errors[ name ] = f'{complaint}, got "{val}"'
+            elif val is None:
+                if noneval is _missing:
+                    errors[ name ] = "can't be null"
+                else:
+                    out[ name ] = noneval
+            elif required:
+                errors[ name ] = "is required"
+            elif default is not _missing:
+                out[ name ] = default
+        if self.extra != 'ignore':
+            self._extra( payload, out, errors )
+        if len( errors ) > 0:
+            self._raise( errors, "fields" )
+        return out
+
+    def convertColumns( self, payload, asnumpy=False ):
+        """Convert a column-oriented payload, a dict of field name to a list of values.
+
+        Returns a dict of field name to list of converted values, all
+        the same length.  Missing columns with a default are filled
+        with it.  Whole columns are converted at once (with
+        asDateTimes and asUUIDs for dates and UUIDs) instead of value
+        by value.
+
+        If asnumpy is True, int and intorzero columns become numpy
+        int64 arrays (and can't have nulls), float columns float64
+        arrays (with NaN for null), datetime columns datetime64[us]
+        arrays as from asDateTimes, and uuid columns UUIDArrays.
+
+        If anything is wrong, raises one ErrorMsg about all of it, whose
+        errors is a dict of field name to either what's wrong with the
+        column or a dict of bad values keyed by index.
+
+        """
+        if asnumpy and ( numpy is None ):
+            raise RuntimeError( "Schema.convertColumns( asnumpy=True ) needs numpy, which isn't installed" )
+        columntypes = ( list, tuple ) if numpy is None else ( list, tuple, numpy.ndarray )
+        out = {}
+        errors = {}
+        columns = {}
+        for name in self.fields:
+            vals = payload.get( name )
+            if vals is None:
+                continue
+            if isinstance( vals, columntypes ):
+                columns[ name ] = vals
+            else:
+                errors[ name ] = "must be a list"
+        lengths = { len( vals ) for vals in columns.values() }
+        if len( lengths ) > 1:
+            raise ErrorMsg( "Error, columns have different lengths: "
+                            + ", ".join( f"{name} {len(vals)}" for name, vals in columns.items() ) )
+        n = lengths.pop() if len( lengths ) > 0 else 0
+
+        for name, ( kind, conv, complaint, required, default, noneval, defaultutc ) in self.fields.items():
+            if name in errors:
+                continue
+            vals = columns.get( name )
+            if vals is None:
+                if required:
+                    errors[ name ] = "is required"
+                    continue
+                elif default is not _missing:
+                    vals = [ default ] * n
+                else:
+                    continue
+            try:
+                out[ name ] = self._column( kind, conv, vals, noneval, defaultutc, asnumpy )
+            except ErrorMsg as ex:
+                errors[ name ] = ex.errors if ex.errors is not None else ex.text
+        if self.extra != 'ignore':
+            self._extra( payload, out, errors )
+        if len( errors ) > 0:
+            self._raise( errors, "columns" )
+        return out
+
+    def _column( self, kind, conv, vals, noneval, defaultutc, asnumpy ):
+        # Raises ErrorMsg with errors a dict of index: bad value
+        hasnone = None in vals
+        if hasnone and ( noneval is _missing ):
+            raise ErrorMsg( "can't be null", errors={ i: None for i, v in enumerate( vals ) if v is None } )
+
+        if kind == 'datetime':
+            return asDateTimes( vals, defaultutc=defaultutc, asnumpy=asnumpy )
+        if kind == 'uuid':
+            ids = asUUIDs( vals, canbenone=( noneval is None ) )
+            return ids if asnumpy else list( ids )
+
+        # map with a builtin converter has no Python-level call per value;
+        # only if something fails is it done one at a time to find the bad ones
+        fast = int if kind == 'intorzero' else conv
+        try:
+            if hasnone:
+                col = [ None if v is None else fast( v ) for v in vals ]
+            else:
+                col = list( map( fast, vals ) )
+        except ( ValueError, TypeError, ErrorMsg ):
+            col = []
+            bad = {}
+            for i, v in enumerate( vals ):
+                try:
+                    col.append( None if v is None else conv( v ) )
+                except ( ValueError, TypeError, ErrorMsg ):
+                    bad[ i ] = v
+            if len( bad ) > 0:
+                raise ErrorMsg( "has bad values", errors=bad )
+
+        if asnumpy and kind in ( 'int', 'intorzero' ):
+            if hasnone:
+                raise ErrorMsg( "has nulls, which an int64 array can't hold",
+                                errors={ i: None for i, v in enumerate( vals ) if v is None } )
+            return numpy.array( col, dtype=numpy.int64 )
+        if asnumpy and kind == 'float':
+            return numpy.array( [ numpy.nan if v is None else v for v in col ] if hasnone else col,
+                                dtype=numpy.float64 )
+        return col
@@ -6,12 +6,22 @@
 
 
 import sys
+import copy
+import json
+import pickle
+import asyncio
+import datetime
+import time
+import logging
+import threading
 import pathlib
 import pytest
+import yaml
 
 _rundir = pathlib.Path(__file__).parent
 sys.path.insert(0, '/test_install/html' )
 from rkwebutil import config
+from rkwebutil import config_snapshot
 
 
 # A note about pytest: Things aren't completely sandboxed.  When I call
@@ -75,18 +85,12 @@ class TestConfig:
         assert cfg.value( 'override1list2' ) == [ '2_2override1', '2_2override2' ]
 
     def test_fieldsep( self, cfg ):
-        fields, isleaf, curfield, ifield = cfg._fieldsep( 'nest.nest1.0.nest1a' )
-        assert isleaf == False
-        assert curfield == 'nest'
-        assert fields == ['nest', 'nest1', '0', 'nest1a' ]
-        assert ifield is None
-        fields, isleaf, curfield, ifield = cfg._fieldsep( '0.test' )
-        assert isleaf == False
-        assert ifield == 0
-        fields, isleaf, curfield, ifield = cfg._fieldsep( 'mainlist2' )
-        assert isleaf
-        fields, isleaf, curfield, ifield = cfg._fieldsep( 'mainscalar1' )
-        assert isleaf
+        path = config.ConfigPath( 'nest.nest1.0.nest1a' )
+        assert path.fields == ( 'nest', 'nest1', '0', 'nest1a' )
+        assert path.keys == ( ( 'nest', None ), ( 'nest1', None ), ( '0', 0 ), ( 'nest1a', None ) )
+        assert config.ConfigPath( '0.test' ).keys[0] == ( '0', 0 )
+        assert len( config.ConfigPath( 'mainlist2' ).fields ) == 1
+        assert len( config.ConfigPath( 'mainscalar1' ).fields ) == 1
 
 
     def test_nest(self, cfg):
@@ -134,6 +138,95 @@ class TestConfig:
         cfg.set_value( 'totallynewvalue.two', 'two' )
         assert cfg.value('totallynewvalue') == { 'one': 'one', 'two': 'two' }
 
+    def test_merge_trees( self ):
+        left = { 'a': { 'x': 1, 'l': [ 1, 2 ] }, 'b': [ 'b1' ], 'c': { 'keep': 'me' } }
+        right = { 'a': { 'y': 2, 'l': [ 3 ] }, 'b': [ 'b2' ], 'd': { 'new': 'tree' } }
+
+        merged = config.Config.merge_trees( left, right )
+        assert merged == { 'a': { 'x': 1, 'y': 2, 'l': [ 3 ] }, 'b': [ 'b2' ],
+                           'c': { 'keep': 'me' }, 'd': { 'new': 'tree' } }
+        assert merged['c'] is left['c']
+        assert merged['d'] is right['d']
+        assert merged['b'] is right['b']
+
+        merged = config.Config.merge_trees( left, right, augment=True )
+        assert merged['a'] == { 'x': 1, 'y': 2, 'l': [ 1, 2, 3 ] }
+        assert merged['b'] == [ 'b1', 'b2' ]
+
+        # Inputs are untouched
+        assert left == { 'a': { 'x': 1, 'l': [ 1, 2 ] }, 'b': [ 'b1' ], 'c': { 'keep': 'me' } }
+        assert right == { 'a': { 'y': 2, 'l': [ 3 ] }, 'b': [ 'b2' ], 'd': { 'new': 'tree' } }
+
+    def test_index( self, cfg ):
+        def check_index():
+            index = cfg._index.flatten() if isinstance( cfg._index, config._IndexOverlay ) else cfg._index
+            for path, ( parent, key ) in index.items():
+                assert cfg.value( path, struct=cfg._data ) is ( cfg._data if parent is None else parent )[key]
+            assert index.keys() == config.Config._make_index( cfg._data ).keys()
+
+        assert cfg.value( 'nest.nest1.0.nest1a' ) == { 'val': 'foo' }
+        assert config.Config._indexed( cfg._index, cfg._data, 'nest.nest1.1' ) == 42
+        check_index()
+
+        cfg.set_value( 'indextest.list.0', 'x' )
+        cfg.set_value( 'indextest.list.0', 'y', appendlists=True )
+        assert cfg.value( 'indextest.list.1' ) == 'y'
+        cfg.set_value( 'indextest.dict.sub.val', 1 )
+        cfg.set_value( 'indextest.dict.sub', 'scalar' )
+        assert 'indextest.dict.sub.val' not in cfg._index
+        assert cfg.value( 'indextest.dict.sub' ) == 'scalar'
+        cfg.set_value( 'indextest.list.3', 'z' )
+        assert cfg.value( 'indextest.list' ) == [ 'z' ]
+        assert 'indextest.list.1' not in cfg._index
+        check_index()
+
+        # Changes made in place to what value() returns are seen by lookups below it
+        settest = cfg.value( 'settest.dict' )
+        settest['key1'] = 'changed'
+        assert cfg.value( 'settest.dict.key1' ) == 'changed'
+        assert cfg.values( [ 'settest.dict.key1' ] ) == [ 'changed' ]
+        del settest['key2']
+        assert cfg.value( 'settest.dict.key2', default=None ) is None
+        assert not cfg.has( 'settest.dict.key2' )
+        settest['added'] = [ 1 ]
+        assert cfg.value( 'settest.dict.added.0' ) == 1
+        cfg.value( 'settest.dict.added' ).append( 2 )
+        assert cfg.value( 'settest.dict.added.1' ) == 2
+        cfg.value( 'settest.dict.added' ).pop( 0 )
+        assert cfg.value( 'settest.dict.added.0' ) == 2
+        assert not cfg.has( 'settest.dict.added.1' )
+
+    def test_index_layers( self, tmp_path ):
+        ( tmp_path / "big.yaml" ).write_text( yaml.safe_dump( { f"sec{i}": { f"key{j}": j for j in range( 20 ) }
+                                                                for i in range( 100 ) } ) )
+        cfg = config.Config.get( tmp_path / "big.yaml" )
+        base = cfg._index
+        npaths = len( base )
+
+        # set_value puts its changes on top of the index rather than copying it...
+        cfg.set_value( 'sec0.key0', 'changed' )
+        assert isinstance( cfg._index, config._IndexOverlay )
+        assert cfg._index.base is base
+        assert base['sec0.key0'][0]['key0'] == 0
+        bottoms = { id( base ) }
+        for n in range( 1, 500 ):
+            cfg.set_value( f'sec{n % 100}.key{n % 20}', f'changed{n}' )
+            index = cfg._index
+            depth = 0
+            while isinstance( index, config._IndexOverlay ):
+                depth += 1
+                index = index.base
+            bottoms.add( id( index ) )
+            # ...with few enough layers that lookups stay quick...
+            assert depth <= 12
+        # ...and only now and then a new plain dict (each write changes the entries of 21 paths)
+        assert len( bottoms ) <= 500 * 21 // ( npaths // 8 ) + 2
+
+        assert cfg.value( 'sec0.key0' ) == 'changed400'
+        assert cfg.value( 'sec99.key19' ) == 'changed499'
+        index = cfg._index.flatten() if isinstance( cfg._index, config._IndexOverlay ) else cfg._index
+        assert index == config.Config._make_index( cfg._data )
+
     def test_clone( self, cfg ):
         newconfig = config.Config.clone( _rundir / 'test.yaml' )
         newconfig.set_value( 'clonetest2', 'manuallyset' )
@@ -141,3 +234,838 @@ class TestConfig:
         assert cfg.value('clonetest2') == 'orig'
         assert newconfig.value('clonetest1') == 'orig'
         assert newconfig.value('clonetest2') == 'manuallyset'
+
+
+class TestYAMLCache:
+    def test_cache( self, tmp_path ):
+        cache = config.YAMLCache( maxsize=2 )
+        files = []
+        for i in range(3):
+            files.append( tmp_path / f"file{i}.yaml" )
+            files[-1].write_text( f"val: {i}\nlist: [ 1, 2 ]\n" )
+
+        doc = cache.load( files[0] )
+        assert doc == { 'val': 0, 'list': [ 1, 2 ] }
+        assert cache.load( files[0] ) is doc
+        assert ( cache.hits, cache.misses ) == ( 1, 1 )
+
+        with pytest.raises( TypeError ):
+            doc['val'] = 5
+        with pytest.raises( TypeError ):
+            doc['list'].append( 3 )
+        thawed = copy.deepcopy( doc )
+        thawed['list'].append( 3 )
+        assert type( thawed['list'] ) is list
+        assert doc['list'] == [ 1, 2 ]
+
+        # Changing the file means it gets parsed again
+        files[0].write_text( "val: changed, and longer\n" )
+        assert cache.load( files[0] ) == { 'val': 'changed, and longer' }
+        assert ( cache.hits, cache.misses ) == ( 1, 2 )
+
+        # LRU eviction: file0 was used least recently when file2 comes in
+        cache.load( files[1] )
+        cache.load( files[2] )
+        assert cache.info() == { 'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2 }
+        cache.load( files[0] )
+        assert cache.misses == 5
+
+    def test_config_uses_cache( self ):
+        config.Config.yamlcache.clear()
+        config.Config.get( _rundir / 'test.yaml', reread=True )
+        misses = config.Config.yamlcache.misses
+        assert misses == 7
+        config.Config.get( _rundir / 'test.yaml', reread=True )
+        assert config.Config.yamlcache.misses == misses
+        assert config.Config.yamlcache.hits == misses
+
+
+class TestIncludeGraph:
+    def test_diamond( self, tmp_path ):
+        ( tmp_path / "d.yaml" ).write_text( "shared:\n  val: d\n  list: [ d ]\n" )
+        ( tmp_path / "b.yaml" ).write_text( "preloads: [ d.yaml ]\nb: b\n" )
+        ( tmp_path / "c.yaml" ).write_text( "augments: [ d.yaml ]\nc: c\nshared:\n  list: [ c ]\n" )
+        ( tmp_path / "a.yaml" ).write_text( "preloads: [ b.yaml ]\noverrides: [ c.yaml ]\na: a\n" )
+
+        order, nodes = config.Config._include_graph( tmp_path / "a.yaml" )
+        assert [ p.name for p in order ] == [ 'd.yaml', 'b.yaml', 'c.yaml', 'a.yaml' ]
+        assert nodes[ tmp_path / "a.yaml" ]['data'] == { 'a': 'a' }
+
+        cfg = config.Config.get( tmp_path / "a.yaml" )
+        assert cfg.value( 'a' ) == 'a'
+        assert cfg.value( 'b' ) == 'b'
+        assert cfg.value( 'c' ) == 'c'
+        assert cfg.value( 'shared' ) == { 'val': 'd', 'list': [ 'c', 'd' ] }
+        assert sorted( p.name for p in cfg._files ) == [ 'a.yaml', 'b.yaml', 'c.yaml', 'd.yaml' ]
+
+    def test_dirmap( self, tmp_path ):
+        ( tmp_path / "real" ).mkdir()
+        ( tmp_path / "real" / "inc.yaml" ).write_text( "inc: yes\n" )
+        ( tmp_path / "top.yaml" ).write_text( "preloads: [ /notthere/inc.yaml ]\ntop: yes\n" )
+        cfg = config.Config.get( tmp_path / "top.yaml", dirmap={ '/notthere': str( tmp_path / "real" ) } )
+        assert cfg.value( 'inc' )
+        assert cfg.value( 'top' )
+
+    def test_cycle( self, tmp_path ):
+        ( tmp_path / "one.yaml" ).write_text( "preloads: [ two.yaml ]\n" )
+        ( tmp_path / "two.yaml" ).write_text( "overrides: [ three.yaml ]\n" )
+        ( tmp_path / "three.yaml" ).write_text( "augments: [ one.yaml ]\n" )
+        with pytest.raises( RuntimeError, match="cycle: .*one.yaml -> .*two.yaml -> .*three.yaml -> .*one.yaml" ):
+            config.Config.get( tmp_path / "one.yaml" )
+
+    def test_not_a_list( self, tmp_path ):
+        ( tmp_path / "bad.yaml" ).write_text( "preloads: other.yaml\n" )
+        with pytest.raises( TypeError, match="preloads must be a list" ):
+            config.Config.get( tmp_path / "bad.yaml" )
+
+
+class TestYAMLLoader:
+    def test_loaders_agree( self ):
+        text = ( "date: 2024-06-14\n"
+                 "datetime: 2024-06-14 12:30:00\n"
+                 "datestr: '2024-06-14'\n"
+                 "num: [ 1, 2.5, 0x10, 1e3, .inf ]\n"
+                 "bools: [ yes, no, true, null, ~ ]\n"
+                 "anchor: &anc { a: 1 }\n"
+                 "alias: *anc\n" )
+        purepython = yaml.load( text, Loader=yaml.SafeLoader )
+        assert purepython['date'] == datetime.date( 2024, 6, 14 )
+        assert purepython['datestr'] == '2024-06-14'
+        if not yaml.__with_libyaml__:
+            pytest.skip( "pyyaml doesn't have libyaml" )
+        assert config.YAMLLoader is yaml.CSafeLoader
+        assert yaml.load( text, Loader=yaml.CSafeLoader ) == purepython
+        for yamlfile in _rundir.glob( "*.yaml" ):
+            with open( yamlfile ) as ifp:
+                text = ifp.read()
+            assert yaml.load( text, Loader=yaml.CSafeLoader ) == yaml.load( text, Loader=yaml.SafeLoader )
+
+    def test_pure_python_config( self ):
+        cache = config.Config.yamlcache
+        try:
+            config.Config.yamlcache = config.YAMLCache( loader=yaml.SafeLoader )
+            cfg = config.Config.clone( _rundir / 'test.yaml', reread=True )
+        finally:
+            config.Config.yamlcache = cache
+        assert cfg._data == config.Config.clone( _rundir / 'test.yaml', reread=True )._data
+
+
+class TestSnapshot:
+    def test_snapshot( self, tmp_path ):
+        confdir = tmp_path / "conf"
+        confdir.mkdir()
+        snapdir = tmp_path / "snapshots"
+        ( confdir / "base.yaml" ).write_text( "base:\n  list: [ 1, 2 ]\n  date: 2024-06-14\n" )
+        ( confdir / "top.yaml" ).write_text( "preloads: [ base.yaml ]\ntop: orig\n" )
+        topfile = confdir / "top.yaml"
+
+        cfg = config.Config.get( topfile, snapshotdir=snapdir )
+        snappath = config.Config.snapshot_path( topfile, snapdir )
+        assert snappath.is_file()
+        snapshot = config.Config.read_snapshot( topfile, snapdir )
+        assert set( snapshot['files'] ) == { str( confdir / "base.yaml" ), str( topfile ) }
+        assert config.Config.snapshot_problems( snapshot ) == []
+        assert snapshot['data'] == cfg._data
+
+        # Reading again comes from the snapshot, not the yaml files
+        config.Config.yamlcache.clear()
+        cfg = config.Config.get( topfile, reread=True, snapshotdir=snapdir )
+        assert config.Config.yamlcache.misses == 0
+        assert cfg.value( 'base.date' ) == datetime.date( 2024, 6, 14 )
+        assert cfg.value( 'top' ) == 'orig'
+
+        # A different dirmap is a different snapshot
+        assert config.Config.read_snapshot( topfile, snapdir, dirmap={ '/foo': '/bar' } ) is None
+
+        # Changing an included file makes the snapshot stale
+        ( confdir / "base.yaml" ).write_text( "base:\n  list: [ 3 ]\n" )
+        assert config.Config.snapshot_problems( snapshot ) == [ f"{confdir / 'base.yaml'} has changed" ]
+        assert config_snapshot.main( [ "verify", str(topfile), "-s", str(snapdir) ] ) == 1
+        cfg = config.Config.get( topfile, reread=True, snapshotdir=snapdir )
+        assert cfg.value( 'base.list' ) == [ 3 ]
+        assert config_snapshot.main( [ "verify", str(topfile), "-s", str(snapdir) ] ) == 0
+
+    def test_malicious_snapshot( self, tmp_path ):
+        ( tmp_path / "conf.yaml" ).write_text( "val: 1\nwhen: 2024-06-14\nnums: [ 1.5, 2.5, 3.5 ]\n" )
+        snapdir = tmp_path / "snap"
+        cfg = config.Config.get( tmp_path / "conf.yaml", snapshotdir=snapdir )
+        cfg.compact( minlength=2 )
+        cfg.freeze()
+        cfg.write_snapshot( snapdir )
+        snappath = config.Config.snapshot_path( tmp_path / "conf.yaml", snapdir )
+        snapshot = config.Config.read_snapshot( tmp_path / "conf.yaml", snapdir )
+        assert snapshot['data'] == { 'val': 1, 'when': datetime.date( 2024, 6, 14 ), 'nums': [ 1.5, 2.5, 3.5 ] }
+        assert isinstance( snapshot['data']['nums'], config.CompactList )
+
+        class Evil:
+            def __reduce__( self ):
+                return ( pathlib.Path.touch, ( tmp_path / "pwned", ) )
+
+        snapshot['data'] = { 'val': Evil() }
+        snappath.write_bytes( pickle.dumps( snapshot ) )
+        assert config.Config.read_snapshot( tmp_path / "conf.yaml", snapdir ) is None
+        assert not ( tmp_path / "pwned" ).exists()
+        # ...and the config is read from the yaml files instead
+        cfg = config.Config.get( tmp_path / "conf.yaml", reread=True, snapshotdir=snapdir )
+        assert cfg.value( 'val' ) == 1
+        assert not ( tmp_path / "pwned" ).exists()
+
+    def test_cli( self, tmp_path, capsys ):
+        ( tmp_path / "conf.yaml" ).write_text( "val: 1\n" )
+        args = [ str( tmp_path / "conf.yaml" ), "-s", str( tmp_path / "snap" ), "-m", "/a=/b" ]
+        assert config_snapshot.main( [ "verify" ] + args ) == 1
+        assert config_snapshot.main( [ "build" ] + args ) == 0
+        assert config_snapshot.main( [ "verify" ] + args ) == 0
+        capsys.readouterr()
+        assert config_snapshot.main( [ "print", "--data" ] + args ) == 0
+        out = capsys.readouterr().out
+        assert "status: current" in out
+        assert "val: 1" in out
+
+
+class TestReload:
+    @pytest.fixture
+    def conffiles( self, tmp_path ):
+        ( tmp_path / "base.yaml" ).write_text( "db:\n  host: localhost\n  port: 5432\nhosts: [ a, b ]\n" )
+        ( tmp_path / "top.yaml" ).write_text( "preloads: [ base.yaml ]\nname: orig\n" )
+        return tmp_path
+
+    def test_reload( self, conffiles ):
+        cfg = config.Config.get( conffiles / "top.yaml" )
+        calls = []
+        cfg.subscribe( lambda c, changed: calls.append( ( c, changed ) ) )
+
+        assert cfg.reload() == set()
+        assert calls == []
+
+        ( conffiles / "base.yaml" ).write_text( "db:\n  host: remote\n  port: 5432\n  user: me\nhosts: [ a, b, c ]\n" )
+        changed = cfg.reload()
+        assert changed == { 'db.host', 'db.user', 'hosts' }
+        assert calls == [ ( cfg, changed ) ]
+        assert cfg.value( 'db.host' ) == 'remote'
+        assert cfg.value( 'hosts' ) == [ 'a', 'b', 'c' ]
+        assert config.Config.get( conffiles / "top.yaml" ) is cfg
+
+    def test_reread( self, conffiles ):
+        cfg = config.Config.get( conffiles / "top.yaml" )
+        calls = []
+        cfg.subscribe( lambda c, changed: calls.append( ( c, changed ) ) )
+
+        ( conffiles / "top.yaml" ).write_text( "preloads: [ base.yaml ]\nname: reread\n" )
+        assert config.Config.get( conffiles / "top.yaml", reread=True ) is cfg
+        assert calls == [ ( cfg, { 'name' } ) ]
+        assert cfg.value( 'name' ) == 'reread'
+
+    @pytest.mark.parametrize( "use_inotify", [ False, True ] )
+    def test_watch( self, conffiles, use_inotify ):
+        if use_inotify and ( config.inotify_simple is None ):
+            pytest.skip( "inotify_simple isn't installed" )
+        cfg = config.Config.get( conffiles / "top.yaml", reread=True )
+        changes = []
+        changed_event = threading.Event()
+
+        def callback( c, changed ):
+            changes.append( changed )
+            changed_event.set()
+
+        cfg.subscribe( callback )
+        cfg.watch( interval=0.05, use_inotify=use_inotify )
+        try:
+            time.sleep( 0.2 )
+            ( conffiles / "top.yaml" ).write_text( "preloads: [ base.yaml ]\nname: new and improved\n" )
+            assert changed_event.wait( timeout=5 )
+            assert changes == [ { 'name' } ]
+            assert cfg.value( 'name' ) == 'new and improved'
+
+            # A broken file doesn't replace the config
+            changed_event.clear()
+            ( conffiles / "base.yaml" ).write_text( "db: [ this isn't\n" )
+            time.sleep( 0.5 )
+            assert not changed_event.is_set()
+            assert cfg.value( 'db.host' ) == 'localhost'
+        finally:
+            cfg.stop_watching()
+
+
+class TestThreads:
+    def test_readers_and_writers( self, tmp_path ):
+        ( tmp_path / "threads.yaml" ).write_text( "pair:\n  a: 0\n  b: 0\nstatic:\n  val: 42\n" )
+        path = tmp_path / "threads.yaml"
+        config.Config.get( path )
+        stop = threading.Event()
+        errors = []
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    cfg = config.Config.get( path )
+                    pair = cfg.value( 'pair' )
+                    assert pair['a'] == pair['b']
+                    assert cfg.value( 'pair.a' ) >= 0
+                    assert cfg.value( 'static.val' ) == 42
+            except Exception as ex:
+                errors.append( ex )
+
+        def setter():
+            try:
+                n = 0
+                while not stop.is_set():
+                    n += 1
+                    cfg = config.Config.get( path )
+                    cfg.set_value( 'pair', { 'a': n, 'b': n } )
+                    cfg.set_value( f'growing.key{n%50}', n )
+            except Exception as ex:
+                errors.append( ex )
+
+        def rereader():
+            try:
+                while not stop.is_set():
+                    config.Config.get( path, reread=True )
+                    time.sleep( 0.01 )
+            except Exception as ex:
+                errors.append( ex )
+
+        threads = ( [ threading.Thread( target=reader ) for _ in range(4) ]
+                    + [ threading.Thread( target=setter ) for _ in range(2) ]
+                    + [ threading.Thread( target=rereader ) ] )
+        for thread in threads:
+            thread.start()
+        time.sleep( 1 )
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    def test_reads_dont_lock( self, tmp_path ):
+        ( tmp_path / "nolock.yaml" ).write_text( "a:\n  b: 1\nnums: [ 1, 2, 3 ]\n" )
+        ( tmp_path / "aug.yaml" ).write_text( "a:\n  c: 2\n" )
+        cfg = config.Config.get( tmp_path / "nolock.yaml" )
+        locked = threading.Event()
+        release = threading.Event()
+
+        def holder():
+            with cfg._lock:
+                locked.set()
+                release.wait()
+
+        # Every way of replacing the tree publishes its index with it, so
+        # value() doesn't need the lock that a writer is holding
+        for change in ( lambda: None, lambda: cfg.augment( tmp_path / "aug.yaml" ),
+                        lambda: cfg.override( tmp_path / "aug.yaml" ), lambda: cfg.compact( minlength=2 ) ):
+            change()
+            locked.clear()
+            release.clear()
+            thread = threading.Thread( target=holder )
+            thread.start()
+            assert locked.wait( timeout=5 )
+            try:
+                results = []
+                reader = threading.Thread( target=lambda: results.append( ( cfg.value( 'a.b' ),
+                                                                            cfg.values( [ 'a.b', 'nums' ] ) ) ) )
+                reader.start()
+                reader.join( timeout=5 )
+                assert results == [ ( 1, [ 1, [ 1, 2, 3 ] ] ) ]
+            finally:
+                release.set()
+                thread.join()
+
+
+class TestFrozen:
+    def test_frozen_clone( self, tmp_path ):
+        # (filler so that the clone's handful of changes stay an overlay on the original's index)
+        ( tmp_path / "frozen.yaml" ).write_text( "db:\n  host: localhost\n  opts: [ 1, 2 ]\n"
+                                                 "nest:\n  a:\n    b: c\n"
+                                                 + "".join( f"filler{i}: {i}\n" for i in range(100) ) )
+        path = tmp_path / "frozen.yaml"
+        cfg = config.Config.get( path, frozen=True )
+        assert cfg.frozen
+        assert config.Config.get( path ) is cfg
+
+        db = cfg.value( 'db' )
+        assert isinstance( db, config.FrozenDict )
+        assert isinstance( db['opts'], config.FrozenList )
+        assert cfg.value( 'db' ) is db
+        with pytest.raises( TypeError ):
+            db['host'] = 'elsewhere'
+        with pytest.raises( TypeError ):
+            db['opts'].append( 3 )
+
+        clone = config.Config.clone( path )
+        assert clone.frozen
+        assert clone._data is cfg._data
+        assert clone.value( 'db' ) is db
+
+        clone.set_value( 'db.host', 'elsewhere' )
+        clone.set_value( 'db.new', { 'x': [ 1 ] } )
+        clone.set_value( 'nest', 'scalar' )
+        assert isinstance( clone.value( 'db.new' ), config.FrozenDict )
+        assert isinstance( clone.value( 'db.new.x' ), config.FrozenList )
+        assert clone.value( 'db.host' ) == 'elsewhere'
+        assert clone.value( 'db.opts' ) is db['opts']
+        assert clone.value( 'nest' ) == 'scalar'
+        assert 'nest.a.b' not in clone._index
+        assert isinstance( clone._index, config._IndexOverlay )
+        assert dict.__len__( clone._index ) < len( cfg._index )
+
+        assert cfg.value( 'db.host' ) == 'localhost'
+        assert cfg.value( 'nest.a.b' ) == 'c'
+        assert 'db.new' not in cfg._index
+
+        # A clone of a clone carries the clone's changes but not further ones
+        clone2 = config.Config( path, clone=clone )
+        assert clone2.value( 'db.host' ) == 'elsewhere'
+        assert 'nest.a.b' not in clone2._index
+        clone2.set_value( 'db.host', 'third' )
+        assert clone.value( 'db.host' ) == 'elsewhere'
+
+        for c in ( cfg, clone, clone2 ):
+            flat = c._index.flatten() if isinstance( c._index, config._IndexOverlay ) else c._index
+            assert flat.keys() == config.Config._make_index( c._data ).keys()
+
+    def test_freeze_existing( self, tmp_path ):
+        ( tmp_path / "tofreeze.yaml" ).write_text( "a:\n  b: 1\n" )
+        cfg = config.Config.get( tmp_path / "tofreeze.yaml" )
+        cfg.set_value( 'a.c', [ 2 ] )
+        assert not cfg.frozen
+        assert type( cfg.value( 'a.c' ) ) is list
+        assert config.Config.get( tmp_path / "tofreeze.yaml", frozen=True ) is cfg
+        assert cfg.frozen
+        assert isinstance( cfg.value( 'a.c' ), config.FrozenList )
+        assert cfg.value( 'a' ) == { 'b': 1, 'c': [ 2 ] }
+
+
+    def test_not_frozen( self, tmp_path ):
+        # A config that isn't frozen has its own ordinary dicts and lists, whether
+        #   or not they were merged, even though the yaml cache's are frozen
+        ( tmp_path / "thawpre.yaml" ).write_text( "pre:\n  a: 1\nmerged:\n  a: 1\n  l: [ 1 ]\n" )
+        ( tmp_path / "thawaug.yaml" ).write_text( "merged:\n  l: [ 2 ]\naug: { x: [ 3 ] }\n" )
+        ( tmp_path / "thaw.yaml" ).write_text( "preloads: [ thawpre.yaml ]\naugments: [ thawaug.yaml ]\n"
+                                                "merged:\n  b: 2\nplain:\n  d: { e: [ 1, 2 ] }\n" )
+        cfg = config.Config.get( tmp_path / "thaw.yaml" )
+        assert isinstance( config.Config.yamlcache.load( tmp_path / "thawpre.yaml" )['pre'], config.FrozenDict )
+
+        def check( c ):
+            for field in ( 'pre', 'merged', 'merged.l', 'plain', 'plain.d', 'plain.d.e', 'aug', 'aug.x' ):
+                assert type( c.value( field ) ) in ( dict, list )
+        check( cfg )
+        cfg.value( 'plain.d' )['f'] = 1
+        cfg.value( 'merged.l' ).append( 3 )
+        assert cfg.value( 'merged' ) == { 'a': 1, 'b': 2, 'l': [ 1, 2, 3 ] }
+        assert config.Config.yamlcache.load( tmp_path / "thaw.yaml" )['plain'] == { 'd': { 'e': [ 1, 2 ] } }
+
+        cfg.reload()
+        check( cfg )
+        cfg.override( tmp_path / "thawaug.yaml" )
+        check( cfg )
+
+        frozen = config.Config.get( tmp_path / "thaw.yaml", reread=True, frozen=True )
+        for field in ( 'pre', 'merged', 'merged.l', 'plain', 'plain.d', 'plain.d.e' ):
+            assert isinstance( frozen.value( field ), ( config.FrozenDict, config.FrozenList ) )
+
+
+class TestOverlay:
+    @pytest.fixture
+    def cfg( self, tmp_path ):
+        ( tmp_path / "overlay.yaml" ).write_text( "db:\n  host: localhost\n  timeout: 30\n  opts: [ 1, 2 ]\n"
+                                                  "other: 1\n" )
+        return config.Config.get( tmp_path / "overlay.yaml" )
+
+    def test_overlay( self, cfg ):
+        data = cfg._data
+        with cfg.overlay( { 'db.timeout': 5, 'db.opts.1': 3, 'new.val': 'x' } ) as c:
+            assert c is cfg
+            assert cfg.value( 'db.timeout' ) == 5
+            assert cfg.value( 'db.host' ) == 'localhost'
+            # (same rules as set_value, so the list is replaced)
+            assert cfg.value( 'db' ) == { 'host': 'localhost', 'timeout': 5, 'opts': [ 3 ] }
+            assert cfg.value( 'db.opts' ) == [ 3 ]
+            assert cfg.value( 'new' ) == { 'val': 'x' }
+            assert cfg.value( 'other' ) == 1
+            with cfg.overlay( { 'db': { 'host': 'elsewhere' } } ):
+                assert cfg.value( 'db' ) == { 'host': 'elsewhere' }
+                assert cfg.value( 'new.val' ) == 'x'
+                with pytest.raises( ValueError ):
+                    cfg.value( 'db.timeout' )
+            assert cfg.value( 'db.timeout' ) == 5
+            assert cfg._data is data
+            # set_value changes the config underneath the overlay
+            cfg.set_value( 'db.host', 'changed' )
+            assert cfg.value( 'db.host' ) == 'changed'
+            assert cfg.value( 'db.timeout' ) == 5
+            cfg.set_value( 'db.host', 'localhost' )
+        assert cfg.value( 'db.timeout' ) == 30
+        assert cfg.value( 'db.opts' ) == [ 1, 2 ]
+        with pytest.raises( ValueError ):
+            cfg.value( 'new' )
+        assert cfg._data['db']['opts'] is data['db']['opts']
+
+        with pytest.raises( TypeError ):
+            with cfg.overlay( { 'db.opts.x': 1 }, appendlists=True ):
+                pass
+
+    def test_overlay_threads( self, cfg ):
+        barrier = threading.Barrier( 4 )
+        errors = []
+
+        def worker( n ):
+            try:
+                with cfg.overlay( { 'db.timeout': n } ):
+                    barrier.wait()
+                    for _ in range( 100 ):
+                        assert cfg.value( 'db.timeout' ) == n
+                        assert cfg.value( 'db' )['timeout'] == n
+                    barrier.wait()
+                assert cfg.value( 'db.timeout' ) == 30
+            except Exception as ex:
+                errors.append( ex )
+
+        threads = [ threading.Thread( target=worker, args=(n,) ) for n in range(4) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    def test_overlay_tasks( self, cfg ):
+        async def task( n ):
+            with cfg.overlay( { 'db.timeout': n } ):
+                await asyncio.sleep( 0.01 )
+                inner = await asyncio.create_task( child() )
+                return cfg.value( 'db.timeout' ), inner
+
+        async def child():
+            await asyncio.sleep( 0.01 )
+            return cfg.value( 'db.timeout' )
+
+        async def main():
+            return await asyncio.gather( *[ task( n ) for n in range(5) ] )
+
+        assert asyncio.run( main() ) == [ ( n, n ) for n in range(5) ]
+        assert cfg.value( 'db.timeout' ) == 30
+
+
+class TestConfigPath:
+    def test_configpath( self, tmp_path ):
+        ( tmp_path / "path.yaml" ).write_text( "a:\n  b:\n    - 1\n    - c: 2\nnull_leaf: null\nx: top\n" )
+        cfg = config.Config.get( tmp_path / "path.yaml" )
+
+        path = cfg.compile( "a.b.1.c" )
+        assert isinstance( path, config.ConfigPath )
+        assert path.fields == ( 'a', 'b', '1', 'c' )
+        assert path.keys == ( ( 'a', None ), ( 'b', None ), ( '1', 1 ), ( 'c', None ) )
+        assert path.prefixes == ( 'a', 'a.b', 'a.b.1', 'a.b.1.c' )
+        assert path == config.ConfigPath( "a.b.1.c" )
+        assert str( path ) == "a.b.1.c"
+
+        assert cfg.value( path ) == 2
+        assert cfg.value( path, struct=cfg._data ) == 2
+        assert cfg.value( config.ConfigPath( "a.b.01.c" ) ) == 2
+        with pytest.raises( ValueError, match="Error getting field a" ):
+            cfg.value( cfg.compile( "a.b.5" ) )
+        with pytest.raises( ValueError, match="Field nope doesn't exist" ):
+            cfg.value( cfg.compile( "nope" ) )
+        # null is a scalar like any other
+        assert cfg.value( "null_leaf.x" ) is None
+
+        cfg.set_value( path, 3, appendlists=True )
+        assert cfg.value( "a.b" ) == [ 1, { 'c': 2 }, { 'c': 3 } ]
+        cfg.set_value( path, 4 )
+        assert cfg.value( cfg.compile( "a.b" ) ) == [ { 'c': 4 } ]
+        assert cfg._index.keys() == config.Config._make_index( cfg._data ).keys()
+
+        with cfg.overlay( { cfg.compile( "a.b.0.c" ): 5 } ):
+            assert cfg.value( "a.b.0.c" ) == 5
+        assert cfg.value( "a.b.0.c" ) == 4
+
+
+class TestDefaults:
+    def test_defaults( self, tmp_path, capsys ):
+        ( tmp_path / "defaults.yaml" ).write_text( "a:\n  b: [ 1, { c: 2 } ]\n  n: null\nscalar: 3\n" )
+        cfg = config.Config.get( tmp_path / "defaults.yaml" )
+
+        assert cfg.value( 'a.b.1.c', default=5 ) == 2
+        assert cfg.value( 'a.n', default=5 ) is None
+        for missing in ( 'nope', 'a.nope', 'a.b.7', 'a.b.x', 'a.b.1.c.d.e', 'a.b.-9' ):
+            assert cfg.value( missing, default=5 ) == 5
+            assert cfg.value( missing, default=None ) is None
+            assert cfg.value( cfg.compile( missing ), default=5 ) == 5
+            assert not cfg.has( missing )
+        assert cfg.has( 'a.b.1' )
+        assert cfg.has( 'a.n' )
+        assert capsys.readouterr().err == ''
+
+        fields = [ 'a.b.1.c', 'nope', 'a.b.01.c', 'scalar', cfg.compile( 'a.b.0' ), 'a.b.-9', 'a.n' ]
+        assert cfg.values( fields, default='dflt' ) == [ 2, 'dflt', 2, 3, 1, 'dflt', None ]
+        with pytest.raises( ValueError, match="Field nope doesn't exist" ):
+            cfg.values( fields )
+        assert cfg.values( [ 'a.b.0', 'scalar' ] ) == [ 1, 3 ]
+
+        with cfg.overlay( { 'a.b': 'overlaid', 'new': 1 } ):
+            # (a field one below a scalar gives the scalar, as it always has)
+            assert cfg.values( fields, default='dflt' ) == [ 'dflt', 'dflt', 'dflt', 3, 'overlaid', 'overlaid', None ]
+            assert cfg.value( 'new', default=0 ) == 1
+            assert cfg.value( 'a.nope', default=0 ) == 0
+            assert cfg.has( 'new' )
+        assert not cfg.has( 'new' )
+
+
+class TestUpdate:
+    def test_update( self, tmp_path ):
+        ( tmp_path / "update.yaml" ).write_text( "db:\n  host: localhost\n  port: 5432\n  opts: [ 1 ]\n"
+                                                 "other:\n  keep: 1\n" )
+        cfg = config.Config.get( tmp_path / "update.yaml" )
+        cfg.value( 'db' )
+        olddata = cfg._data
+        olddb = copy.deepcopy( olddata['db'] )
+
+        cfg.update( { 'db': { 'host': 'h', 'new': { 'a': 1 } }, 'db.port': 1, 'added.x.0': 'y', 'empty': {},
+                      cfg.compile( 'db.new.b' ): 2 } )
+        assert cfg.value( 'db' ) == { 'host': 'h', 'port': 1, 'opts': [ 1 ], 'new': { 'a': 1, 'b': 2 } }
+        assert cfg.value( 'added' ) == { 'x': [ 'y' ] }
+        assert cfg.value( 'empty' ) == {}
+        assert cfg._data['other'] is olddata['other']
+        assert olddata['db'] == olddb
+        assert cfg._index == config.Config._make_index( cfg._data )
+
+        cfg.update( { 'db.opts.0': 2, 'added.x.1': 'z' }, appendlists=True )
+        assert cfg.value( 'db.opts' ) == [ 1, 2 ]
+        assert cfg.value( 'added.x' ) == [ 'y', 'z' ]
+        assert cfg._index == config.Config._make_index( cfg._data )
+
+        # All or nothing
+        data = cfg._data
+        with pytest.raises( TypeError ):
+            cfg.update( { 'db.host': 'not set', 'db.opts.x': 3 }, appendlists=True )
+        assert cfg._data is data
+        assert cfg.value( 'db.host' ) == 'h'
+
+
+class TestEnvironment:
+    def test_environment( self, tmp_path, monkeypatch ):
+        ( tmp_path / "env.yaml" ).write_text( "database:\n  host: localhost\n  port: 5432\nservers: [ a, b ]\n"
+                                              "other: 1\n" )
+        monkeypatch.setenv( "RKWUTEST__database__host", "dbhost" )
+        monkeypatch.setenv( "RKWUTEST__database__port", "6543" )
+        monkeypatch.setenv( "RKWUTEST__servers", "[ c, d ]" )
+        monkeypatch.setenv( "RKWUTEST__new__flag", "true" )
+        monkeypatch.setenv( "RKWUTEST__bad", "[ unclosed" )
+        monkeypatch.setenv( "RKWUTESTX__other", "2" )
+        cfg = config.Config.get( tmp_path / "env.yaml", envprefix="RKWUTEST" )
+        data = cfg._data
+
+        assert cfg._env._parsed == {}
+        assert cfg.value( 'database.port' ) == 6543
+        assert cfg._env._parsed == { 'database.port': 6543 }
+        assert cfg._env._tree == ( None, None )
+        assert cfg.value( 'database.host' ) == 'dbhost'
+        assert cfg.value( 'database' ) == { 'host': 'dbhost', 'port': 6543 }
+        assert cfg.value( 'servers' ) == [ 'c', 'd' ]
+        assert cfg.value( 'servers.1' ) == 'd'
+        assert cfg.value( 'new.flag' ) is True
+        assert cfg.value( 'bad' ) == '[ unclosed'
+        assert cfg.value( 'other' ) == 1
+        assert cfg.values( [ 'database', 'database.port', 'other', 'servers.0' ] ) == [
+            { 'host': 'dbhost', 'port': 6543 }, 6543, 1, 'c' ]
+        assert cfg._data is data
+        assert data['database']['host'] == 'localhost'
+
+        # Changes to the environment after the config is read are ignored
+        monkeypatch.setenv( "RKWUTEST__other", "3" )
+        assert cfg.value( 'other' ) == 1
+
+        # Overlays beat environment variables, which beat the config
+        cfg.set_value( 'database.user', 'me' )
+        with cfg.overlay( { 'database.port': 1 } ):
+            assert cfg.value( 'database' ) == { 'host': 'dbhost', 'port': 1, 'user': 'me' }
+        cfg.set_value( 'database.host', 'ignored' )
+        assert cfg.value( 'database.host' ) == 'dbhost'
+
+        clone = config.Config.clone( tmp_path / "env.yaml" )
+        assert clone.value( 'database.port' ) == 6543
+        clone.use_environment( 'OTHER', environ={ 'OTHER__database__port': '7' } )
+        assert clone.value( 'database' ) == { 'host': 'ignored', 'port': 7, 'user': 'me' }
+        assert cfg.value( 'database.port' ) == 6543
+
+
+class TestInterpolation:
+    def test_interpolation( self, tmp_path ):
+        ( tmp_path / "interp.yaml" ).write_text(
+            "dirs:\n"
+            "  base: /data\n"
+            "  images: ${dirs.base}/images\n"
+            "  thumbs: ${dirs.images}/thumbs\n"
+            "  literal: $${dirs.base} costs $5\n"
+            "db:\n  port: 5432\n  url: postgres://host:${db.port}/\n"
+            "port: ${db.port}\n"
+            "copy: ${db}\n"
+            "list: [ '${dirs.base}', plain ]\n"
+            "unrelated: ${nope}\n"
+            "loop:\n  a: ${loop.b}\n  b: x${loop.a}\n"
+            "self: ${self.x}\n" )
+        path = tmp_path / "interp.yaml"
+        cfg = config.Config.get( path )
+        assert cfg.value( 'dirs.images' ) == '${dirs.base}/images'
+        cfg.use_interpolation()
+
+        assert cfg.value( 'dirs.thumbs' ) == '/data/images/thumbs'
+        assert cfg.value( 'dirs.literal' ) == '${dirs.base} costs $5'
+        assert cfg.value( 'port' ) == 5432
+        assert cfg.value( 'db.url' ) == 'postgres://host:5432/'
+        assert cfg.value( 'copy' ) == { 'port': 5432, 'url': 'postgres://host:5432/' }
+        assert cfg.value( 'list' ) == [ '/data', 'plain' ]
+        assert isinstance( cfg.value( 'list' ), config.FrozenList )
+        assert cfg.value( 'dirs' ) == { 'base': '/data', 'images': '/data/images', 'thumbs': '/data/images/thumbs',
+                                         'literal': '${dirs.base} costs $5' }
+        assert cfg.values( [ 'dirs.images', 'nothere', 'port' ], default=None ) == [ '/data/images', None, 5432 ]
+        with pytest.raises( ValueError, match="Field nope doesn't exist" ):
+            cfg.value( 'unrelated' )
+        with pytest.raises( ValueError, match="loop: loop.a -> loop.b -> loop.a" ):
+            cfg.value( 'loop.a' )
+        with pytest.raises( ValueError, match="loop" ):
+            cfg.value( 'loop' )
+        with pytest.raises( ValueError, match="loop: self -> self.x -> self.x" ):
+            cfg.value( 'self' )
+
+        # Only what depends on a change is forgotten
+        interp = cfg._interp
+        assert { 'dirs.images', 'dirs.thumbs', 'db.url', 'port', 'copy' } <= interp.memo.keys()
+        cfg.set_value( 'db.port', 6543 )
+        assert 'dirs.thumbs' in interp.memo
+        assert not { 'db.url', 'port', 'copy', 'db' } & interp.memo.keys()
+        assert cfg.value( 'port' ) == 6543
+        assert cfg.value( 'copy' ) == { 'port': 6543, 'url': 'postgres://host:6543/' }
+        cfg.set_value( 'dirs.base', '/other' )
+        assert not { 'dirs.images', 'dirs.thumbs', 'dirs', 'list' } & interp.memo.keys()
+        assert 'port' in interp.memo
+        assert cfg.value( 'dirs.thumbs' ) == '/other/images/thumbs'
+        assert cfg.value( 'list.0' ) == '/other'
+
+        with cfg.overlay( { 'dirs.base': '/overlaid' } ):
+            assert cfg.value( 'dirs.thumbs' ) == '/overlaid/images/thumbs'
+        assert cfg.value( 'dirs.thumbs' ) == '/other/images/thumbs'
+
+        # reload only forgets what changed
+        cfg.value( 'dirs.thumbs' )
+        cfg.value( 'port' )
+        cfg.reload()
+        assert 'dirs.thumbs' not in interp.memo
+        assert cfg.value( 'dirs.thumbs' ) == '/data/images/thumbs'
+        assert cfg.value( 'port' ) == 5432
+
+
+class TestCompact:
+    def test_compact( self, tmp_path ):
+        ( tmp_path / "compact.yaml" ).write_text( "calib:\n  coeffs: [ " + ", ".join( f"{i/4}" for i in range(100) )
+                                                  + " ]\n"
+                                                  + "mask: [ " + ", ".join( str(i % 3) for i in range(100) ) + " ]\n"
+                                                  + "short: [ 1, 2 ]\n"
+                                                  + "mixed: [ " + ", ".join( [ "1", "2.5" ] * 50 ) + " ]\n"
+                                                  + "bools: [ " + ", ".join( [ "true" ] * 100 ) + " ]\n"
+                                                  + "hosts: [ " + ", ".join( [ "a.org", "b.org" ] * 50 ) + " ]\n"
+                                                  + "big: [ " + ", ".join( [ str( 2**70 ) ] * 100 ) + " ]\n" )
+        path = tmp_path / "compact.yaml"
+        cfg = config.Config.get( path )
+        before = copy.deepcopy( cfg._data )
+        cfg.compact()
+
+        coeffs = cfg.value( 'calib.coeffs' )
+        assert isinstance( coeffs, config.CompactList )
+        assert coeffs.array.typecode == 'd'
+        assert coeffs == [ i/4 for i in range(100) ]
+        assert coeffs[5] == 1.25
+        assert coeffs[-1] == 24.75
+        assert coeffs[2:4] == [ 0.5, 0.75 ]
+        assert cfg.value( 'calib.coeffs.5' ) == 1.25
+        assert cfg.value( 'calib.coeffs.-1' ) == 24.75
+        assert cfg.values( [ 'calib.coeffs.4', 'mask.2' ] ) == [ 1.0, 2 ]
+        assert 'calib.coeffs.5' not in cfg._index
+        assert cfg.value( 'mask' ).array.typecode == 'q'
+        for field in ( 'short', 'mixed', 'bools', 'hosts', 'big' ):
+            assert isinstance( cfg.value( field ), list )
+        assert cfg.value( 'hosts.0' ) is cfg.value( 'hosts.2' )
+        assert cfg._data == before
+        assert yaml.safe_load( yaml.safe_dump( cfg._data ) ) == before
+        with pytest.raises( TypeError ):
+            coeffs[0] = 1.
+
+        assert type( coeffs.tolist() ) is list and coeffs.tolist() == coeffs
+        with pytest.raises( TypeError, match="not JSON serializable" ):
+            json.dumps( cfg.value( 'calib' ) )
+        assert json.loads( json.dumps( cfg._data, default=config.json_default ) ) == before
+        assert json.loads( json.dumps( coeffs.tolist() ) ) == coeffs
+        with pytest.raises( TypeError, match="not JSON serializable" ):
+            json.dumps( { 'x': object() }, default=config.json_default )
+
+        clone = config.Config.clone( path )
+        assert clone.value( 'calib.coeffs' ) is coeffs
+        clone.set_value( 'calib.coeffs.100', 25., appendlists=True )
+        assert clone.value( 'calib.coeffs' ) == [ i/4 for i in range(101) ]
+        assert len( cfg.value( 'calib.coeffs' ) ) == 100
+        clone.set_value( 'mask.0', 7 )
+        assert clone.value( 'mask' ) == [ 7 ]
+
+        cfg.freeze()
+        assert cfg.value( 'calib.coeffs' ) is coeffs
+        cfg.reload()
+        assert isinstance( cfg.value( 'calib.coeffs' ), config.CompactList )
+
+    def test_array( self, tmp_path ):
+        numpy = pytest.importorskip( "numpy" )
+        ( tmp_path / "array.yaml" ).write_text( "coeffs: [ " + ", ".join( str(i) for i in range(100) ) + " ]\n"
+                                                "short: [ 1.5, 2.5 ]\nscalar: 1\n" )
+        cfg = config.Config.get( tmp_path / "array.yaml" )
+        cfg.compact()
+        arr = cfg.array( 'coeffs' )
+        assert arr.dtype == numpy.int64
+        assert numpy.shares_memory( arr, numpy.frombuffer( cfg.value( 'coeffs' ).array, dtype='q' ) )
+        assert ( arr == numpy.arange( 100 ) ).all()
+        with pytest.raises( ValueError ):
+            arr[0] = 5
+        assert ( cfg.array( 'short' ) == numpy.array( [ 1.5, 2.5 ] ) ).all()
+        with pytest.raises( TypeError ):
+            cfg.array( 'scalar' )
+
+
+class TestLoadReport:
+    def test_load_report( self, tmp_path, caplog ):
+        ( tmp_path / "d.yaml" ).write_text( "shared:\n  val: d\n  list: [ d ]\n" )
+        ( tmp_path / "b.yaml" ).write_text( "preloads: [ d.yaml ]\nb: b\n" )
+        ( tmp_path / "c.yaml" ).write_text( "augments: [ d.yaml ]\nc: c\nshared:\n  list: [ c ]\n" )
+        ( tmp_path / "a.yaml" ).write_text( "preloads: [ b.yaml ]\noverrides: [ c.yaml ]\na: a\n" )
+        afile, bfile, cfile, dfile = ( str( tmp_path / f"{x}.yaml" ) for x in "abcd" )
+
+        cfg = config.Config.get( tmp_path / "a.yaml" )
+        assert cfg.load_report() is None
+
+        config.Config.yamlcache.clear()
+        with caplog.at_level( logging.DEBUG, logger="main" ):
+            cfg = config.Config.get( tmp_path / "a.yaml", reread=True, profile=True )
+        assert f"Loaded config {afile}" in caplog.text
+        report = cfg.load_report()
+        assert report['file'] == afile
+        assert not report['snapshot']
+        assert set( report['files'].keys() ) == { afile, bfile, cfile, dfile }
+        for entry in report['files'].values():
+            assert not entry['cached']
+            for k in ( 'resolve', 'read', 'parse', 'freeze', 'merge' ):
+                assert entry[k] >= 0.
+        assert report['total'] >= report['sums']['parse']
+        assert report['files'][afile]['preloads'] == [ bfile ]
+        assert report['files'][afile]['overrides'] == [ cfile ]
+        assert report['files'][dfile]['nodes'] == 5
+        assert report['files'][dfile]['merge_calls'] == 1
+        assert report['files'][cfile]['merge_calls'] > 1
+        assert report['files'][cfile]['merge_bytes'] > 0
+        assert report['includes'] == {
+            'file': afile, 'augments': [],
+            'preloads': [ { 'file': bfile, 'augments': [], 'overrides': [],
+                            'preloads': [ { 'file': dfile, 'preloads': [], 'augments': [], 'overrides': [] } ] } ],
+            'overrides': [ { 'file': cfile, 'preloads': [], 'overrides': [],
+                             'augments': [ { 'file': dfile, 'preloads': [], 'augments': [], 'overrides': [] } ] } ] }
+
+        # Reloading keeps profiling; the unchanged files now come from the cache
+        cfg.reload()
+        assert all( entry['cached'] for entry in cfg.load_report()['files'].values() )
+        assert cfg.value( 'shared.list' ) == [ 'c', 'd' ]
+
+        assert config.Config.clone( tmp_path / "a.yaml" ).load_report()['file'] == afile
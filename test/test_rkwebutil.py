@@ -0,0 +1,534 @@
+# This file is part of rkwebutil
+#
+# rkwebutil is Copyright 2023-2024 by Robert Knop
+#
+# rkwebutil is free software, available under the BSD 3-clause license (see LICENSE)
+
+import io
+import re
+import random
+import uuid
+import datetime
+import pytest
+import pytz
+import dateutil.parser
+
+from rkwebutil import rkwebutil
+
+
+# sanitizeHTML as it was before the patterns were precompiled and passes
+# skipped; the current one must give exactly the same output.  (Except
+# that this one raises a TypeError if the whole text is one tag.)
+
+def legacy_sanitizeHTML(text, oneline = False):
+    tagfinder = re.compile(r"^\<(\S+)\>$")
+    ampfinder = re.compile(r"\&([^;\s]*\s)")
+    ampendfinder = re.compile(r"\&([^;\s]*)$")
+    ltfinder = re.compile(r"<((?!a\s*href)[^>]*\s)")
+    ltendfinder = re.compile(r"<([^>]*)$")
+    gtfinder = re.compile(r"((?<!\<a)\s[^<]*)>")
+    gtstartfinder = re.compile(r"^([<]*)>")
+
+    def tagfilter(text):
+        tagfinder = re.compile(r"^\<(\S+)\>$")
+        linkfinder = re.compile(r"^\s*a\s+href\s*=\s*\"[^\"]+\"\s*((target|style)\s*=\s*\"[^\"]*\"\s*)*")
+        imgfinder = re.compile(r"^\s*img\s+((src|style|width|height|alt)\s*=\s*\"[^\"]*\"\s*)*$")
+        match = tagfinder.match(text)
+        if match is None:
+            return None
+        contents = match.group(1)
+        if linkfinder.match(contents) is not None:
+            return text
+        if imgfinder.match(contents) is not None:
+            return text
+        if ( (contents.lower() == "i") or (contents.lower() == "b") or (contents.lower() == "tt") ):
+            return text
+        elif ( (contents.lower() == "/i") or (contents.lower() == "/b") or
+               (contents.lower() == "/tt") or (contents.lower() == "/a") ):
+            return text
+        elif contents.lower() == "sup":
+            return "<span class=\"sup\">"
+        elif contents.lower() == "/sup":
+            return "</span>"
+        elif contents.lower() == "sub":
+            return "<span class=\"sub\">"
+        elif contents.lower() == "/sub":
+            return "</span>"
+        else:
+            return "&lt;{}&rt;".format(contents)
+
+    newtext = tagfinder.sub(tagfilter, text)
+    newtext = ampfinder.sub(r"&amp;\g<1>", newtext, count=0)
+    newtext = ampendfinder.sub(r"&amp;\g<1>", newtext, count=0)
+    newtext = ltfinder.sub(r"&lt;\g<1>", newtext, count=0)
+    newtext = ltendfinder.sub(r"&lt;\g<1>", newtext, count=0)
+    newtext = gtfinder.sub(r"\g<1>&gt;", newtext, count=0)
+    newtext = gtstartfinder.sub(r"\g<1>&gt;", newtext, count=0)
+
+    if not oneline:
+        newtext = re.sub(r"^(?!\s*<p>)", "<p>", newtext, count=0)
+        newtext = re.sub(r"([^\n])$", r"\g<1>\n", newtext, count=0)
+        newtext = re.sub(r"\s*\n", "</p>\n", newtext, count=0)
+        newtext = re.sub(r"</p></p>", "</p>", newtext, count=0)
+        newtext = re.sub(r"\n(?!\s*<p>)([^\n]*</p>)", r"\n<p>\g<1>", newtext, count=0)
+        newtext = re.sub(r"^\s*<p></p>\s*$", "", newtext, count=0)
+        newtext = re.sub(r"\n", r"\n\n", newtext, count=0)
+
+    return newtext
+
+
+corpus = [
+    "",
+    "\n",
+    "\n\n",
+    " ",
+    "good",
+    "bad subtraction",
+    "good\n",
+    "two\nlines",
+    "two\nlines\n",
+    "blank\n\nline",
+    "trailing space   \n",
+    "<p>already a paragraph</p>",
+    "  <p>indented paragraph</p>\nand more",
+    "<p></p>",
+    " <p></p> \n",
+    "<b>",
+    "<B>",
+    "</tt>",
+    "<sup>",
+    "</SUB>",
+    "<script>",
+    "<script>\n",
+    "<a>b</a>",
+    "this is <b>bold</b> and <i>italic</i> and <tt>mono</tt>",
+    "x<sup>2</sup> and H<sub>2</sub>O",
+    'see <a href="https://example.org/">here</a>',
+    'see <a href="https://example.org/" target="_blank" style="color: red">here</a> now',
+    '<a href="x">link</a>',
+    'an image: <img src="foo.png" alt="foo" width="10" height="20">',
+    "<script>alert('hi')</script>",
+    "<script >alert('hi')</script >",
+    "a < b and c > d",
+    "a<b",
+    "a <b",
+    "unclosed <tag at the end",
+    "> starts with gt",
+    "<<> odd",
+    "<>",
+    "fish & chips",
+    "fish &amp; chips",
+    "AT&T",
+    "ends with &",
+    "&lt; already escaped &gt;",
+    "&a&b c",
+    "&a&b",
+    "tab\there & <there>\tnow",
+    "multi\n<b>line</b>\n& stuff <\n> here",
+    "élève & café <i>olé</i>",
+    "   leading spaces",
+    "\r\nwindows\r\nlines\r\n",
+]
+
+
+@pytest.mark.parametrize( "oneline", [ False, True ] )
+@pytest.mark.parametrize( "text", corpus )
+def test_sanitizeHTML_corpus( text, oneline ):
+    compare( text, oneline )
+
+
+def compare( text, oneline ):
+    try:
+        expected = legacy_sanitizeHTML( text, oneline )
+    except TypeError:
+        assert re.match( r"^\<(\S+)\>$", text ) is not None
+        rkwebutil.sanitizeHTML( text, oneline )
+        return
+    assert rkwebutil.sanitizeHTML( text, oneline ) == expected, repr( text )
+
+
+def test_sanitizeHTML_fuzz():
+    pieces = [ "a", "b", "img", "href", "=", '"', "x y", " ", "  ", "\n", "\t", "<", ">", "&", ";", "/",
+               "<p>", "</p>", "<b>", "</b>", "<sup>", "<a href=\"u\">", "</a>", "<img src=\"s\">", "&amp;" ]
+    rng = random.Random( 42 )
+    for _ in range( 5000 ):
+        text = "".join( rng.choice( pieces ) for _ in range( rng.randrange( 12 ) ) )
+        for oneline in ( False, True ):
+            compare( text, oneline )
+    for _ in range( 5000 ):
+        text = "".join( rng.choice( '<>&; \n\tab/p="' ) for _ in range( rng.randrange( 30 ) ) )
+        for oneline in ( False, True ):
+            compare( text, oneline )
+
+
+def test_sanitizeHTML():
+    assert rkwebutil.sanitizeHTML( "good" ) == "<p>good</p>\n\n"
+    assert rkwebutil.sanitizeHTML( "x<sup>2</sup>", oneline=True ) == "x<sup>2</sup>"
+    assert rkwebutil.sanitizeHTML( 'a <a href="u">b</a>', oneline=True ) == 'a <a href="u">b</a>'
+    assert rkwebutil.sanitizeHTML( 'a <a onclick="u">b</a>', oneline=True ) == 'a &lt;a onclick="u"&gt;b</a>'
+    assert rkwebutil.sanitizeHTML( "<b>", oneline=True ) == "<b>"
+    assert rkwebutil.sanitizeHTML( "<script>", oneline=True ) == "&lt;script&gt;"
+    assert rkwebutil.sanitizeHTML( "fish & chips", oneline=True ) == "fish &amp; chips"
+
+
+def chunked( text, rng ):
+    chunks = []
+    while len( text ) > 0:
+        n = rng.randrange( 1, 20 )
+        chunks.append( text[:n] )
+        text = text[n:]
+    return chunks
+
+
+def test_sanitizeHTMLStream():
+    rng = random.Random( 42 )
+    pieces = [ "a", "b", "x y", " ", "\n", "\n", "\n", "\t", "<", ">", "&", ";", "/", "<p>", "</p>", "<b>", "</b>",
+               "<sup>", "<a href=\"u\">", "</a>", "<img src=\"s\">", "&amp;", "word", "more words" ]
+    for _ in range( 2000 ):
+        text = "".join( rng.choice( pieces ) for _ in range( rng.randrange( 60 ) ) )
+        for oneline in ( False, True ):
+            expected = rkwebutil.sanitizeHTML( text, oneline )
+            assert "".join( rkwebutil.sanitizeHTMLStream( chunked( text, rng ), oneline ) ) == expected, repr( text )
+
+    text = "\n".join( corpus[4:] * 200 )
+    out = list( rkwebutil.sanitizeHTMLStream( io.StringIO( text ), chunksize=100 ) )
+    assert "".join( out ) == rkwebutil.sanitizeHTML( text )
+    assert len( out ) > 100
+    assert max( len( o ) for o in out ) < 5000
+
+    assert list( rkwebutil.sanitizeHTMLStream( [] ) ) == [ rkwebutil.sanitizeHTML( "" ) ]
+
+    # With no safe places to cut, the buffer is still bounded
+    out = list( rkwebutil.sanitizeHTMLStream( [ "a < b\n" ] * 1000, maxbuffer=100 ) )
+    assert len( out ) > 10
+    assert all( o.startswith( "<p>a &lt; b</p>" ) for o in out )
+
+
+def test_sanitizeHTMLMany():
+    expected = [ rkwebutil.sanitizeHTML( t, True ) for t in corpus ]
+    assert rkwebutil.sanitizeHTMLMany( corpus, oneline=True ) == expected
+    assert rkwebutil.sanitizeHTMLMany( corpus, oneline=True, processes=2, chunksize=8 ) == expected
+
+
+def test_sanitizeHTMLCached():
+    rkwebutil.sanitizeHTMLCached.cache_clear()
+    for _ in range( 3 ):
+        for text in corpus:
+            for oneline in ( False, True ):
+                assert rkwebutil.sanitizeHTMLCached( text, oneline ) == rkwebutil.sanitizeHTML( text, oneline )
+    info = rkwebutil.sanitizeHTMLCached.cache_info()
+    assert info['misses'] == 2 * len( corpus )
+    assert info['hits'] == 4 * len( corpus )
+    assert info['entries'] == 2 * len( corpus )
+    rkwebutil.sanitizeHTMLCached.cache_clear()
+    assert rkwebutil.sanitizeHTMLCached.cache_info()['entries'] == 0
+
+    # Eviction is by size, least recently used first
+    cache = rkwebutil.HTMLCache( maxbytes=2000, maxtextlen=100 )
+    texts = [ f"comment {i} " + "x" * 50 for i in range( 20 ) ]
+    for text in texts:
+        cache.sanitize( text )
+        cache.sanitize( texts[0] )
+    info = cache.info()
+    assert 0 < info['size'] <= 2000
+    assert info['entries'] < 20
+    assert ( texts[0], False ) in cache._results
+    assert ( texts[1], False ) not in cache._results
+    assert ( texts[-1], False ) in cache._results
+
+    # Long texts aren't cached
+    longtext = "y" * 200
+    assert cache.sanitize( longtext ) == rkwebutil.sanitizeHTML( longtext )
+    assert ( longtext, False ) not in cache._results
+
+
+def test_asDateTime():
+    # The fast path must give exactly what dateutil does, tzinfo and all
+    for string in [ "2023-01-02", "2023-01-02T03:04", "2023-01-02 03:04:05", "2023-01-02T03:04:05.123",
+                    "2023-01-02T03:04:05.123456", "2023-01-02T03:04:05Z", "2023-01-02T03:04:05+00:00",
+                    "2023-01-02T03:04:05-00:00", "2023-01-02T03:04:05+05:30", "2023-01-02T03:04:05-08:00",
+                    "2023-01-02T03:04:05.1234567", "20230102T030405", "Jan 2 2023 3:04pm" ]:
+        for defaultutc in ( False, True ):
+            expected = dateutil.parser.parse( string )
+            if defaultutc and ( expected.tzinfo is None ):
+                expected = pytz.utc.localize( expected )
+            dateval = rkwebutil.asDateTime( string, defaultutc )
+            assert dateval == expected
+            assert repr( dateval.tzinfo ) == repr( expected.tzinfo )
+
+    when = datetime.datetime( 2023, 1, 2 )
+    assert rkwebutil.asDateTime( when ) is when
+    assert rkwebutil.asDateTime( None ) is None
+    # fromisoformat would take the last two, but dateutil doesn't
+    for bad in [ "2023-02-30", "2023-01-02T25:00", "not a date", 5, "2023-01-02T24:00:00", "2023-W01-2" ]:
+        with pytest.raises( rkwebutil.ErrorMsg, match="is not a valid date and time" ):
+            rkwebutil.asDateTime( bad )
+
+
+def test_asDateTimes():
+    strings = [ "2023-01-02T03:04:05Z", None, "2023-01-02T03:04:05-06:00", "2023-01-02 03:04" ]
+    assert rkwebutil.asDateTimes( strings ) == [ rkwebutil.asDateTime( s ) for s in strings ]
+    assert rkwebutil.asDateTimes( strings, defaultutc=True )[3].tzinfo is pytz.utc
+
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        rkwebutil.asDateTimes( [ "2023-01-02", "nope", "2023-01-03", "2023-13-01" ] )
+    assert ex.value.errors == { 1: "nope", 3: "2023-13-01" }
+    assert "2 of 4 values" in ex.value.text
+
+    numpy = pytest.importorskip( "numpy" )
+    arr = rkwebutil.asDateTimes( strings, asnumpy=True )
+    assert arr.dtype == numpy.dtype( "datetime64[us]" )
+    assert arr[0] == numpy.datetime64( "2023-01-02T03:04:05" )
+    assert numpy.isnat( arr[1] )
+    assert arr[2] == numpy.datetime64( "2023-01-02T09:04:05" )
+    assert arr[3] == numpy.datetime64( "2023-01-02T03:04" )
+
+    # Entries numpy can't parse go through asDateTime
+    mixed = rkwebutil.asDateTimes( [ "Jan 2 2023 03:04", "2023-01-02T03:04:05+01:00", None ], asnumpy=True )
+    assert list( mixed[:2] ) == [ numpy.datetime64( "2023-01-02T03:04" ), numpy.datetime64( "2023-01-02T02:04:05" ) ]
+    assert numpy.isnat( mixed[2] )
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        rkwebutil.asDateTimes( [ "2023-01-02", "nope" ], asnumpy=True )
+    assert ex.value.errors == { 1: "nope" }
+
+    # A time that can't be put in UTC is a bad value, even though asDateTime takes it
+    assert rkwebutil.asDateTimes( [ "2023-01-02T03:04:05+24:00" ] )[0] is not None
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        rkwebutil.asDateTimes( [ "2023-01-02", "2023-01-02T03:04:05+24:00" ], asnumpy=True )
+    assert ex.value.errors == { 1: "2023-01-02T03:04:05+24:00" }
+
+
+# Reference values from running rkWebUtil.ymdOfMjd, dateOfMjd, and
+# mjdOfDate in static/rkwebutil.js under node.  (JS Dates only have
+# milliseconds.)
+js_mjd_dates = [ ( 60475, ( 2024, 6, 14 ), "2024-06-14T00:00:00.000Z" ),
+                 ( 60474.99999, ( 2024, 6, 13 ), "2024-06-13T23:59:59.136Z" ),
+                 ( 60475.5, ( 2024, 6, 14 ), "2024-06-14T12:00:00.000Z" ),
+                 ( 60675.99999, ( 2024, 12, 31 ), "2024-12-31T23:59:59.136Z" ),
+                 ( 60676, ( 2025, 1, 1 ), "2025-01-01T00:00:00.000Z" ),
+                 ( 60676.75, ( 2025, 1, 1 ), "2025-01-01T18:00:00.000Z" ),
+                 ( 60676.499999, ( 2025, 1, 1 ), "2025-01-01T11:59:59.913Z" ),
+                 ( 60676.500001, ( 2025, 1, 1 ), "2025-01-01T12:00:00.086Z" ),
+                 ( 0, ( 1858, 11, 17 ), "1858-11-17T00:00:00.000Z" ),
+                 ( -0.5, ( 1858, 11, 16 ), "1858-11-16T12:00:00.000Z" ),
+                 ( 0.25, ( 1858, 11, 17 ), "1858-11-17T06:00:00.000Z" ),
+                 ( 51544.5, ( 2000, 1, 1 ), "2000-01-01T12:00:00.000Z" ),
+                 ( 40587, ( 1970, 1, 1 ), "1970-01-01T00:00:00.000Z" ),
+                 ( 15020.123456, ( 1900, 1, 1 ), "1900-01-01T02:57:46.598Z" ),
+                 ( 59580.999999999, ( 2022, 1, 1 ), "2022-01-01T23:59:59.999Z" ),
+                 ( 88069.0000001, ( 2100, 1, 1 ), "2100-01-01T00:00:00.008Z" ),
+                 ( 45000.3333333333, ( 1982, 1, 31 ), "1982-01-31T07:59:59.999Z" ) ]
+
+js_date_mjds = [ ( "2024-06-14T00:00:00.000Z", 60475 ),
+                 ( "2024-06-13T23:59:59.136Z", 60474.999989999924 ),
+                 ( "2025-01-01T11:59:59.913Z", 60676.49999899324 ),
+                 ( "2025-01-01T12:00:00.086Z", 60676.500000995584 ),
+                 ( "1858-11-17T00:00:00.000Z", 0 ),
+                 ( "1858-11-16T12:00:00.000Z", -0.5 ),
+                 ( "2000-01-01T12:00:00.000Z", 51544.5 ),
+                 ( "1900-02-28T23:59:59.999Z", 15078.999999988358 ),
+                 ( "2100-03-01T06:07:08.009Z", 88128.25495380769 ),
+                 ( "0100-07-04T17:18:19.020Z", -642231.2789465277 ),
+                 ( "2023-10-16T21:43:05.321Z", 60233.90492269676 ) ]
+
+
+def test_mjd():
+    for mjd, ymd, datestr in js_mjd_dates:
+        assert rkwebutil.ymdOfMjd( mjd ) == ymd
+        date = rkwebutil.dateOfMjd( mjd )
+        assert date.tzinfo is pytz.utc
+        assert date.isoformat( timespec="milliseconds" ).replace( "+00:00", "Z" ) == datestr
+    for datestr, mjd in js_date_mjds:
+        assert rkwebutil.mjdOfDate( datestr ) == mjd
+        assert rkwebutil.mjdOfDate( rkwebutil.asDateTime( datestr ) ) == mjd
+    assert rkwebutil.mjdOfDate( "2024-06-13T18:59:59.136-05:00" ) == 60474.999989999924
+    assert rkwebutil.mjdOfDate( datetime.datetime( 2024, 6, 14 ) ) == 60475
+    assert rkwebutil.mjdOfDate( None ) is None
+    assert rkwebutil.dateOfMjd( None ) is None
+    with pytest.raises( rkwebutil.ErrorMsg ):
+        rkwebutil.mjdOfDate( "not a date" )
+
+    # Round trips are only good to ~40µs, because (like the JS) mjdOfDate
+    # adds the fraction of the day to a JD of ~2.4 million
+    rng = random.Random( 42 )
+    for _ in range( 10000 ):
+        mjd = rng.uniform( -100000, 100000 )
+        assert rkwebutil.mjdOfDate( rkwebutil.dateOfMjd( mjd ) ) == pytest.approx( mjd, abs=5e-10 )
+
+
+def test_mjd_numpy():
+    numpy = pytest.importorskip( "numpy" )
+
+    mjds = numpy.array( [ m for m, _, _ in js_mjd_dates ] )
+    dates = rkwebutil.datesOfMjds( mjds )
+    assert dates.dtype == numpy.dtype( "datetime64[us]" )
+    assert list( dates.astype( "datetime64[ms]" ) ) == [ numpy.datetime64( s[:-1] ) for _, _, s in js_mjd_dates ]
+    assert list( rkwebutil.datesOfMjds( mjds[:2], asiso=True ) ) == [ "2024-06-14T00:00:00.000000Z",
+                                                                      "2024-06-13T23:59:59.136000Z" ]
+
+    strings = [ s for s, _ in js_date_mjds ]
+    expected = [ m for _, m in js_date_mjds ]
+    assert list( rkwebutil.mjdsOfDates( strings ) ) == expected
+    arr = numpy.array( [ s[:-1] for s in strings ], dtype="datetime64[ms]" )
+    assert list( rkwebutil.mjdsOfDates( arr ) ) == expected
+    assert rkwebutil.mjdsOfDates( arr.reshape( 1, -1 ) ).shape == ( 1, len(strings) )
+
+    missing = rkwebutil.mjdsOfDates( [ "2024-06-14", None ] )
+    assert missing[0] == 60475 and numpy.isnan( missing[1] )
+    assert numpy.isnat( rkwebutil.datesOfMjds( [ numpy.nan, 60475 ] )[0] )
+
+    # The vectorized versions give exactly what the scalar ones do
+    rng = numpy.random.default_rng( 42 )
+    mjds = numpy.concatenate( [ rng.uniform( -100000, 100000, 20000 ),
+                                rng.integers( -1000, 100000, 1000 ) + rng.choice( [ 0., 1e-9, -1e-9, 0.5 ], 1000 ) ] )
+    dates = rkwebutil.datesOfMjds( mjds )
+    assert [ d.replace( tzinfo=None ) for d in map( rkwebutil.dateOfMjd, mjds.tolist() ) ] == dates.tolist()
+    assert rkwebutil.mjdsOfDates( dates ).tolist() == [ rkwebutil.mjdOfDate( d ) for d in dates.tolist() ]
+
+
+def test_asUUIDs():
+    rng = random.Random( 42 )
+    ids = [ uuid.UUID( int=rng.getrandbits( 128 ) ) for _ in range( 1000 ) ]
+    strs = [ str( u ) for u in ids ]
+
+    arr = rkwebutil.asUUIDs( strs )
+    assert len( arr ) == 1000
+    assert arr.data == b"".join( u.bytes for u in ids )
+    assert list( arr ) == ids
+    assert arr[-1] == ids[-1]
+    with pytest.raises( IndexError ):
+        arr[1000]
+    assert rkwebutil.asUUIDs( [ s.upper() for s in strs ] ).data == arr.data
+    assert rkwebutil.asUUIDs( [] ).data == b""
+
+    # Everything asUUID takes, mixed together
+    mixed = [ ids[0], strs[1], ids[2].bytes, strs[3].encode(), ids[4].hex, "{" + strs[5] + "}",
+              "urn:uuid:" + strs[6], None ]
+    arr = rkwebutil.asUUIDs( mixed )
+    assert list( arr ) == ids[:7] + [ None ]
+    assert arr.nones == { 7 }
+    assert arr.data[-16:] == rkwebutil.NULLUUID.bytes
+    arr = rkwebutil.asUUIDs( mixed, canbenone=False )
+    assert list( arr ) == ids[:7] + [ rkwebutil.NULLUUID ]
+    assert len( arr.nones ) == 0
+
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        rkwebutil.asUUIDs( strs[:2] + [ "nope", strs[2][:-1] + "g", 17, strs[3] ] )
+    assert ex.value.errors == { 2: "nope", 3: strs[2][:-1] + "g", 4: 17 }
+    assert "3 of 6 values" in ex.value.text
+
+    arr = rkwebutil.asUUIDs( strs[:10] + [ None ] + strs[:10] )
+    assert strs[3] in arr
+    assert ids[3] in arr
+    assert ids[3].bytes in arr
+    assert strs[3].upper().encode() in arr
+    assert ids[20] not in arr
+    assert "nope" not in arr
+    assert None not in arr
+    assert rkwebutil.NULLUUID not in arr
+    assert arr.index( ids[3] ) == 3
+    with pytest.raises( ValueError ):
+        arr.index( ids[20] )
+    with pytest.raises( ValueError ):
+        arr.index( None )
+
+    with pytest.raises( ValueError ):
+        rkwebutil.UUIDArray( b"x" * 17 )
+
+    numpy = pytest.importorskip( "numpy" )
+    arr = rkwebutil.asUUIDs( strs )
+    assert arr.array.dtype.itemsize == 16
+    assert numpy.shares_memory( arr.array, numpy.frombuffer( arr.data, dtype=numpy.uint8 ) )
+    assert list( numpy.argsort( arr.array ) ) == sorted( range( 1000 ), key=lambda i: ids[i] )
+
+    # Duplicates, and time-based UUIDs that only differ in their first half
+    ids += ids[:100] + [ uuid.UUID( fields=( i, 0, 0x1000, 0x80, 0, 0x1234 ) ) for i in range( 1000 ) ]
+    rng.shuffle( ids )
+    arr = rkwebutil.asUUIDs( ids )
+    first = {}
+    for i, u in enumerate( ids ):
+        first.setdefault( u, i )
+    assert [ arr.index( u ) for u in ids ] == [ first[u] for u in ids ]
+    queries = ids[:500] + [ uuid.UUID( int=rng.getrandbits( 128 ) ) for _ in range( 500 ) ] + [ None ]
+    assert list( arr.indices( queries ) ) == [ first.get( u, -1 ) for u in queries ]
+    assert list( arr.indices( rkwebutil.asUUIDs( queries ) ) ) == [ first.get( u, -1 ) for u in queries ]
+
+
+def test_schema():
+    ids = [ str( uuid.UUID( int=i ) ) for i in range( 1, 4 ) ]
+    schema = rkwebutil.Schema( { 'id': { 'type': 'uuid', 'required': True },
+                                 'owner': { 'type': 'uuid', 'canbenone': False },
+                                 'limit': { 'type': 'int', 'default': 100 },
+                                 'page': 'intorzero',
+                                 'ra': { 'type': 'float', 'canbenone': False },
+                                 'since': { 'type': 'datetime', 'defaultutc': True },
+                                 'name': 'str',
+                                 'tags': lambda v: [ int( t ) for t in v.split( "," ) ] } )
+
+    params = schema.convert( { 'id': ids[0], 'owner': None, 'page': 'x', 'ra': '12.5', 'since': '2023-01-02 03:04',
+                               'tags': '1,2', 'junk': 3 } )
+    assert params == { 'id': uuid.UUID( ids[0] ), 'owner': rkwebutil.NULLUUID, 'limit': 100, 'page': 0, 'ra': 12.5,
+                       'since': datetime.datetime( 2023, 1, 2, 3, 4, tzinfo=pytz.utc ), 'tags': [ 1, 2 ] }
+    assert schema.convert( { 'id': ids[0], 'limit': '7', 'name': None } ) == { 'id': uuid.UUID( ids[0] ), 'limit': 7,
+                                                                            'name': None }
+
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        schema.convert( { 'limit': 'ten', 'ra': None, 'since': 'nope', 'tags': '1,x' } )
+    assert ex.value.errors == { 'id': 'is required',
+                                'limit': 'needs to be an integer, got "ten"',
+                                'ra': "can't be null",
+                                'since': 'needs to be a date and time, got "nope"',
+                                'tags': 'needs to be valid, got "1,x"' }
+    assert ex.value.text.startswith( "Error, 5 of the fields are not valid: id is required; limit needs" )
+
+    strict = rkwebutil.Schema( { 'n': 'int' }, extra='error' )
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        strict.convert( { 'n': 1, 'm': 2 } )
+    assert ex.value.errors == { 'm': 'is not a known field' }
+    assert rkwebutil.Schema( { 'n': 'int' }, extra='keep' ).convert( { 'n': '1', 'm': 2 } ) == { 'n': 1, 'm': 2 }
+
+    for bad in ( { 'n': 'integer' }, { 'n': { 'type': 'int', 'nullable': True } } ):
+        with pytest.raises( ValueError ):
+            rkwebutil.Schema( bad )
+    with pytest.raises( ValueError ):
+        rkwebutil.Schema( { 'n': 'int' }, extra='drop' )
+
+    # Columns give the same as converting each row
+    rows = [ { 'id': ids[i % 3], 'owner': None if i % 4 == 0 else ids[2], 'limit': str( i ),
+               'page': 'x' if i % 5 == 0 else i, 'ra': str( i / 7 ),
+               'since': f"2023-01-{1 + i % 28:02d}T03:04:05Z", 'name': f"n{i}", 'tags': "1" }
+             for i in range( 50 ) ]
+    columns = { name: [ r[name] for r in rows ] for name in rows[0] }
+    converted = schema.convertColumns( columns )
+    assert [ { name: converted[name][i] for name in converted } for i in range( 50 ) ] == [ schema.convert( r )
+                                                                                              for r in rows ]
+    assert schema.convertColumns( { 'id': ids } ) == { 'id': [ uuid.UUID( i ) for i in ids ], 'limit': [ 100 ] * 3 }
+
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        schema.convertColumns( { 'id': ids, 'limit': [ 1, 'b', 'c' ], 'ra': [ None, 1., 2. ],
+                                 'since': [ 'x', None, 'y' ] } )
+    assert ex.value.errors == { 'limit': { 1: 'b', 2: 'c' }, 'ra': { 0: None }, 'since': { 0: 'x', 2: 'y' } }
+    assert "limit has 2 bad values: 1 (b), 2 (c)" in ex.value.text
+    with pytest.raises( rkwebutil.ErrorMsg, match="different lengths" ):
+        schema.convertColumns( { 'id': ids, 'limit': [ 1 ] } )
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        rkwebutil.Schema( { 'id': { 'type': 'int', 'required': True }, 'x': 'float' } ).convertColumns(
+            { 'x': [ 1., 2. ] } )
+    assert ex.value.errors == { 'id': "is required" }
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        schema.convertColumns( { 'id': ids, 'limit': 5, 'name': '12', 'since': '2024-01-01' } )
+    assert ex.value.errors == { 'limit': "must be a list", 'name': "must be a list", 'since': "must be a list" }
+
+    numpy =pytest.importorskip( "numpy" )
+    arrays = schema.convertColumns( columns, asnumpy=True )
+    assert arrays['limit'].dtype == numpy.int64 and list( arrays['limit'] ) == converted['limit']
+    assert arrays['page'].dtype == numpy.int64 and list( arrays['page'] ) == converted['page']
+    assert arrays['ra'].dtype == numpy.float64 and list( arrays['ra'] ) == converted['ra']
+    assert arrays['since'].dtype == numpy.dtype( "datetime64[us]" )
+    assert list( arrays['owner'] ) == converted['owner']
+    assert isinstance( arrays['id'], rkwebutil.UUIDArray )
+    floats = rkwebutil.Schema( { 'x': 'float' } ).convertColumns( { 'x': [ 1, None ] }, asnumpy=True )['x']
+    assert floats[0] == 1. and numpy.isnan( floats[1] )
+    with pytest.raises( rkwebutil.ErrorMsg ) as ex:
+        schema.convertColumns( { 'id': ids, 'limit': [ 1, None, 2 ] }, asnumpy=True )
+    assert ex.value.errors == { 'limit': { 1: None } }